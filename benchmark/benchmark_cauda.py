@@ -0,0 +1,79 @@
+# benchmark_cauda.py - Compara deque(f, N) com o LeitorCauda em um log grande
+#
+# Uso: python benchmark/benchmark_cauda.py [--tamanho-mb 1024] [--linhas 30]
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from collections import deque
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')))
+from comum.cauda import LeitorCauda
+
+
+def gerar_log(caminho, tamanho_bytes):
+    """Gera um CSV no formato de dados_brutos_aplicacao.csv com aproximadamente 'tamanho_bytes'."""
+    instante = datetime(2025, 1, 1)
+    passo = timedelta(milliseconds=700)
+    with open(caminho, 'w', encoding='utf-8') as f:
+        f.write("Timestamp,Luminosidade,No\n")
+        escritos = 0
+        while escritos < tamanho_bytes:
+            bloco = []
+            for i in range(10000):
+                bloco.append(f"{instante.strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]},{150 + i % 50},1\n")
+                instante += passo
+            texto = ''.join(bloco)
+            f.write(texto)
+            escritos += len(texto)
+
+
+def cronometrar(funcao, repeticoes=5):
+    """Menor tempo (ms) entre 'repeticoes' execuções."""
+    melhor = float('inf')
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao()
+        melhor = min(melhor, time.perf_counter() - inicio)
+    return melhor * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark da leitura de cauda dos logs CSV.")
+    parser.add_argument('--tamanho-mb', type=int, default=1024, help="Tamanho do log sintético (padrão: 1024 MB)")
+    parser.add_argument('--linhas', type=int, default=30, help="Linhas mantidas na cauda (padrão: 30)")
+    parser.add_argument('--diretorio', default=None, help="Onde gerar o log (padrão: diretório temporário)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(dir=args.diretorio) as tmp:
+        caminho = os.path.join(tmp, 'dados_brutos_aplicacao.csv')
+        print(f"Gerando log sintético de {args.tamanho_mb} MB em '{caminho}'...")
+        gerar_log(caminho, args.tamanho_mb * 1024 * 1024)
+
+        def com_deque():
+            with open(caminho, 'r', encoding='utf-8') as f:
+                f.readline()
+                return deque(f, args.linhas)
+
+        leitor = LeitorCauda(caminho, args.linhas)
+        t_deque = cronometrar(com_deque, repeticoes=3)
+        t_primeira = cronometrar(lambda: LeitorCauda(caminho, args.linhas).ler())
+        leitor.ler()
+
+        def anexar_e_ler():
+            with open(caminho, 'a', encoding='utf-8') as f:
+                f.write(f"{datetime.now().strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]},175,1\n")
+            return leitor.ler()
+
+        t_incremental = cronometrar(anexar_e_ler, repeticoes=100)
+
+        print(f"deque(f, {args.linhas}) (linear no tamanho):  {t_deque:10.3f} ms")
+        print(f"LeitorCauda, primeira leitura do EOF:  {t_primeira:10.3f} ms")
+        print(f"LeitorCauda, leitura incremental:      {t_incremental:10.3f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,389 @@
+# benchmark_sistema.py - Benchmark ponta a ponta: ingestão (nivel3), análise (nivel5) e API (nivel6)
+#
+# Uso: python benchmark/benchmark_sistema.py [--tamanhos 10M,1G,10G] [--nos 100] [--saida resultado.json]
+#                                            [--comparar anterior.json]
+#
+# Para cada tamanho, monta uma cópia do projeto num diretório temporário com um
+# nivel4 sintético desse tamanho e mede, com os nós do simulador do nivel1_2:
+#   - amostras/s gravadas pelo base.py e seu pico de RSS;
+#   - latência do ciclo de análise do analise.py (primeiro ciclo e incrementais);
+#   - p50/p99 e requisições/s de /api/luminosidade e /api/estatisticas.
+# O resultado é gravado em JSON para comparar versões.
+
+import argparse
+import contextlib
+import http.client
+import io
+import json
+import os
+import platform
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+import yaml
+
+RAIZ = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+sys.path.insert(0, RAIZ)
+sys.path.insert(0, os.path.join(RAIZ, 'nivel1_2'))
+from comum.serie_temporal import CABECALHO_APLICACAO, CABECALHO_REDE
+from simulador import trecho_configuracao
+
+VERSAO_RESULTADO = 1
+MODULOS_COPIADOS = ('comum', 'nivel3', 'nivel5', 'nivel6')
+UNIDADES = {'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}
+ENDPOINTS = ('/api/luminosidade', '/api/estatisticas')
+# Métricas comparadas com --comparar: (caminho no cenário, True se maior é melhor)
+METRICAS = [
+    (('ingestao', 'amostras_por_s'), True),
+    (('analise', 'primeiro_ciclo_ms'), False),
+    (('analise', 'p99_ms'), False),
+    (('api', '/api/luminosidade', 'p99_ms'), False),
+    (('api', '/api/luminosidade', 'requisicoes_por_s'), True),
+    (('api', '/api/estatisticas', 'p99_ms'), False),
+    (('api', '/api/estatisticas', 'requisicoes_por_s'), True),
+]
+
+
+# --- Auxiliares ---
+
+def interpretar_tamanho(texto):
+    """'10M', '1G', '500K' ou bytes -> bytes."""
+    texto = texto.strip().upper().rstrip('B')
+    if texto and texto[-1] in UNIDADES:
+        return int(float(texto[:-1]) * UNIDADES[texto[-1]])
+    return int(texto)
+
+
+def porta_livre(tipo=socket.SOCK_STREAM):
+    with socket.socket(socket.AF_INET, tipo) as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def pico_rss_mb(pid=None):
+    """Pico de memória residente (VmHWM) do processo, em MB; None fora do Linux."""
+    try:
+        with open(f"/proc/{pid or 'self'}/status", 'r') as f:
+            for linha in f:
+                if linha.startswith('VmHWM:'):
+                    return round(int(linha.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return None
+
+
+def percentis(latencias_ms):
+    if not latencias_ms:
+        return {'p50_ms': None, 'p99_ms': None}
+    p50, p99 = np.percentile(latencias_ms, [50, 99])
+    return {'p50_ms': round(float(p50), 3), 'p99_ms': round(float(p99), 3)}
+
+
+def commit_atual():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=RAIZ, capture_output=True,
+                              text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+# --- Preparação ---
+
+def preparar_arvore(destino, args, porta_inicial, porta_base):
+    """Copia o código para 'destino' e escreve um configuracoes.yaml apontando para os nós simulados."""
+    for modulo in MODULOS_COPIADOS:
+        shutil.copytree(os.path.join(RAIZ, modulo), os.path.join(destino, modulo),
+                        ignore=shutil.ignore_patterns('__pycache__'))
+    os.makedirs(os.path.join(destino, 'nivel4'))
+    with open(os.path.join(RAIZ, 'nivel4', 'configuracoes.yaml'), 'r', encoding='utf-8') as f:
+        config = yaml.safe_load(f)
+    config.update(trecho_configuracao('127.0.0.1', porta_inicial, args.nos, porta_base=porta_base))
+    config.setdefault('nivel3', {}).update({'ligado': True, 'intervalo_medicoes': args.intervalo,
+                                            'janela_requisicoes': args.janela})
+    # Sem rotação: o objetivo é medir o comportamento com arquivos grandes
+    config.setdefault('nivel4', {}).update({'armazenamento': 'csv', 'rotacao': {'ativada': False}})
+    config.setdefault('nivel5', {}).update({'ativado': True})
+    with open(os.path.join(destino, 'nivel4', 'configuracoes.yaml'), 'w', encoding='utf-8') as f:
+        yaml.safe_dump(config, f, sort_keys=False, allow_unicode=True)
+
+
+def gerar_dados(nivel4, tamanho_bytes, nos, passo_ms=700):
+    """
+    Gera os CSVs brutos de rede e aplicação (metade do tamanho cada), com
+    leituras dos 'nos' nós a cada 'passo_ms' terminando agora.
+    """
+    bloco = 200000
+    fim_ms = int(time.time() * 1000)
+    for nome, cabecalho, media_linha in (('dados_brutos_rede.csv', CABECALHO_REDE, 46),
+                                        ('dados_brutos_aplicacao.csv', CABECALHO_APLICACAO, 30)):
+        total = max(tamanho_bytes // 2 // media_linha, 1)
+        inicio_ms = fim_ms - total * passo_ms // nos
+        rng = np.random.default_rng(0)
+        with open(os.path.join(nivel4, nome), 'w', encoding='utf-8', newline='') as f:
+            f.write(','.join(cabecalho) + '\n')
+            for primeiro in range(0, total, bloco):
+                indices = np.arange(primeiro, min(primeiro + bloco, total))
+                instantes = (inicio_ms + indices * passo_ms // nos).astype('datetime64[ms]')
+                textos = np.char.replace(np.datetime_as_string(instantes, unit='ms'), 'T', ' ').tolist()
+                ids = (indices % nos + 1).tolist()
+                if nome == 'dados_brutos_rede.csv':
+                    rssi = (-60 + rng.normal(0, 3, len(indices))).tolist()
+                    rtt = rng.uniform(1, 20, len(indices)).tolist()
+                    f.write(''.join(f"{t},{r:.2f},Sucesso,{no},{d:.1f}\n" for t, r, no, d in zip(textos, rssi, ids, rtt)))
+                else:
+                    luz = rng.integers(0, 1024, len(indices)).tolist()
+                    f.write(''.join(f"{t},{v},{no}\n" for t, v, no in zip(textos, luz, ids)))
+
+
+def iniciar(comando, cwd, log):
+    return subprocess.Popen(comando, cwd=cwd, stdout=subprocess.DEVNULL, stderr=log)
+
+
+def encerrar(processo):
+    processo.terminate()
+    try:
+        processo.wait(15)
+    except subprocess.TimeoutExpired:
+        processo.kill()
+        processo.wait()
+
+
+def contar_amostras(caminho, offset):
+    """Leituras bem-sucedidas anexadas ao CSV de rede a partir de 'offset'."""
+    with open(caminho, 'rb') as f:
+        f.seek(offset)
+        return f.read().count(b',Sucesso,')
+
+
+# --- Medições ---
+
+def medir_ingestao_e_analise(arvore, args, porta_inicial, log):
+    """Roda simulador + base.py e, em paralelo, os ciclos de análise sobre o arquivo que cresce."""
+    caminho_rede = os.path.join(arvore, 'nivel4', 'dados_brutos_rede.csv')
+    simulador = iniciar([sys.executable, os.path.join(RAIZ, 'nivel1_2', 'simulador.py'), '--nos', str(args.nos),
+                         '--porta-inicial', str(porta_inicial), '--relatorio', '3600'], RAIZ, log)
+    base = iniciar([sys.executable, 'base.py'], os.path.join(arvore, 'nivel3'), log)
+    try:
+        time.sleep(args.aquecimento)
+        offset = os.path.getsize(caminho_rede)
+        inicio = time.monotonic()
+        sonda = subprocess.run([sys.executable, os.path.abspath(__file__), '--sonda-analise', arvore,
+                                '--duracao', str(args.duracao)], capture_output=True, text=True, stdin=subprocess.DEVNULL)
+        decorrido = time.monotonic() - inicio
+        amostras = contar_amostras(caminho_rede, offset)
+        rss_base = pico_rss_mb(base.pid)
+    finally:
+        encerrar(base)
+        encerrar(simulador)
+
+    try:
+        analise = json.loads(sonda.stdout.strip().splitlines()[-1])
+    except (IndexError, ValueError):
+        log.write(sonda.stderr.encode('utf-8', errors='replace'))
+        analise = {'erro': 'a sonda de análise não retornou resultado'}
+    ingestao = {'amostras_por_s': round(amostras / decorrido, 1), 'amostras': amostras,
+                'pico_rss_mb': rss_base, 'nos': args.nos}
+    return ingestao, analise
+
+
+def sonda_analise(arvore, duracao):
+    """Executada em processo separado dentro da cópia: cronometra analisar_e_registrar."""
+    os.chdir(os.path.join(arvore, 'nivel5'))
+    sys.path.insert(0, os.getcwd())
+    with contextlib.redirect_stdout(io.StringIO()):
+        import analise
+        config = analise.cache_config.obter()
+        intervalo = float(config.get('nivel5', {}).get('intervalo_analise_s', 1))
+        latencias = []
+        fim = time.monotonic() + duracao
+        while time.monotonic() < fim or len(latencias) < 2:
+            inicio = time.perf_counter()
+            analise.analisar_e_registrar(config)
+            latencias.append((time.perf_counter() - inicio) * 1000)
+            time.sleep(intervalo)
+    resultado = {'primeiro_ciclo_ms': round(latencias[0], 3), 'ciclos': len(latencias) - 1,
+                 **percentis(latencias[1:]), 'pico_rss_mb': pico_rss_mb()}
+    print(json.dumps(resultado))
+
+
+def sonda_painel(arvore, porta):
+    """Executada em processo separado dentro da cópia: serve o app Flask numa porta livre."""
+    os.chdir(os.path.join(arvore, 'nivel6'))
+    sys.path.insert(0, os.getcwd())
+    import app
+    from cache_respostas import CacheRespostas
+    app.cache_respostas = CacheRespostas(os.path.join(arvore, 'cache'))  # Não compartilha o cache do painel real
+    app.app.run(host='127.0.0.1', port=porta, debug=False, threaded=True)
+
+
+def aguardar_porta(porta, timeout=30):
+    limite = time.monotonic() + timeout
+    while time.monotonic() < limite:
+        try:
+            with socket.create_connection(('127.0.0.1', porta), timeout=1):
+                return True
+        except OSError:
+            time.sleep(0.2)
+    return False
+
+
+def carregar_endpoint(porta, caminho, duracao, concorrencia):
+    """'concorrencia' clientes fazendo GET em 'caminho' sem pausa durante 'duracao' segundos."""
+    latencias = [[] for _ in range(concorrencia)]
+    erros = [0] * concorrencia
+    fim = time.monotonic() + duracao
+
+    def cliente(indice):
+        conexao = http.client.HTTPConnection('127.0.0.1', porta, timeout=30)
+        while time.monotonic() < fim:
+            inicio = time.perf_counter()
+            try:
+                conexao.request('GET', caminho)
+                resposta = conexao.getresponse()
+                resposta.read()
+                if resposta.status != 200:
+                    erros[indice] += 1
+                    continue
+            except (OSError, http.client.HTTPException):
+                erros[indice] += 1
+                conexao.close()
+                continue
+            latencias[indice].append((time.perf_counter() - inicio) * 1000)
+        conexao.close()
+
+    inicio = time.monotonic()
+    threads = [threading.Thread(target=cliente, args=(indice,)) for indice in range(concorrencia)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    decorrido = time.monotonic() - inicio
+    todas = [latencia for lista in latencias for latencia in lista]
+    return {'requisicoes_por_s': round(len(todas) / decorrido, 1), 'requisicoes': len(todas),
+            'erros': sum(erros), **percentis(todas)}
+
+
+def medir_api(arvore, args, log):
+    porta = porta_livre()
+    painel = iniciar([sys.executable, os.path.abspath(__file__), '--sonda-painel', arvore, '--porta', str(porta)],
+                     RAIZ, log)
+    try:
+        if not aguardar_porta(porta):
+            return {'erro': 'o painel não respondeu'}
+        resultado = {caminho: carregar_endpoint(porta, caminho, args.duracao, args.concorrencia) for caminho in ENDPOINTS}
+        resultado['pico_rss_mb'] = pico_rss_mb(painel.pid)
+        resultado['concorrencia'] = args.concorrencia
+    finally:
+        encerrar(painel)
+    return resultado
+
+
+def executar_cenario(rotulo, tamanho_bytes, args):
+    with tempfile.TemporaryDirectory(dir=args.diretorio, prefix='twinsen-bench-') as arvore:
+        porta_inicial, porta_base = 20000 + porta_livre(socket.SOCK_DGRAM) % 20000, porta_livre(socket.SOCK_DGRAM)
+        preparar_arvore(arvore, args, porta_inicial, porta_base)
+
+        print(f"[INFO] {rotulo}: gerando dados sintéticos...")
+        inicio = time.monotonic()
+        gerar_dados(os.path.join(arvore, 'nivel4'), tamanho_bytes, args.nos)
+        geracao_s = time.monotonic() - inicio
+
+        with open(os.path.join(arvore, 'benchmark.log'), 'wb') as log:
+            print(f"[INFO] {rotulo}: medindo ingestão e análise ({args.duracao:.0f} s)...")
+            ingestao, analise = medir_ingestao_e_analise(arvore, args, porta_inicial, log)
+            print(f"[INFO] {rotulo}: medindo a API ({args.duracao:.0f} s por endpoint)...")
+            api = medir_api(arvore, args, log)
+
+        tamanho_real = sum(os.path.getsize(os.path.join(arvore, 'nivel4', nome))
+                           for nome in ('dados_brutos_rede.csv', 'dados_brutos_aplicacao.csv'))
+        return {'rotulo': rotulo, 'tamanho_bytes': tamanho_real, 'geracao_s': round(geracao_s, 1),
+                'ingestao': ingestao, 'analise': analise, 'api': api}
+
+
+# --- Comparação ---
+
+def obter(cenario, caminho):
+    for chave in caminho:
+        if not isinstance(cenario, dict) or chave not in cenario:
+            return None
+        cenario = cenario[chave]
+    return cenario
+
+
+def comparar(atual, anterior, tolerancia):
+    """Imprime a variação de cada métrica por cenário; retorna quantas pioraram além da tolerância."""
+    anteriores = {cenario['rotulo']: cenario for cenario in anterior.get('cenarios', [])}
+    regressoes = 0
+    for cenario in atual['cenarios']:
+        base = anteriores.get(cenario['rotulo'])
+        if base is None:
+            continue
+        print(f"\n{cenario['rotulo']} (vs. {anterior.get('commit') or 'anterior'}):")
+        for caminho, maior_melhor in METRICAS:
+            novo, velho = obter(cenario, caminho), obter(base, caminho)
+            if not isinstance(novo, (int, float)) or not isinstance(velho, (int, float)) or not velho:
+                continue
+            variacao = (novo - velho) / velho
+            piorou = -variacao > tolerancia if maior_melhor else variacao > tolerancia
+            regressoes += piorou
+            print(f"  {'.'.join(caminho):45s} {velho:12.3f} -> {novo:12.3f} ({variacao:+.1%}){'  REGRESSÃO' if piorou else ''}")
+    return regressoes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark ponta a ponta do nivel3 ao nivel6.")
+    parser.add_argument('--tamanhos', default='10M', help="Tamanhos do nivel4 sintético, separados por vírgula (ex.: 10M,1G,10G; padrão: 10M)")
+    parser.add_argument('--nos', type=int, default=100, help="Nós simulados (padrão: 100)")
+    parser.add_argument('--intervalo', type=float, default=0.1, help="nivel3.intervalo_medicoes durante o teste (padrão: 0.1)")
+    parser.add_argument('--janela', type=int, default=4, help="nivel3.janela_requisicoes durante o teste (padrão: 4)")
+    parser.add_argument('--duracao', type=float, default=10.0, help="Duração de cada medição em segundos (padrão: 10)")
+    parser.add_argument('--aquecimento', type=float, default=3.0, help="Espera antes de medir a ingestão (padrão: 3)")
+    parser.add_argument('--concorrencia', type=int, default=8, help="Clientes simultâneos na API (padrão: 8)")
+    parser.add_argument('--diretorio', default=None, help="Onde criar as cópias e os dados (padrão: diretório temporário)")
+    parser.add_argument('--saida', default='benchmark_sistema.json', help="Arquivo JSON de resultado (padrão: benchmark_sistema.json)")
+    parser.add_argument('--comparar', help="JSON de uma execução anterior para comparar")
+    parser.add_argument('--tolerancia', type=float, default=0.2, help="Piora relativa tolerada no --comparar (padrão: 0.2)")
+    parser.add_argument('--sonda-analise', help=argparse.SUPPRESS)
+    parser.add_argument('--sonda-painel', help=argparse.SUPPRESS)
+    parser.add_argument('--porta', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.sonda_analise:
+        return sonda_analise(args.sonda_analise, args.duracao)
+    if args.sonda_painel:
+        return sonda_painel(args.sonda_painel, args.porta)
+
+    resultado = {
+        'versao': VERSAO_RESULTADO,
+        'commit': commit_atual(),
+        'data': datetime.now().isoformat(timespec='seconds'),
+        'plataforma': {'python': platform.python_version(), 'sistema': platform.platform(), 'cpus': os.cpu_count()},
+        'parametros': {chave: getattr(args, chave) for chave in
+                       ('nos', 'intervalo', 'janela', 'duracao', 'aquecimento', 'concorrencia')},
+        'cenarios': [],
+    }
+    for rotulo in (texto.strip() for texto in args.tamanhos.split(',') if texto.strip()):
+        resultado['cenarios'].append(executar_cenario(rotulo, interpretar_tamanho(rotulo), args))
+
+    with open(args.saida, 'w', encoding='utf-8') as f:
+        json.dump(resultado, f, indent=2, ensure_ascii=False)
+    print(json.dumps(resultado['cenarios'], indent=2, ensure_ascii=False))
+    print(f"\nResultado gravado em '{args.saida}'.")
+
+    if args.comparar:
+        with open(args.comparar, 'r', encoding='utf-8') as f:
+            regressoes = comparar(resultado, json.load(f), args.tolerancia)
+        if regressoes:
+            print(f"\n{regressoes} métrica(s) piorou(aram) mais de {args.tolerancia:.0%}.")
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1 @@
+# comum - Módulos compartilhados entre os níveis 3, 5 e 6 do TWINsen
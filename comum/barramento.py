@@ -0,0 +1,277 @@
+# barramento.py - Barramento local das amostras decodificadas (nivel3 -> nivel5/nivel6)
+#
+# Anel circular num arquivo mapeado em memória (/dev/shm), com um único
+# escritor (base.py) e quantos leitores quiserem, cada um com o seu cursor.
+# Os CSVs/série binária continuam sendo o destino durável; o anel só evita
+# que analise.py e app.py esperem o escritor em lote e releiam os arquivos.
+#
+# Quem quer reagir a cada amostra (o painel) espera em aguardar(): o leitor
+# inscreve um socket Unix de datagramas (diretorio_leitores) e o escritor
+# manda um byte para cada inscrito depois de publicar, em vez de o leitor
+# consultar o anel em intervalos curtos.
+
+import hashlib
+import mmap
+import os
+import random
+import select
+import socket
+import struct
+import tempfile
+import time
+
+import numpy as np
+
+from comum.estado import ATUADORES
+
+MAGICO = b'TWBA'
+VERSAO = 1
+CAPACIDADE_PADRAO = 65536  # Registros retidos (~2 MiB); a ~2000 amostras/s, cerca de 30 s de folga
+
+# Cabeçalho: mágico, versão, tamanho do registro, capacidade, origem (muda a cada
+# reinício do escritor), índice do próximo registro a publicar
+CABECALHO = struct.Struct('<4sHHIIQ8x')
+OFFSET_ESCRITA = 16
+ESCRITA = struct.Struct('<Q')
+# Registro: timestamp (ms), RSSI (dBm), RTT (ms), luminosidade, nó, status, bits dos
+# atuadores e, por último, o índice do registro + 1 (0 enquanto o slot é reescrito)
+REGISTRO = struct.Struct('<qffHHBB2xQ')
+OFFSET_INDICE = 24
+DTYPE = np.dtype({
+    'names': ['timestamp_ms', 'rssi', 'rtt_ms', 'luminosidade', 'no', 'status', 'atuadores', 'indice'],
+    'formats': ['<i8', '<f4', '<f4', '<u2', '<u2', 'u1', 'u1', '<u8'],
+    'offsets': [0, 8, 12, 16, 18, 20, 21, 24],
+    'itemsize': REGISTRO.size,
+})
+
+
+INTERVALO_VARREDURA_S = 1.0  # O escritor relista os leitores inscritos no máximo uma vez por segundo
+
+
+def caminho_padrao():
+    """Em memória (/dev/shm) quando disponível, como as métricas e o cache de respostas."""
+    base = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+    return os.path.join(base, 'twinsen-barramento.bin')
+
+
+def diretorio_leitores(caminho):
+    """
+    Diretório dos sockets de aviso dos leitores do anel 'caminho'. Fica num
+    caminho curto derivado do anel, porque o endereço de um socket Unix é
+    limitado a ~100 bytes.
+    """
+    base = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+    resumo = hashlib.sha1(os.path.abspath(caminho).encode('utf-8')).hexdigest()[:12]
+    return os.path.join(base, f'twinsen-leitores-{resumo}')
+
+
+def bits_atuadores(dados):
+    """Estado dos LEDs/buzzer (dicionário de decodificar_uplink) nos bits usados pelo EstadoNos."""
+    return sum(1 << bit for bit, chave in enumerate(ATUADORES) if dados.get(chave))
+
+
+class PublicadorBarramento:
+    """
+    Lado do base.py: cria (ou recria) o anel e publica cada amostra com um
+    índice crescente. Não espera por ninguém: um leitor que ficar mais de
+    'capacidade' registros para trás percebe a lacuna pelo índice.
+    """
+
+    def __init__(self, caminho=None, capacidade=CAPACIDADE_PADRAO):
+        self.caminho = caminho or caminho_padrao()
+        self.capacidade = capacidade
+        self.indice = 0
+        tamanho = CABECALHO.size + capacidade * REGISTRO.size
+        origem = random.getrandbits(32)
+
+        # Arquivo novo a cada início, trocado de forma atômica: quem ainda mapeia
+        # o anterior percebe a troca pelo inode e reabre
+        temporario = f"{self.caminho}.{os.getpid()}.tmp"
+        with open(temporario, 'w+b') as f:
+            f.write(CABECALHO.pack(MAGICO, VERSAO, REGISTRO.size, capacidade, origem, 0))
+            f.truncate(tamanho)
+            self._mapa = mmap.mmap(f.fileno(), tamanho)
+        os.replace(temporario, self.caminho)
+
+        self._leitores = []
+        self._varrido_em = None
+        try:
+            self._aviso = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            self._aviso.setblocking(False)
+        except (AttributeError, OSError):  # Sem sockets Unix: os leitores esperam o intervalo deles
+            self._aviso = None
+
+    def publicar(self, timestamp_ms, no, rssi, luminosidade, status, rtt_ms=float('nan'), atuadores=0):
+        offset = CABECALHO.size + (self.indice % self.capacidade) * REGISTRO.size
+        ESCRITA.pack_into(self._mapa, offset + OFFSET_INDICE, 0)
+        REGISTRO.pack_into(self._mapa, offset, timestamp_ms, rssi, rtt_ms, luminosidade, no, status, atuadores,
+                           self.indice + 1)
+        self.indice += 1
+        ESCRITA.pack_into(self._mapa, OFFSET_ESCRITA, self.indice)
+        self.avisar()
+
+    def avisar(self):
+        """Acorda os leitores em aguardar(): um datagrama de 1 byte para cada socket inscrito."""
+        if self._aviso is None:
+            return
+        agora = time.monotonic()
+        if self._varrido_em is None or agora - self._varrido_em >= INTERVALO_VARREDURA_S:
+            self._varrido_em = agora
+            try:
+                self._leitores = [entrada.path for entrada in os.scandir(diretorio_leitores(self.caminho))
+                                  if entrada.name.endswith('.sock')]
+            except OSError:
+                self._leitores = []
+        for caminho in list(self._leitores):
+            try:
+                self._aviso.sendto(b'\x01', caminho)
+            except BlockingIOError:
+                pass  # Fila do leitor cheia: ele já tem avisos pendentes
+            except (ConnectionRefusedError, FileNotFoundError):
+                # Leitor encerrado sem remover o seu socket
+                self._leitores.remove(caminho)
+                try:
+                    os.remove(caminho)
+                except OSError:
+                    pass
+            except OSError:
+                pass
+
+    def fechar(self):
+        if self._mapa is not None:
+            self._mapa.close()
+            self._mapa = None
+        if self._aviso is not None:
+            self._aviso.close()
+            self._aviso = None
+
+
+class LeitorBarramento:
+    """
+    Um assinante do anel. ler() devolve os registros publicados desde a
+    chamada anterior (array NumPy com os campos de DTYPE) e se a sequência
+    está contínua. Ela não está na primeira leitura, quando o escritor
+    reinicia ou quando o leitor ficou para trás e registros foram
+    sobrescritos; nesses casos o leitor recomeça do registro mais antigo
+    ainda retido e quem precisa de todas as amostras completa pelos arquivos.
+    aguardar() bloqueia até a próxima publicação.
+    """
+
+    def __init__(self, caminho=None):
+        self.caminho = caminho or caminho_padrao()
+        self._mapa = None
+        self._inode = None
+        self.capacidade = 0
+        self.proximo = None
+        self._aviso = None
+        self._caminho_aviso = None
+        self._sem_aviso = False
+
+    def _abrir(self):
+        """(Re)mapeia o anel se ele foi criado ou trocado; retorna False se ele não existe ou é inválido."""
+        try:
+            info = os.stat(self.caminho)
+        except OSError:
+            self._desmapear()
+            return False
+        if self._mapa is not None and info.st_ino == self._inode:
+            return True
+        self._desmapear()
+        try:
+            with open(self.caminho, 'rb') as f:
+                magico, versao, tamanho_registro, capacidade, _, _ = CABECALHO.unpack(f.read(CABECALHO.size))
+                if magico != MAGICO or versao != VERSAO or tamanho_registro != REGISTRO.size:
+                    return False
+                self._mapa = mmap.mmap(f.fileno(), CABECALHO.size + capacidade * REGISTRO.size,
+                                       access=mmap.ACCESS_READ)
+        except (OSError, ValueError, struct.error):
+            return False
+        self._inode = info.st_ino
+        self.capacidade = capacidade
+        self.proximo = None
+        return True
+
+    def disponivel(self):
+        return self._abrir()
+
+    def ler(self):
+        """Retorna (registros, contínuo); (None, False) se não há anel publicado."""
+        if not self._abrir():
+            return None, False
+        (escrita,) = ESCRITA.unpack_from(self._mapa, OFFSET_ESCRITA)
+        continuo = self.proximo is not None
+        if not continuo or escrita - self.proximo > self.capacidade or self.proximo > escrita:
+            continuo = False
+            self.proximo = max(escrita - self.capacidade, 0)
+
+        quantidade = escrita - self.proximo
+        if not quantidade:
+            return np.empty(0, dtype=DTYPE), continuo
+        inicio = self.proximo % self.capacidade
+        primeiro = min(quantidade, self.capacidade - inicio)
+        partes = [np.frombuffer(self._mapa, dtype=DTYPE, count=primeiro, offset=CABECALHO.size + inicio * REGISTRO.size)]
+        if quantidade > primeiro:
+            partes.append(np.frombuffer(self._mapa, dtype=DTYPE, count=quantidade - primeiro, offset=CABECALHO.size))
+        registros = np.concatenate(partes)
+
+        # Slots reescritos durante a cópia (leitor lento) não têm o índice esperado
+        validos = registros['indice'] == np.arange(self.proximo + 1, escrita + 1, dtype=np.uint64)
+        if not validos.all():
+            continuo = False
+            registros = registros[validos]
+        self.proximo = escrita
+        return registros, continuo
+
+    def _inscrever(self):
+        """Socket de aviso inscrito em diretorio_leitores(); None se o sistema não tem sockets Unix."""
+        if self._aviso is None and not self._sem_aviso:
+            diretorio = diretorio_leitores(self.caminho)
+            caminho = os.path.join(diretorio, f"{os.getpid()}-{id(self):x}.sock")
+            try:
+                os.makedirs(diretorio, exist_ok=True)
+                aviso = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+                if os.path.exists(caminho):
+                    os.remove(caminho)  # Sobra de um processo anterior com o mesmo pid
+                aviso.bind(caminho)
+                aviso.setblocking(False)
+            except (AttributeError, OSError) as e:
+                print(f"[AVISO] Avisos do barramento indisponíveis, o leitor espera o intervalo inteiro: {e}")
+                self._sem_aviso = True
+                return None
+            self._aviso, self._caminho_aviso = aviso, caminho
+        return self._aviso
+
+    def aguardar(self, timeout):
+        """
+        Espera o escritor publicar algo depois do último aviso consumido, por até
+        'timeout' segundos. Retorna True se foi avisado (sem sockets Unix, só dorme).
+        """
+        aviso = self._inscrever()
+        if aviso is None:
+            time.sleep(timeout)
+            return False
+        prontos, _, _ = select.select([aviso], [], [], timeout)
+        if not prontos:
+            return False
+        try:
+            while True:
+                aviso.recv(64)  # Vários avisos acumulados valem por um
+        except BlockingIOError:
+            pass
+        return True
+
+    def _desmapear(self):
+        if self._mapa is not None:
+            self._mapa.close()
+            self._mapa = None
+        self._inode = None
+
+    def fechar(self):
+        self._desmapear()
+        if self._aviso is not None:
+            self._aviso.close()
+            self._aviso = None
+            try:
+                os.remove(self._caminho_aviso)
+            except OSError:
+                pass
@@ -0,0 +1,207 @@
+# cauda.py - Leitura das últimas linhas de arquivos que só crescem (logs CSV)
+
+import os
+import threading
+from collections import deque
+
+TAMANHO_BLOCO = 64 * 1024
+
+
+def fim_linhas_completas(f, inicio, tamanho):
+    """Offset logo após a última quebra de linha, desconsiderando uma linha ainda em escrita."""
+    if tamanho <= inicio:
+        return inicio
+    f.seek(tamanho - 1)
+    if f.read(1) == b'\n':
+        return tamanho
+    posicao = tamanho
+    while posicao > inicio:
+        bloco_inicio = max(posicao - TAMANHO_BLOCO, inicio)
+        f.seek(bloco_inicio)
+        bloco = f.read(posicao - bloco_inicio)
+        indice = bloco.rfind(b'\n')
+        if indice >= 0:
+            return bloco_inicio + indice + 1
+        posicao = bloco_inicio
+    return inicio
+
+
+def ler_ultimas_linhas(f, quantidade, inicio, fim):
+    """
+    Lê de trás para frente, em blocos, a partir de 'fim', até achar 'quantidade'
+    linhas completas ou chegar em 'inicio'. 'f' é um arquivo aberto em modo binário.
+    Retorna as linhas (bytes, sem o '\\n') em ordem.
+    """
+    if quantidade <= 0 or fim <= inicio:
+        return []
+    pedacos = []
+    quebras = 0
+    posicao = fim
+    while posicao > inicio and quebras <= quantidade:
+        tamanho = min(TAMANHO_BLOCO, posicao - inicio)
+        posicao -= tamanho
+        f.seek(posicao)
+        bloco = f.read(tamanho)
+        pedacos.append(bloco)
+        quebras += bloco.count(b'\n')
+    dados = b''.join(reversed(pedacos))
+    linhas = dados.split(b'\n')
+    if linhas and linhas[-1] == b'':
+        linhas.pop()
+    # Se não chegamos ao início, a primeira linha pode estar cortada
+    if posicao > inicio:
+        linhas = linhas[1:]
+    return linhas[-quantidade:]
+
+
+def ultimas_linhas(caminho, quantidade, cabecalho=True):
+    """Versão sem estado: retorna (cabeçalho, últimas linhas) como str, sem percorrer o arquivo todo."""
+    with open(caminho, 'rb') as f:
+        linha_cabecalho = f.readline() if cabecalho else b''
+        inicio = len(linha_cabecalho)
+        fim = fim_linhas_completas(f, inicio, f.seek(0, os.SEEK_END))
+        linhas = ler_ultimas_linhas(f, quantidade, inicio, fim)
+    return (linha_cabecalho.decode('utf-8').rstrip('\r\n'),
+            [linha.decode('utf-8').rstrip('\r') for linha in linhas])
+
+
+class LeitorCauda:
+    """
+    Mantém as últimas 'quantidade' linhas de um arquivo que só recebe linhas no
+    final. Na primeira leitura, busca a cauda de trás para frente a partir do EOF;
+    nas seguintes, lê apenas o que foi anexado desde o offset guardado. Assim, o
+    custo por leitura depende dos dados novos, não do tamanho do arquivo.
+    Numa rotação (comum/rotacao.py), termina de ler o segmento em que o arquivo
+    anterior virou e segue o novo desde o começo; se o arquivo for trocado de
+    outro jeito ou truncado, recomeça do EOF.
+    Com 'reter=False', as linhas não ficam guardadas (uso apenas de novas()).
+    """
+
+    def __init__(self, caminho, quantidade, cabecalho=True, reter=True):
+        self.caminho = caminho
+        self.quantidade = quantidade
+        self.tem_cabecalho = cabecalho
+        self.cabecalho = ''
+        self.linhas = deque(maxlen=quantidade if reter else 0)
+        self._offset = None
+        self._inode = None
+        self._lock = threading.Lock()
+
+    def ler(self):
+        """Atualiza e retorna (cabeçalho, lista das últimas linhas). Levanta FileNotFoundError."""
+        with self._lock:
+            with open(self.caminho, 'rb') as f:
+                info = os.fstat(f.fileno())
+                if self._offset is None or info.st_ino != self._inode or info.st_size < self._offset:
+                    self._trocar_arquivo(f, info)
+                elif info.st_size > self._offset:
+                    self._ler_novas(f, info.st_size)
+            return self.cabecalho, list(self.linhas)
+
+    def novas(self):
+        """Retorna apenas as linhas anexadas desde a chamada anterior (todas as da cauda na primeira)."""
+        with self._lock:
+            with open(self.caminho, 'rb') as f:
+                info = os.fstat(f.fileno())
+                if self._offset is None or info.st_ino != self._inode or info.st_size < self._offset:
+                    return self._trocar_arquivo(f, info)
+                if info.st_size > self._offset:
+                    return self._ler_novas(f, info.st_size)
+                return []
+
+    def avancar_para_fim(self):
+        """Pula, sem ler, as linhas anexadas até agora (o chamador já as recebeu por outro caminho)."""
+        with self._lock:
+            with open(self.caminho, 'rb') as f:
+                info = os.fstat(f.fileno())
+                if self._offset is None or info.st_ino != self._inode or info.st_size < self._offset:
+                    self._inode = info.st_ino
+                    linha_cabecalho = f.readline() if self.tem_cabecalho else b''
+                    self.cabecalho = linha_cabecalho.decode('utf-8').rstrip('\r\n')
+                    self._offset = len(linha_cabecalho)
+                self._offset = fim_linhas_completas(f, self._offset, info.st_size)
+
+    def _trocar_arquivo(self, f, info):
+        """Primeira leitura, arquivo trocado ou truncado. Retorna as linhas novas."""
+        if self._offset is not None and info.st_ino != self._inode:
+            resto = self._resto_rotacionado()
+            if resto is not None:
+                self.linhas.extend(resto)
+                self._inode = info.st_ino
+                self._offset = 0  # O cabeçalho do arquivo novo é lido em _ler_novas
+                return resto + (self._ler_novas(f, info.st_size) if info.st_size else [])
+        return self._recomecar(f, info)
+
+    def _resto_rotacionado(self):
+        """
+        Linhas anexadas ao arquivo anterior depois da última leitura, lidas do
+        segmento do manifesto de rotação que guarda o inode desse arquivo (e,
+        se houve mais de uma rotação desde então, dos segmentos seguintes).
+        None se o arquivo não foi rotacionado ou o segmento não é o que estava
+        sendo lido.
+        """
+        from comum.rotacao import abrir_segmento, ler_manifesto  # rotacao importa este módulo
+
+        segmentos = ler_manifesto(self.caminho)
+        posicao = next((i for i in range(len(segmentos) - 1, -1, -1)
+                        if segmentos[i].get('inode') == self._inode), None)
+        if posicao is None or segmentos[posicao].get('bytes', 0) < self._offset:
+            return None
+        diretorio = os.path.dirname(os.path.abspath(self.caminho))
+        linhas = []
+        for indice, segmento in enumerate(segmentos[posicao:]):
+            try:
+                with abrir_segmento(os.path.join(diretorio, segmento['arquivo'])) as f:
+                    if indice == 0:
+                        f.seek(self._offset)
+                    elif self.tem_cabecalho:
+                        f.readline()
+                    dados = f.read()
+            except (OSError, EOFError) as e:
+                print(f"[AVISO] Não foi possível terminar de ler o segmento '{segmento['arquivo']}': {e}")
+                return linhas or None
+            completo = dados.rfind(b'\n') + 1
+            linhas.extend(self._decodificar(linha) for linha in dados[:completo].split(b'\n')[:-1])
+        return linhas
+
+    def _recomecar(self, f, info):
+        self._inode = info.st_ino
+        linha_cabecalho = f.readline() if self.tem_cabecalho else b''
+        self.cabecalho = linha_cabecalho.decode('utf-8').rstrip('\r\n')
+        fim = fim_linhas_completas(f, len(linha_cabecalho), info.st_size)
+        linhas = [self._decodificar(linha) for linha in
+                  ler_ultimas_linhas(f, self.quantidade, len(linha_cabecalho), fim)]
+        self.linhas.clear()
+        self.linhas.extend(linhas)
+        self._offset = fim
+        return linhas
+
+    def _ler_novas(self, f, tamanho):
+        if self._offset == 0 and self.tem_cabecalho:
+            # Arquivo recriado após uma rotação: o cabeçalho pode ainda não estar completo
+            f.seek(0)
+            linha_cabecalho = f.readline()
+            if not linha_cabecalho.endswith(b'\n'):
+                return []
+            self.cabecalho = linha_cabecalho.decode('utf-8').rstrip('\r\n')
+            self._offset = len(linha_cabecalho)
+            if tamanho <= self._offset:
+                return []
+        # Muitos dados novos de uma vez: é mais barato buscar a cauda de novo
+        if tamanho - self._offset > TAMANHO_BLOCO * max(self.quantidade // 256, 4):
+            fim = fim_linhas_completas(f, self._offset, tamanho)
+            linhas = [self._decodificar(linha) for linha in
+                      ler_ultimas_linhas(f, self.quantidade, self._offset, fim)]
+            self._offset = fim
+        else:
+            f.seek(self._offset)
+            dados = f.read(tamanho - self._offset)
+            completo = dados.rfind(b'\n') + 1  # Ignora uma última linha ainda incompleta
+            linhas = [self._decodificar(linha) for linha in dados[:completo].split(b'\n')[:-1]]
+            self._offset += completo
+        self.linhas.extend(linhas)
+        return linhas
+
+    @staticmethod
+    def _decodificar(linha):
+        return linha.decode('utf-8', errors='replace').rstrip('\r')
@@ -0,0 +1,91 @@
+# comandos.py - Canal de comandos do nivel6 para o nivel3 (UDP local, JSON)
+#
+# O app.py envia um comando (ex.: novos limiares) para o base.py, que o
+# repassa aos nós imediatamente, fora da grade de consultas, e responde quando
+# todos confirmaram (ou esgotaram as tentativas).
+
+import json
+import socket
+
+PORTA_COMANDOS_PADRAO = 8889
+HOST_COMANDOS = '127.0.0.1'
+TIMEOUT_RESPOSTA_S = 10.0
+TAMANHO_MAXIMO = 65507  # Maior datagrama UDP
+
+
+def porta_comandos(config):
+    """Porta do canal de comandos na seção 'nivel3' do YAML."""
+    return int((config or {}).get('nivel3', {}).get('porta_comandos', PORTA_COMANDOS_PADRAO))
+
+
+def codificar(mensagem):
+    """JSON compacto; se não couber num datagrama, descarta o detalhe por nó."""
+    dados = json.dumps(mensagem, separators=(',', ':')).encode('utf-8')
+    if len(dados) > TAMANHO_MAXIMO and 'nos' in mensagem:
+        dados = json.dumps({**mensagem, 'nos': None}, separators=(',', ':')).encode('utf-8')
+    return dados
+
+
+def enviar_comando(porta, comando, timeout=TIMEOUT_RESPOSTA_S):
+    """
+    Envia o comando ao nivel3 e espera a resposta. Retorna o dicionário da
+    resposta, ou None se o nivel3 não respondeu a tempo (parado ou pausado por falta de configuração).
+    """
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as udp_socket:
+        udp_socket.settimeout(timeout)
+        try:
+            udp_socket.sendto(codificar(comando), (HOST_COMANDOS, porta))
+            while True:
+                dados, _ = udp_socket.recvfrom(TAMANHO_MAXIMO)
+                try:
+                    resposta = json.loads(dados)
+                except ValueError:
+                    continue
+                if resposta.get('id') == comando.get('id'):
+                    return resposta
+        except (socket.timeout, ConnectionError):
+            return None
+        except OSError as e:
+            print(f"[ERRO] Falha no canal de comandos (porta {porta}): {e}")
+            return None
+
+
+class CanalComandos:
+    """Lado do base.py: socket não bloqueante só no loopback, lido pelo loop de coleta."""
+
+    def __init__(self, porta):
+        self.porta = porta
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        try:
+            self.socket.bind((HOST_COMANDOS, porta))
+        except OSError:
+            self.socket.close()
+            raise
+        self.socket.setblocking(False)
+
+    def receber(self):
+        """Retorna os comandos recebidos como [(dicionário, origem)], ignorando os inválidos."""
+        comandos = []
+        while True:
+            try:
+                dados, origem = self.socket.recvfrom(TAMANHO_MAXIMO)
+            except (BlockingIOError, InterruptedError):
+                return comandos
+            except OSError as e:
+                print(f"[ERRO] Falha na recepção de comandos: {e}")
+                return comandos
+            try:
+                comando = json.loads(dados)
+            except ValueError:
+                continue
+            if isinstance(comando, dict):
+                comandos.append((comando, origem))
+
+    def responder(self, origem, resposta):
+        try:
+            self.socket.sendto(codificar(resposta), origem)
+        except OSError as e:
+            print(f"[ERRO] Falha ao responder o comando {resposta.get('id')}: {e}")
+
+    def fechar(self):
+        self.socket.close()
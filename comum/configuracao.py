@@ -0,0 +1,91 @@
+# configuracao.py - Cache do configuracoes.yaml com recarga apenas quando o arquivo muda
+
+import os
+import threading
+import yaml
+
+ID_NO_PADRAO = 1
+
+
+def diferencas(antigo, novo, prefixo=''):
+    """Retorna o conjunto de chaves (no formato 'nivel1.porta') que diferem entre dois dicionários."""
+    alteradas = set()
+    antigo = antigo if isinstance(antigo, dict) else {}
+    novo = novo if isinstance(novo, dict) else {}
+    for chave in antigo.keys() | novo.keys():
+        caminho = f"{prefixo}{chave}"
+        valor_antigo = antigo.get(chave)
+        valor_novo = novo.get(chave)
+        if isinstance(valor_antigo, dict) and isinstance(valor_novo, dict):
+            alteradas |= diferencas(valor_antigo, valor_novo, caminho + '.')
+        elif chave not in antigo or chave not in novo or valor_antigo != valor_novo:
+            alteradas.add(caminho)
+    return alteradas
+
+
+class CacheConfiguracao:
+    """
+    Mantém o último snapshot do YAML de configuração e só volta a fazer o parse
+    quando o arquivo muda (mtime, tamanho ou inode, que muda a cada os.replace).
+    O snapshot retornado é compartilhado: os chamadores não devem modificá-lo.
+    """
+
+    def __init__(self, caminho):
+        self.caminho = caminho
+        self._assinatura = None
+        self._config = None
+        self._lock = threading.Lock()
+
+    def carregar(self):
+        """
+        Retorna (config, chaves_alteradas). 'chaves_alteradas' lista as chaves que
+        mudaram desde a chamada anterior (vazio se o arquivo não mudou). Em caso
+        de erro, retorna (None, set()) e tenta novamente na próxima chamada.
+        """
+        with self._lock:
+            try:
+                info = os.stat(self.caminho)
+            except FileNotFoundError:
+                print(f"Erro: Arquivo de configuração não encontrado em '{self.caminho}'")
+                self._assinatura = None
+                return None, set()
+
+            assinatura = (info.st_mtime_ns, info.st_size, info.st_ino)
+            if assinatura == self._assinatura:
+                return self._config, set()
+
+            try:
+                with open(self.caminho, 'r') as f:
+                    config = yaml.safe_load(f) or {}
+            except (OSError, yaml.YAMLError) as e:
+                print(f"Erro ao ler o arquivo YAML: {e}")
+                return None, set()
+
+            alteradas = diferencas(self._config, config)
+            self._config = config
+            self._assinatura = assinatura
+            return config, alteradas
+
+    def obter(self):
+        """Retorna apenas o snapshot atual da configuração (ou None em caso de erro)."""
+        return self.carregar()[0]
+
+
+def listar_nos(config):
+    """
+    Retorna os nós sensores definidos em 'nivel1'. Aceita a lista 'nivel1.nos'
+    (cada item com 'ip' e, opcionalmente, 'id', 'porta' e 'endereco') ou o
+    formato antigo, com um único 'nivel1.ip'.
+    """
+    nivel1 = config['nivel1']
+    porta_padrao = int(nivel1['porta'])
+    nos_config = nivel1.get('nos') or [{'id': ID_NO_PADRAO, 'ip': nivel1['ip']}]
+    return [
+        {
+            'id': int(no.get('id', indice)),
+            'ip': no['ip'],
+            'porta': int(no.get('porta', porta_padrao)),
+            'endereco_rede': int(no.get('endereco', 1)),
+        }
+        for indice, no in enumerate(nos_config, start=1)
+    ]
@@ -0,0 +1,90 @@
+# esboco.py - Esboço de quantis (DDSketch) que se junta por soma, para percentis sem guardar as amostras
+#
+# Cada valor cai num balde logarítmico de razão GAMA, de modo que qualquer
+# quantil estimado fica a no máximo ALFA (1%) do valor real, em termos relativos.
+# Esboços de intervalos ou nós diferentes se juntam somando as contagens dos
+# baldes, sem reler os dados brutos.
+
+import math
+
+ALFA = 0.01
+GAMA = (1 + ALFA) / (1 - ALFA)
+LOG_GAMA = math.log(GAMA)
+DESLOCAMENTO = 1000  # Índices dos baldes ficam em (-DESLOCAMENTO, ...): |valor| acima de ~2e-9
+MINIMO_INDEXAVEL = GAMA ** (1 - DESLOCAMENTO)  # Abaixo disso (em módulo), o valor conta como zero
+PERCENTIS_PADRAO = (5, 50, 95)
+
+
+def chave_esboco(valor):
+    """
+    Balde de um valor como inteiro cuja ordem é a dos valores: negativos
+    abaixo de 0 (zero), positivos acima.
+    """
+    modulo = abs(valor)
+    if modulo < MINIMO_INDEXAVEL:
+        return 0
+    chave = math.ceil(math.log(modulo) / LOG_GAMA) + DESLOCAMENTO
+    return chave if valor > 0 else -chave
+
+
+def valor_chave(chave):
+    """Valor representativo do balde (erro relativo máximo ALFA para tudo o que caiu nele)."""
+    if chave == 0:
+        return 0.0
+    modulo = 2 * GAMA ** (abs(chave) - DESLOCAMENTO) / (GAMA + 1)
+    return modulo if chave > 0 else -modulo
+
+
+class EsbocoQuantis:
+    """Contagens por balde (chave_esboco) e as operações de juntar e estimar quantis."""
+
+    def __init__(self, baldes=None):
+        self.baldes = dict(baldes or {})
+
+    def __len__(self):
+        return sum(self.baldes.values())
+
+    def adicionar(self, valor, contagem=1):
+        chave = chave_esboco(valor)
+        self.baldes[chave] = self.baldes.get(chave, 0) + contagem
+
+    def juntar(self, outro):
+        for chave, contagem in outro.baldes.items():
+            self.baldes[chave] = self.baldes.get(chave, 0) + contagem
+        return self
+
+    def quantis(self, fracoes):
+        """Estimativas dos quantis (frações em [0, 1]), na ordem pedida; None se o esboço está vazio."""
+        total = len(self)
+        if not total:
+            return [None] * len(fracoes)
+        chaves = sorted(self.baldes)
+        resultado = []
+        for fracao in fracoes:
+            posicao = min(max(fracao, 0.0), 1.0) * (total - 1)
+            acumulado = 0
+            for chave in chaves:
+                acumulado += self.baldes[chave]
+                if acumulado > posicao:
+                    break
+            resultado.append(valor_chave(chave))
+        return resultado
+
+    def percentis(self, percentis=PERCENTIS_PADRAO):
+        """{'p5': ..., 'p50': ..., 'p95': ...}, arredondados em 2 casas como as estatísticas."""
+        valores = self.quantis([percentil / 100 for percentil in percentis])
+        return {f"p{percentil:g}": (round(valor, 2) if valor is not None else None)
+                for percentil, valor in zip(percentis, valores)}
+
+    def codificar(self):
+        """Texto compacto 'chave:contagem' separado por espaços, em ordem (vai numa célula do CSV)."""
+        return ' '.join(f"{chave}:{contagem}" for chave, contagem in sorted(self.baldes.items()))
+
+    @classmethod
+    def decodificar(cls, texto):
+        """Inverso de codificar(). Levanta ValueError se o texto não é um esboço."""
+        baldes = {}
+        for item in (texto or '').split():
+            chave, contagem = item.split(':')
+            baldes[int(chave)] = baldes.get(int(chave), 0) + int(contagem)
+        return cls(baldes)
@@ -0,0 +1,136 @@
+# escritor.py - Escrita de logs em lotes, numa thread de fundo
+
+import csv
+import os
+import queue
+import threading
+import time
+
+from comum.indice import IndiceEsparso
+from comum.metricas import registro
+from comum.rotacao import Rotacionador
+
+LIMITE_PENDENTES = 100000  # Itens retidos por destino enquanto o disco falha, antes de descartar
+
+duracao_lote = registro.histograma('twinsen_escrita_lote_segundos', "Duração da gravação de um lote por arquivo",
+                                   ('arquivo',))
+itens_gravados = registro.contador('twinsen_escrita_itens_total', "Itens gravados em disco por arquivo", ('arquivo',))
+
+
+class ArquivoCSV:
+    """
+    Destino CSV: anexa linhas, escrevendo o cabeçalho se o arquivo ainda não
+    existir. Com 'indexar', mantém o índice esparso timestamp -> offset
+    (comum.indice) a partir da primeira coluna de cada lote. Com uma política
+    de rotação (comum.rotacao), o arquivo é rotacionado antes do lote que a vencer.
+    """
+
+    def __init__(self, caminho, cabecalho, indexar=False, rotacao=None):
+        self.caminho = caminho
+        self.cabecalho = cabecalho
+        self.indice = IndiceEsparso(caminho) if indexar else None
+        self.rotacionador = Rotacionador(caminho, rotacao) if rotacao else None
+
+    def gravar(self, linhas, fsync=False):
+        if self.rotacionador is not None:
+            self.rotacionador.verificar()
+        file_exists = os.path.isfile(self.caminho)
+        with open(self.caminho, mode='a', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            if not file_exists:
+                writer.writerow(self.cabecalho)
+            if self.indice is not None and linhas:
+                f.flush()
+                try:
+                    self.indice.registrar(os.fstat(f.fileno()).st_size, str(linhas[0][0]))
+                except OSError as e:
+                    print(f"Erro ao atualizar o índice de '{self.caminho}': {e}")
+            writer.writerows(linhas)
+            if fsync:
+                f.flush()
+                os.fsync(f.fileno())
+
+    def __str__(self):
+        return self.caminho
+
+
+class EscritorLotes:
+    """
+    Recebe itens por uma fila e os grava em lote numa thread de fundo, para
+    que a latência do disco (ex.: cartões SD) não atrase o loop de polling.
+    Um lote é gravado quando acumula 'max_linhas' ou quando o item mais antigo
+    espera 'max_atraso_s'. Com 'fsync', cada lote é forçado para o disco.
+
+    Um destino é qualquer objeto com o método gravar(itens, fsync), como
+    ArquivoCSV ou comum.serie_temporal.SerieTemporal.
+    """
+
+    def __init__(self, max_linhas=200, max_atraso_s=1.0, fsync=False, rotacao=None):
+        self.max_linhas = max_linhas
+        self.max_atraso_s = max_atraso_s
+        self.fsync = fsync
+        self.rotacao = rotacao  # Política de rotação dos CSVs (None = sem rotação)
+        self._fila = queue.Queue()
+        self._pendentes = {}  # destino -> [itens]
+        self._arquivos_csv = {}  # caminho -> ArquivoCSV
+        self._thread = threading.Thread(target=self._executar, name="EscritorLotes", daemon=True)
+        self._thread.start()
+
+    def registrar(self, destino, item):
+        """Enfileira um item para o destino informado."""
+        self._fila.put((destino, item))
+
+    def registrar_csv(self, caminho, cabecalho, linha, indexar=False):
+        """Enfileira uma linha de CSV; o cabeçalho é escrito se o arquivo ainda não existir."""
+        destino = self._arquivos_csv.get(caminho)
+        if destino is None:
+            destino = self._arquivos_csv[caminho] = ArquivoCSV(caminho, cabecalho, indexar, self.rotacao)
+        self.registrar(destino, linha)
+
+    def fechar(self):
+        """Grava tudo o que estiver pendente e encerra a thread."""
+        self._fila.put(None)
+        self._thread.join()
+
+    def _executar(self):
+        total = 0
+        prazo = None
+        encerrar = False
+        while not encerrar:
+            espera = None if prazo is None else max(prazo - time.monotonic(), 0)
+            try:
+                item = self._fila.get(timeout=espera)
+            except queue.Empty:
+                item = ()  # Prazo do lote vencido
+
+            if item is None:
+                encerrar = True
+            elif item:
+                destino, dado = item
+                self._pendentes.setdefault(destino, []).append(dado)
+                total += 1
+                if prazo is None:
+                    prazo = time.monotonic() + self.max_atraso_s
+                if total < self.max_linhas and time.monotonic() < prazo:
+                    continue
+
+            total = self._gravar()
+            prazo = time.monotonic() + self.max_atraso_s if total else None
+
+    def _gravar(self):
+        """Grava os lotes pendentes; retorna quantos itens ficaram retidos por erro de I/O."""
+        retidos = 0
+        for destino, itens in list(self._pendentes.items()):
+            arquivo = os.path.basename(str(destino))
+            try:
+                with duracao_lote.cronometrar(arquivo=arquivo):
+                    destino.gravar(itens, self.fsync)
+                itens_gravados.inc(len(itens), arquivo=arquivo)
+                del self._pendentes[destino]
+            except IOError as e:
+                print(f"Erro de I/O ao gravar lote de {len(itens)} item(ns) em '{destino}': {e}")
+                if len(itens) > LIMITE_PENDENTES:
+                    print(f"[AVISO] Descartando {len(itens) - LIMITE_PENDENTES} item(ns) antigos de '{destino}'.")
+                    del itens[:-LIMITE_PENDENTES]
+                retidos += len(itens)
+        return retidos
@@ -0,0 +1,152 @@
+# estado.py - Registro binário (mmap) com o estado ao vivo de cada nó sensor
+
+import mmap
+import os
+import struct
+import time
+from datetime import datetime
+
+MAGICO = b'TWSE'
+VERSAO = 1
+CAPACIDADE_PADRAO = 256
+MAX_TENTATIVAS = 10000  # Leituras repetidas de um slot antes de desistir do seqlock
+
+# Cabeçalho: mágico, versão, capacidade (slots), tamanho do slot
+CABECALHO = struct.Struct('<4sHHH6x')
+# Slot: contador de versão (seqlock) seguido dos dados do nó
+SEQ = struct.Struct('<I')
+DADOS = struct.Struct('<HBxHxxfqf4x')  # id, flags, luminosidade, rssi, timestamp (ms), rtt (ms)
+TAMANHO_SLOT = SEQ.size + DADOS.size
+
+# Bits do campo 'flags'
+ATUADORES = ('led_verde', 'led_amarelo', 'led_vermelho', 'buzzer')
+OCUPADO = 0x80
+
+
+class EstadoNos:
+    """
+    Estado ao vivo (LEDs, buzzer, luminosidade, RSSI, RTT) de cada nó em um
+    arquivo de layout fixo, mapeado em memória. Um único processo escreve
+    (base.py); os leitores (app.py) leem sem parse e sem trava.
+
+    Cada slot usa um seqlock: o escritor deixa o contador ímpar durante a
+    escrita e par ao terminar, e o leitor repete a leitura se o contador
+    estava ímpar ou mudou no meio dela.
+    """
+
+    def __init__(self, caminho, escrita=False, capacidade=CAPACIDADE_PADRAO):
+        self.caminho = caminho
+        self.escrita = escrita
+        self.capacidade = capacidade
+        self._mapa = None
+        self._slots = {}  # id do nó -> índice do slot
+        if escrita:
+            self._abrir_escrita()
+
+    def _abrir_escrita(self):
+        tamanho = CABECALHO.size + self.capacidade * TAMANHO_SLOT
+        cabecalho = CABECALHO.pack(MAGICO, VERSAO, self.capacidade, TAMANHO_SLOT)
+        with os.fdopen(os.open(self.caminho, os.O_RDWR | os.O_CREAT), 'r+b') as f:
+            if f.read(CABECALHO.size) != cabecalho:
+                # Arquivo novo, de layout antigo ou corrompido: zera sem encolher o arquivo,
+                # para não invalidar o mapeamento de um leitor já aberto
+                f.seek(0)
+                f.write(cabecalho + bytes(tamanho - CABECALHO.size))
+            f.truncate(tamanho)
+            self._mapa = mmap.mmap(f.fileno(), tamanho)
+
+        for indice in range(self.capacidade):
+            id_no, flags = self._ler_dados(indice)[:2]
+            if flags & OCUPADO:
+                self._slots[id_no] = indice
+
+    def _abrir_leitura(self):
+        """Mapeia o arquivo para leitura; retorna False se ele ainda não existe ou é inválido."""
+        try:
+            with open(self.caminho, 'rb') as f:
+                magico, versao, capacidade, tamanho_slot = CABECALHO.unpack(f.read(CABECALHO.size))
+                if magico != MAGICO or versao != VERSAO or tamanho_slot != TAMANHO_SLOT:
+                    return False
+                self.capacidade = capacidade
+                self._mapa = mmap.mmap(f.fileno(), CABECALHO.size + capacidade * TAMANHO_SLOT,
+                                       access=mmap.ACCESS_READ)
+            return True
+        except (OSError, ValueError, struct.error):
+            return False
+
+    def _offset(self, indice):
+        return CABECALHO.size + indice * TAMANHO_SLOT
+
+    def _ler_dados(self, indice):
+        return DADOS.unpack_from(self._mapa, self._offset(indice) + SEQ.size)
+
+    def atualizar(self, id_no, estados, luminosidade, rssi, rtt_ms=None, timestamp=None):
+        """Grava o estado de um nó ('estados' traz os booleanos de LEDs e buzzer)."""
+        indice = self._slots.get(id_no)
+        if indice is None:
+            if len(self._slots) >= self.capacidade:
+                print(f"[ERRO] Registro de estado cheio ({self.capacidade} nós); nó {id_no} ignorado.")
+                return
+            indice = len(self._slots)
+            self._slots[id_no] = indice
+
+        flags = OCUPADO
+        for bit, chave in enumerate(ATUADORES):
+            if estados.get(chave):
+                flags |= 1 << bit
+        timestamp_ms = int((time.time() if timestamp is None else timestamp) * 1000)
+
+        offset = self._offset(indice)
+        (seq,) = SEQ.unpack_from(self._mapa, offset)
+        SEQ.pack_into(self._mapa, offset, seq + 1)
+        DADOS.pack_into(self._mapa, offset + SEQ.size, id_no, flags, luminosidade, rssi, timestamp_ms,
+                        float('nan') if rtt_ms is None else rtt_ms)
+        SEQ.pack_into(self._mapa, offset, (seq + 2) & 0xFFFFFFFF)
+
+    def _ler_slot(self, indice):
+        """Leitura consistente de um slot, repetindo enquanto houver escrita em andamento."""
+        offset = self._offset(indice)
+        for _ in range(MAX_TENTATIVAS):
+            (antes,) = SEQ.unpack_from(self._mapa, offset)
+            if antes & 1:
+                continue
+            dados = DADOS.unpack_from(self._mapa, offset + SEQ.size)
+            (depois,) = SEQ.unpack_from(self._mapa, offset)
+            if antes == depois:
+                return antes, dados
+        # O escritor morreu no meio de uma escrita: retorna o que houver no slot
+        return antes, DADOS.unpack_from(self._mapa, offset + SEQ.size)
+
+    def ler_todos(self):
+        """Retorna o estado de todos os nós registrados, como dicionários."""
+        if self._mapa is None and not self._abrir_leitura():
+            return []
+
+        resultado = []
+        for indice in range(self.capacidade):
+            versao, (id_no, flags, luminosidade, rssi, timestamp_ms, rtt_ms) = self._ler_slot(indice)
+            if not flags & OCUPADO:
+                break  # Os slots são ocupados em ordem
+            estado = {chave: bool(flags & (1 << bit)) for bit, chave in enumerate(ATUADORES)}
+            estado.update({
+                'id': id_no,
+                'luminosidade_atual': luminosidade,
+                'rssi': round(rssi, 2),
+                'rtt_ms': None if rtt_ms != rtt_ms else round(rtt_ms, 1),
+                'ultima_atualizacao': datetime.fromtimestamp(timestamp_ms / 1000).strftime('%Y-%m-%d %H:%M:%S'),
+                'versao': versao,
+            })
+            resultado.append(estado)
+        return resultado
+
+    def ler(self, id_no):
+        """Retorna o estado de um nó, ou None se ele ainda não foi registrado."""
+        for estado in self.ler_todos():
+            if estado['id'] == id_no:
+                return estado
+        return None
+
+    def fechar(self):
+        if self._mapa is not None:
+            self._mapa.close()
+            self._mapa = None
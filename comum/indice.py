@@ -0,0 +1,177 @@
+# indice.py - Índice esparso timestamp -> offset dos CSVs brutos e busca por intervalo de tempo
+
+import os
+import struct
+
+import numpy as np
+
+from comum.serie_temporal import ler_timestamp
+
+MAGICO = b'TWIX'
+VERSAO = 1
+PASSO_INDICE = 64 * 1024  # Uma entrada a cada ~64 KiB de CSV
+TAMANHO_BLOCO = 64 * 1024
+
+# Cabeçalho: mágico, versão, inode do CSV indexado (detecta troca/migração do arquivo)
+CABECALHO = struct.Struct('<4sHxxQ')
+# Entrada: timestamp (ms desde a época) da linha que começa em 'offset'
+ENTRADA = struct.Struct('<qQ')
+DTYPE = np.dtype([('timestamp_ms', '<i8'), ('offset', '<u8')])
+
+
+def chave_linha(linha):
+    """Primeira coluna (timestamp) de uma linha de CSV em bytes."""
+    return linha.split(b',', 1)[0].strip()
+
+
+def bisseccao_csv(f, alvo, inicio, fim):
+    """
+    Offset de um início de linha em [inicio, fim] a partir do qual, num CSV
+    ordenado pela primeira coluna, estão todas as linhas com chave >= 'alvo'
+    (bytes). Busca binária por seek; termina quando sobra no máximo um bloco.
+    """
+    while fim - inicio > TAMANHO_BLOCO:
+        meio = (inicio + fim) // 2
+        f.seek(meio)
+        f.readline()  # Descarta a linha cortada
+        posicao = f.tell()
+        linha = f.readline()
+        if posicao >= fim or not linha.endswith(b'\n'):
+            fim = meio
+        elif chave_linha(linha) < alvo:
+            inicio = posicao
+        else:
+            fim = meio
+    return inicio
+
+
+class IndiceEsparso:
+    """
+    Arquivo '<csv>.idx' com uma entrada (timestamp, offset) a cada PASSO_INDICE
+    bytes do CSV. Mantido pelo escritor (registrar) à medida que os lotes são
+    anexados; lido pelas consultas (buscar) para saltar direto ao trecho pedido.
+    Se o CSV for trocado (migração de cabeçalho, rotação), o índice é refeito.
+    """
+
+    def __init__(self, caminho_csv, passo=PASSO_INDICE):
+        self.caminho_csv = caminho_csv
+        self.caminho = caminho_csv + '.idx'
+        self.passo = passo
+        self._inode = None
+        self._ultimo_offset = None
+
+    def registrar(self, offset, timestamp):
+        """Chamado antes de anexar um lote em 'offset', cuja primeira linha tem 'timestamp' (texto)."""
+        inode = os.stat(self.caminho_csv).st_ino
+        if inode != self._inode:
+            self._abrir(inode)
+        if offset - self._ultimo_offset < self.passo:
+            return
+        try:
+            timestamp_ms = ler_timestamp(timestamp)
+        except ValueError:
+            return
+        with open(self.caminho, 'ab') as f:
+            f.write(ENTRADA.pack(timestamp_ms, offset))
+        self._ultimo_offset = offset
+
+    def _abrir(self, inode):
+        """Reaproveita o índice existente se ele for deste CSV; senão, reconstrói."""
+        self._inode = inode
+        try:
+            with open(self.caminho, 'rb') as f:
+                magico, versao, inode_indice = CABECALHO.unpack(f.read(CABECALHO.size))
+                if (magico, versao, inode_indice) == (MAGICO, VERSAO, inode):
+                    tamanho = f.seek(0, os.SEEK_END)
+                    quantidade = (tamanho - CABECALHO.size) // ENTRADA.size
+                    if quantidade:
+                        f.seek(CABECALHO.size + (quantidade - 1) * ENTRADA.size)
+                        self._ultimo_offset = ENTRADA.unpack(f.read(ENTRADA.size))[1]
+                    else:
+                        self._ultimo_offset = -self.passo
+                    return
+        except (OSError, struct.error):
+            pass
+        self._reconstruir(inode)
+
+    def _reconstruir(self, inode):
+        """Percorre o CSV uma vez e grava um índice novo (troca atômica)."""
+        if os.path.getsize(self.caminho_csv) > self.passo * 16:
+            print(f"[INFO] Reconstruindo o índice de '{os.path.basename(self.caminho_csv)}'...")
+        entradas = []
+        proximo = 0
+        with open(self.caminho_csv, 'rb') as f:
+            offset = len(f.readline())
+            for linha in f:
+                if offset >= proximo and linha.endswith(b'\n'):
+                    try:
+                        entradas.append(ENTRADA.pack(ler_timestamp(chave_linha(linha).decode('utf-8')), offset))
+                        proximo = offset + self.passo
+                    except (ValueError, UnicodeDecodeError):
+                        pass
+                offset += len(linha)
+        temporario = self.caminho + '.tmp'
+        with open(temporario, 'wb') as f:
+            f.write(CABECALHO.pack(MAGICO, VERSAO, inode))
+            f.write(b''.join(entradas))
+        os.replace(temporario, self.caminho)
+        self._ultimo_offset = proximo - self.passo if entradas else -self.passo
+
+    def buscar(self, timestamp_ms):
+        """
+        Trecho (inicio, fim) do CSV onde começam as linhas com 'timestamp_ms':
+        da última entrada anterior a ele até a primeira posterior (fim None =
+        até o final do arquivo). Retorna None se o índice não existe ou não é deste CSV.
+        """
+        try:
+            inode = os.stat(self.caminho_csv).st_ino
+            with open(self.caminho, 'rb') as f:
+                magico, versao, inode_indice = CABECALHO.unpack(f.read(CABECALHO.size))
+                if (magico, versao, inode_indice) != (MAGICO, VERSAO, inode):
+                    return None
+                dados = f.read()
+        except (OSError, struct.error):
+            return None
+        entradas = np.frombuffer(dados[:len(dados) - len(dados) % ENTRADA.size], dtype=DTYPE)
+        posicao = np.searchsorted(entradas['timestamp_ms'], timestamp_ms, side='left')
+        inicio = int(entradas['offset'][posicao - 1]) if posicao > 0 else 0
+        fim = int(entradas['offset'][posicao]) if posicao < len(entradas) else None
+        return inicio, fim
+
+
+def linhas_no_intervalo(caminho, inicio, fim, indice=None):
+    """
+    Gera as linhas (bytes, sem '\\n') de um CSV ordenado por timestamp cuja
+    primeira coluna está em [inicio, fim] (textos no formato dos CSVs). Usa o
+    índice esparso, se houver, para delimitar o começo e a busca binária por
+    seek para refiná-lo; lê só o trecho pedido.
+    """
+    alvo = inicio.encode('utf-8')
+    limite = fim.encode('utf-8')
+    with open(caminho, 'rb') as f:
+        comeco = len(f.readline())
+        tamanho = f.seek(0, os.SEEK_END)
+
+        trecho = None
+        if indice is not None:
+            try:
+                trecho = indice.buscar(ler_timestamp(inicio))
+            except ValueError:
+                pass
+        if trecho is not None:
+            offset_inicio, offset_fim = trecho
+            if comeco <= offset_inicio <= tamanho:
+                comeco = offset_inicio
+            if offset_fim is not None and comeco <= offset_fim <= tamanho:
+                tamanho = offset_fim
+        comeco = bisseccao_csv(f, alvo, comeco, tamanho)
+
+        f.seek(comeco)
+        for linha in f:
+            if not linha.endswith(b'\n'):
+                break  # Linha ainda em escrita
+            chave = chave_linha(linha)
+            if chave > limite:
+                break
+            if chave >= alvo:
+                yield linha.rstrip(b'\r\n')
@@ -0,0 +1,237 @@
+# metricas.py - Contadores e histogramas por processo, exportados no formato texto do Prometheus
+#
+# Cada processo (nivel3, nivel5) publica periodicamente um retrato das suas
+# métricas num diretório em memória; o /metrics do nivel6 junta esses retratos
+# com as suas próprias. Para ver sem o painel: python -m comum.metricas
+
+import bisect
+import json
+import math
+import os
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+BALDES_PADRAO = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+INTERVALO_PUBLICACAO_S = 5.0
+IDADE_MAXIMA_S = 300  # Retratos mais antigos que isso (processo parado) são ignorados
+
+
+def diretorio_padrao():
+    """Em memória (/dev/shm) quando disponível, como o cache de respostas do nivel6."""
+    base = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+    return os.path.join(base, 'twinsen-metricas')
+
+
+class _Metrica:
+    tipo = None
+
+    def __init__(self, nome, ajuda, rotulos, trava):
+        self.nome = nome
+        self.ajuda = ajuda
+        self.rotulos = tuple(rotulos)
+        self._trava = trava
+        self._series = {}
+
+    def _chave(self, valores):
+        return tuple(str(valores.get(rotulo, '')) for rotulo in self.rotulos)
+
+    def retrato(self):
+        with self._trava:
+            series = [[dict(zip(self.rotulos, chave)), self._copiar(valor)] for chave, valor in self._series.items()]
+        return {'tipo': self.tipo, 'ajuda': self.ajuda, 'series': series}
+
+    def _copiar(self, valor):
+        return valor
+
+
+class Contador(_Metrica):
+    tipo = 'counter'
+
+    def inc(self, valor=1, **rotulos):
+        chave = self._chave(rotulos)
+        with self._trava:
+            self._series[chave] = self._series.get(chave, 0) + valor
+
+
+class Medidor(_Metrica):
+    tipo = 'gauge'
+
+    def definir(self, valor, **rotulos):
+        with self._trava:
+            self._series[self._chave(rotulos)] = valor
+
+
+class Histograma(_Metrica):
+    tipo = 'histogram'
+
+    def __init__(self, nome, ajuda, rotulos, trava, baldes=BALDES_PADRAO):
+        super().__init__(nome, ajuda, rotulos, trava)
+        self.baldes = tuple(baldes)
+
+    def observar(self, valor, **rotulos):
+        chave = self._chave(rotulos)
+        posicao = bisect.bisect_left(self.baldes, valor)
+        with self._trava:
+            serie = self._series.get(chave)
+            if serie is None:
+                serie = self._series[chave] = {'baldes': [0] * (len(self.baldes) + 1), 'soma': 0.0, 'contagem': 0}
+            serie['baldes'][posicao] += 1
+            serie['soma'] += valor
+            serie['contagem'] += 1
+
+    @contextmanager
+    def cronometrar(self, **rotulos):
+        """Observa a duração (s) do bloco 'with'."""
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observar(time.perf_counter() - inicio, **rotulos)
+
+    def retrato(self):
+        dados = super().retrato()
+        dados['limites'] = list(self.baldes)
+        return dados
+
+    def _copiar(self, valor):
+        return {'baldes': list(valor['baldes']), 'soma': valor['soma'], 'contagem': valor['contagem']}
+
+
+class RegistroMetricas:
+    """Métricas de um processo. Criar uma métrica que já existe retorna a existente."""
+
+    def __init__(self):
+        self.processo = os.path.splitext(os.path.basename(sys.argv[0]))[0] or 'processo'
+        self._trava = threading.Lock()
+        self._metricas = {}
+        self._publicador = None
+
+    def _obter(self, classe, nome, ajuda, rotulos, **extras):
+        with self._trava:
+            metrica = self._metricas.get(nome)
+            if metrica is None:
+                metrica = self._metricas[nome] = classe(nome, ajuda, rotulos, threading.Lock(), **extras)
+        return metrica
+
+    def contador(self, nome, ajuda, rotulos=()):
+        return self._obter(Contador, nome, ajuda, rotulos)
+
+    def medidor(self, nome, ajuda, rotulos=()):
+        return self._obter(Medidor, nome, ajuda, rotulos)
+
+    def histograma(self, nome, ajuda, rotulos=(), baldes=BALDES_PADRAO):
+        return self._obter(Histograma, nome, ajuda, rotulos, baldes=baldes)
+
+    def retrato(self):
+        with self._trava:
+            metricas = list(self._metricas.values())
+        return {'processo': self.processo, 'instante': time.time(),
+                'metricas': {metrica.nome: metrica.retrato() for metrica in metricas}}
+
+    def publicar(self, diretorio=None):
+        """Grava o retrato atual em '<diretorio>/<processo>.json' (troca atômica)."""
+        diretorio = diretorio or diretorio_padrao()
+        os.makedirs(diretorio, exist_ok=True)
+        destino = os.path.join(diretorio, f"{self.processo}.json")
+        temporario = f"{destino}.{os.getpid()}.tmp"
+        with open(temporario, 'w', encoding='utf-8') as f:
+            json.dump(self.retrato(), f)
+        os.replace(temporario, destino)
+
+    def iniciar_publicacao(self, processo, intervalo=INTERVALO_PUBLICACAO_S, diretorio=None):
+        """Publica o retrato a cada 'intervalo' segundos numa thread de fundo."""
+        self.processo = processo
+        if self._publicador is not None:
+            return
+
+        def executar():
+            while True:
+                try:
+                    self.publicar(diretorio)
+                except OSError as e:
+                    print(f"[AVISO] Falha ao publicar as métricas de '{self.processo}': {e}")
+                time.sleep(intervalo)
+
+        self._publicador = threading.Thread(target=executar, name="PublicadorMetricas", daemon=True)
+        self._publicador.start()
+
+
+# Registro do processo, como o REGISTRY do prometheus_client
+registro = RegistroMetricas()
+
+
+def ler_publicados(diretorio=None, ignorar=None):
+    """Retratos publicados pelos outros processos (exceto 'ignorar'), descartando os velhos."""
+    diretorio = diretorio or diretorio_padrao()
+    retratos = []
+    try:
+        nomes = sorted(os.listdir(diretorio))
+    except OSError:
+        return retratos
+    agora = time.time()
+    for nome in nomes:
+        if not nome.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(diretorio, nome), 'r', encoding='utf-8') as f:
+                retrato = json.load(f)
+        except (OSError, ValueError):
+            continue
+        if retrato.get('processo') != ignorar and agora - retrato.get('instante', 0) <= IDADE_MAXIMA_S:
+            retratos.append(retrato)
+    return retratos
+
+
+def _rotulos(rotulos):
+    if not rotulos:
+        return ''
+    texto = ','.join('{}="{}"'.format(chave, str(valor).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n'))
+                     for chave, valor in rotulos.items())
+    return '{' + texto + '}'
+
+
+def _numero(valor):
+    if isinstance(valor, float) and math.isinf(valor):
+        return '+Inf' if valor > 0 else '-Inf'
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+def formatar_prometheus(retratos):
+    """
+    Junta os retratos no formato texto do Prometheus (0.0.4), uma família por
+    métrica, com o rótulo 'processo' em cada série.
+    """
+    familias = {}
+    for retrato in retratos:
+        processo = retrato.get('processo', '')
+        familias.setdefault('twinsen_metricas_publicacao_timestamp_segundos', {
+            'tipo': 'gauge', 'ajuda': "Instante do último retrato de métricas de cada processo", 'series': []
+        })['series'].append([{'processo': processo}, retrato.get('instante', 0)])
+        for nome, metrica in retrato.get('metricas', {}).items():
+            familia = familias.setdefault(nome, {'tipo': metrica['tipo'], 'ajuda': metrica['ajuda'],
+                                                 'limites': metrica.get('limites'), 'series': []})
+            for rotulos, valor in metrica['series']:
+                familia['series'].append([{'processo': processo, **rotulos}, valor])
+
+    linhas = []
+    for nome, familia in sorted(familias.items()):
+        linhas.append(f"# HELP {nome} {familia['ajuda']}")
+        linhas.append(f"# TYPE {nome} {familia['tipo']}")
+        for rotulos, valor in familia['series']:
+            if familia['tipo'] != 'histogram':
+                linhas.append(f"{nome}{_rotulos(rotulos)} {_numero(valor)}")
+                continue
+            acumulado = 0
+            for limite, quantidade in zip(list(familia['limites']) + [float('inf')], valor['baldes']):
+                acumulado += quantidade
+                linhas.append(f"{nome}_bucket{_rotulos({**rotulos, 'le': _numero(float(limite))})} {acumulado}")
+            linhas.append(f"{nome}_sum{_rotulos(rotulos)} {_numero(float(valor['soma']))}")
+            linhas.append(f"{nome}_count{_rotulos(rotulos)} {valor['contagem']}")
+    return '\n'.join(linhas) + '\n'
+
+
+if __name__ == '__main__':
+    print(formatar_prometheus(ler_publicados()), end='')
@@ -0,0 +1,129 @@
+# pacote.py - Codificação/decodificação do quadro UDP de 52 bytes trocado com os nós sensores
+# Uso offline: python -m comum.pacote captura.bin [--csv saida.csv]
+
+import argparse
+import csv
+import struct
+import sys
+
+import numpy as np
+
+from comum.estado import ATUADORES
+
+TAMANHO_PACOTE = 52
+
+# Downlink: [8] endereço de rede, [10] 0, [12] contador, [16..17] limiar 1, [18..19] limiar 2 (big-endian)
+DOWNLINK = struct.Struct('>8xBxBxB3xHH32x')
+LIMIAR_MAXIMO = 0xFFFF  # Os limiares vão no downlink como inteiros de 16 bits sem sinal
+# Uplink: [2] RSSI de downlink, [12] eco do contador, [17..18] luminosidade (big-endian),
+# [34]/[37]/[40]/[43] LED verde/amarelo/vermelho e buzzer
+UPLINK = struct.Struct('>2xB9xB4xH15xB2xB2xB2xB8x')
+DTYPE_UPLINK = np.dtype({
+    'names': ['rssi', 'contador', 'luminosidade', 'led_verde', 'led_amarelo', 'led_vermelho', 'buzzer'],
+    'formats': ['u1', 'u1', '>u2', 'u1', 'u1', 'u1', 'u1'],
+    'offsets': [2, 12, 17, 34, 37, 40, 43],
+    'itemsize': TAMANHO_PACOTE,
+})
+
+
+def rssi_de_byte(byte2):
+    """RSSI de downlink (dBm) a partir do byte 2, como o rádio o reporta."""
+    return ((byte2 - 256) / 2.0) - 74 if byte2 > 128 else (byte2 / 2.0) - 74
+
+
+def validar_limiar(valor):
+    """int(valor) se ele cabe no downlink (0 a LIMIAR_MAXIMO). Levanta ValueError ou TypeError."""
+    limiar = int(valor)
+    if not 0 <= limiar <= LIMIAR_MAXIMO:
+        raise ValueError(f"limiar {limiar} fora do intervalo 0..{LIMIAR_MAXIMO}")
+    return limiar
+
+
+def codificar_downlink(contador, endereco_rede, limiar_1, limiar_2):
+    """Monta o pacote de downlink com o contador e os limiares."""
+    return DOWNLINK.pack(endereco_rede, 0, contador, limiar_1, limiar_2)
+
+
+def codificar_downlink_em(buffer, contador, endereco_rede, limiar_1, limiar_2):
+    """Como codificar_downlink, mas escreve num buffer pré-alocado (sem criar bytes novos)."""
+    DOWNLINK.pack_into(buffer, 0, endereco_rede, 0, contador, limiar_1, limiar_2)
+
+
+def decodificar_uplink(pacote):
+    """
+    Extrai RSSI de downlink, contador, luminosidade e estado dos atuadores de um
+    pacote de uplink (bytes, bytearray ou memoryview, sem cópia).
+    """
+    rssi, contador, luminosidade, verde, amarelo, vermelho, buzzer = UPLINK.unpack_from(pacote)
+    return {
+        'rssi': rssi_de_byte(rssi),
+        'contador': contador,
+        'luminosidade': luminosidade,
+        'led_verde': bool(verde),
+        'led_amarelo': bool(amarelo),
+        'led_vermelho': bool(vermelho),
+        'buzzer': bool(buzzer),
+    }
+
+
+def decodificar_lote(dados):
+    """
+    Decodifica de uma vez um buffer com vários pacotes de uplink concatenados
+    (ex.: uma captura) em colunas NumPy: rssi (dBm), contador, luminosidade e
+    os atuadores (bool). Bytes finais que não completam um pacote são ignorados.
+    """
+    quantidade = len(dados) // TAMANHO_PACOTE
+    quadros = np.frombuffer(dados, dtype=DTYPE_UPLINK, count=quantidade)
+    byte_rssi = quadros['rssi'].astype(np.float64)
+    colunas = {
+        'rssi': np.where(byte_rssi > 128, byte_rssi - 256, byte_rssi) / 2.0 - 74,
+        'contador': quadros['contador'].copy(),
+        'luminosidade': quadros['luminosidade'].astype(np.uint16),
+    }
+    for atuador in ATUADORES:
+        colunas[atuador] = quadros[atuador] != 0
+    return colunas
+
+
+class ReceptorPacotes:
+    """
+    Recebe datagramas num buffer pré-alocado com recvfrom_into. O pacote
+    retornado é uma memoryview desse buffer: é válido só até a próxima chamada.
+    """
+
+    def __init__(self, tamanho_maximo=1024):
+        self._buffer = bytearray(tamanho_maximo)
+        self._visao = memoryview(self._buffer)
+
+    def receber(self, udp_socket):
+        """Retorna (pacote, endereço de origem)."""
+        tamanho, origem = udp_socket.recvfrom_into(self._buffer)
+        return self._visao[:tamanho], origem
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Decodifica uma captura de pacotes de uplink (52 bytes cada, concatenados).")
+    parser.add_argument('captura', help="Arquivo binário com os pacotes")
+    parser.add_argument('--csv', help="CSV de saída com uma linha por pacote")
+    args = parser.parse_args()
+
+    try:
+        with open(args.captura, 'rb') as f:
+            colunas = decodificar_lote(f.read())
+    except OSError as e:
+        print(f"ERRO: {e}")
+        sys.exit(1)
+
+    quantidade = len(colunas['rssi'])
+    print(f"{quantidade} pacote(s) decodificado(s).")
+    if quantidade:
+        print(f"RSSI médio: {colunas['rssi'].mean():.2f} dBm; luminosidade média: {colunas['luminosidade'].mean():.2f}")
+    if args.csv:
+        with open(args.csv, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(list(colunas))
+            writer.writerows(zip(*(coluna.tolist() for coluna in colunas.values())))
+
+
+if __name__ == '__main__':
+    main()
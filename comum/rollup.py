@@ -0,0 +1,155 @@
+# rollup.py - Agregados por intervalo (1 min, 1 h, 1 dia) mantidos incrementalmente
+
+import csv
+import os
+import tempfile
+
+from comum.esboco import EsbocoQuantis, chave_esboco
+
+# Resolução -> tamanho do prefixo do timestamp ('YYYY-MM-DD HH:MM:SS.fff') que identifica o intervalo
+RESOLUCOES = {'1min': 16, '1h': 13, '1d': 10}
+MODELO_INICIO = '0000-00-00 00:00:00'
+
+CABECALHO_ROLLUP = ["Inicio", "No", "Contagem", "Soma", "Minimo", "Maximo", "SomaQuadrados"]
+# Resoluções que guardam também o esboço de quantis (a de 1 min ficaria grande demais por linha)
+RESOLUCOES_ESBOCO = ('1h', '1d')
+
+
+def cabecalho_rollup(resolucao):
+    return CABECALHO_ROLLUP + ["Esboco"] if resolucao in RESOLUCOES_ESBOCO else CABECALHO_ROLLUP
+
+
+def garantir_cabecalho_rollup(caminho, resolucao):
+    """
+    Atualiza um CSV de rollup de antes dos esboços para o cabeçalho atual:
+    as linhas antigas ganham a coluna 'Esboco' vazia (contam como 'sem_esboco'
+    nas consultas). A troca do arquivo é atômica.
+    """
+    cabecalho = cabecalho_rollup(resolucao)
+    if not os.path.isfile(caminho):
+        return
+    try:
+        with open(caminho, 'r', newline='', encoding='utf-8') as f:
+            cabecalho_atual = next(csv.reader(f), [])
+            if cabecalho_atual == cabecalho or cabecalho[:len(cabecalho_atual)] != cabecalho_atual:
+                return
+            faltantes = [""] * (len(cabecalho) - len(cabecalho_atual))
+            with tempfile.NamedTemporaryFile('w', dir=os.path.dirname(caminho) or '.', delete=False,
+                                             newline='', encoding='utf-8') as tmp:
+                writer = csv.writer(tmp)
+                writer.writerow(cabecalho)
+                for linha in csv.reader(f):
+                    writer.writerow(linha + faltantes)
+                temp_name = tmp.name
+        os.replace(temp_name, caminho)
+        print(f"[INFO] Cabeçalho de '{os.path.basename(caminho)}' atualizado para {cabecalho}.")
+    except (IOError, csv.Error) as e:
+        print(f"[ERRO] Falha ao atualizar o cabeçalho de '{caminho}': {e}")
+
+
+def caminho_rollup(caminho_base, resolucao):
+    """Arquivo de uma resolução: 'rollup_rede.csv' -> 'rollup_rede_1h.csv'."""
+    raiz, extensao = os.path.splitext(caminho_base)
+    return f"{raiz}_{resolucao}{extensao}"
+
+
+def inicio_intervalo(timestamp, resolucao):
+    """'2025-01-01 12:34:56.789' em '1h' -> '2025-01-01 12:00:00'."""
+    tamanho = RESOLUCOES[resolucao]
+    return timestamp[:tamanho] + MODELO_INICIO[tamanho:]
+
+
+class Rollups:
+    """
+    Contagem, soma, mínimo, máximo e soma dos quadrados por nó e por intervalo,
+    em cada resolução; em 1 h e 1 dia, também o esboço de quantis, para
+    percentis que se juntam entre intervalos e nós. Os intervalos fechados são
+    anexados a um CSV por resolução e não dependem mais dos dados brutos; os
+    abertos ficam em memória e podem ser salvos/restaurados com
+    estado()/restaurar() entre execuções.
+    """
+
+    def __init__(self, caminho_base):
+        self.caminhos = {resolucao: caminho_rollup(caminho_base, resolucao) for resolucao in RESOLUCOES}
+        for resolucao, caminho in self.caminhos.items():
+            garantir_cabecalho_rollup(caminho, resolucao)
+        # resolução -> {nó: [início, contagem, soma, mín, máx, soma²(, esboço)]}
+        self.abertos = {resolucao: {} for resolucao in RESOLUCOES}
+        self.ultimo = {}  # nó -> timestamp da última amostra agregada
+        self.alterado = False  # Intervalos abertos mudaram desde o último estado() salvo
+        self.fechou = False  # Intervalos foram anexados aos CSVs desde o último estado() salvo
+
+    def adicionar(self, amostras):
+        """Agrega amostras (timestamp, nó, valor); as já agregadas antes de um reinício são ignoradas."""
+        fechados = {resolucao: [] for resolucao in RESOLUCOES}
+        for timestamp, no, valor in amostras:
+            if timestamp <= self.ultimo.get(no, ''):
+                continue
+            self.ultimo[no] = timestamp
+            self.alterado = True
+            chave = chave_esboco(valor)
+            for resolucao, abertos in self.abertos.items():
+                inicio = inicio_intervalo(timestamp, resolucao)
+                bucket = abertos.get(no)
+                if bucket is not None and bucket[0] != inicio:
+                    fechados[resolucao].append((no, bucket))
+                    bucket = None
+                if bucket is None:
+                    bucket = abertos[no] = [inicio, 1, valor, valor, valor, valor * valor]
+                    if resolucao in RESOLUCOES_ESBOCO:
+                        bucket.append(EsbocoQuantis({chave: 1}))
+                    continue
+                bucket[1] += 1
+                bucket[2] += valor
+                bucket[3] = min(bucket[3], valor)
+                bucket[4] = max(bucket[4], valor)
+                bucket[5] += valor * valor
+                if len(bucket) > 6:
+                    baldes = bucket[6].baldes
+                    baldes[chave] = baldes.get(chave, 0) + 1
+        self._gravar(fechados)
+
+    def fechar_vencidos(self, agora):
+        """Fecha os intervalos que já terminaram em 'agora' (mesmo formato dos timestamps), mesmo sem amostras novas."""
+        fechados = {resolucao: [] for resolucao in RESOLUCOES}
+        for resolucao, abertos in self.abertos.items():
+            inicio_atual = inicio_intervalo(agora, resolucao)
+            for no, bucket in list(abertos.items()):
+                if bucket[0] < inicio_atual:
+                    fechados[resolucao].append((no, abertos.pop(no)))
+        self._gravar(fechados)
+
+    def estado(self):
+        """Intervalos abertos e última amostra por nó, em tipos simples (para YAML)."""
+        return {
+            'ultimo': dict(self.ultimo),
+            'abertos': {resolucao: {no: bucket[:6] + [esboco.codificar() for esboco in bucket[6:]]
+                                    for no, bucket in abertos.items()}
+                        for resolucao, abertos in self.abertos.items()},
+        }
+
+    def restaurar(self, estado):
+        self.ultimo = dict(estado.get('ultimo') or {})
+        for resolucao, abertos in (estado.get('abertos') or {}).items():
+            if resolucao not in self.abertos:
+                continue
+            self.abertos[resolucao] = {}
+            for no, bucket in abertos.items():
+                if resolucao in RESOLUCOES_ESBOCO:
+                    # Estado de antes dos esboços: o do intervalo aberto começa vazio
+                    bucket = bucket[:6] + [EsbocoQuantis.decodificar(bucket[6] if len(bucket) > 6 else '')]
+                self.abertos[resolucao][no] = list(bucket[:7])
+
+    def _gravar(self, fechados):
+        for resolucao, buckets in fechados.items():
+            if not buckets:
+                continue
+            self.alterado = self.fechou = True
+            caminho = self.caminhos[resolucao]
+            file_exists = os.path.exists(caminho)
+            with open(caminho, 'a', newline='', encoding='utf-8') as f:
+                writer = csv.writer(f)
+                if not file_exists:
+                    writer.writerow(cabecalho_rollup(resolucao))
+                for no, bucket in sorted(buckets, key=lambda b: b[1][0]):
+                    writer.writerow([bucket[0], no] + bucket[1:6] + [esboco.codificar() for esboco in bucket[6:]])
@@ -0,0 +1,242 @@
+# rotacao.py - Rotação por tamanho/dia dos CSVs, segmentos comprimidos e manifesto de intervalos
+
+import gzip
+import os
+import threading
+from collections import namedtuple
+from datetime import datetime
+
+import yaml
+
+from comum.cauda import ultimas_linhas
+from comum.serie_temporal import FORMATO_TIMESTAMP
+
+try:
+    import zstandard
+except ImportError:  # Opcional: sem ele, 'zstd' cai para gzip
+    zstandard = None
+
+DIRETORIO_SEGMENTOS = 'segmentos'
+EXTENSOES = {'gzip': '.gz', 'zstd': '.zst'}
+FORMATOS_ENTRADA = (FORMATO_TIMESTAMP, '%Y-%m-%d %H:%M:%S', '%d-%m-%Y %H:%M:%S')
+
+PoliticaRotacao = namedtuple('PoliticaRotacao', 'max_bytes diaria compressao')
+
+
+def politica_da_config(nivel4_config):
+    """Lê 'nivel4.rotacao' do YAML; retorna None se a rotação estiver desligada."""
+    rotacao = nivel4_config.get('rotacao') or {}
+    if not rotacao.get('ativada', False):
+        return None
+    compressao = rotacao.get('compressao', 'gzip')
+    if compressao in (None, 'nenhuma', False):
+        compressao = None
+    elif compressao == 'zstd' and zstandard is None:
+        print("[AVISO] Compressão 'zstd' pedida, mas o pacote 'zstandard' não está instalado. Usando gzip.")
+        compressao = 'gzip'
+    elif compressao not in EXTENSOES:
+        print(f"[AVISO] Compressão '{compressao}' desconhecida. Usando gzip.")
+        compressao = 'gzip'
+    max_mb = rotacao.get('max_mb')
+    return PoliticaRotacao(int(float(max_mb) * 1024 * 1024) if max_mb else None,
+                           bool(rotacao.get('diaria', True)), compressao)
+
+
+def normalizar_timestamp(texto):
+    """Timestamp de qualquer CSV do projeto no formato dos dados brutos (ordenável como texto), ou None."""
+    for formato in FORMATOS_ENTRADA:
+        try:
+            return datetime.strptime(texto.strip(), formato).strftime(FORMATO_TIMESTAMP)[:-3]
+        except ValueError:
+            continue
+    return None
+
+
+def caminho_manifesto(caminho):
+    raiz, _ = os.path.splitext(caminho)
+    return raiz + '.manifesto.yaml'
+
+
+def ler_manifesto(caminho):
+    """Segmentos já fechados do CSV 'caminho', do mais antigo ao mais novo."""
+    try:
+        with open(caminho_manifesto(caminho), 'r', encoding='utf-8') as f:
+            return (yaml.safe_load(f) or {}).get('segmentos') or []
+    except (OSError, yaml.YAMLError):
+        return []
+
+
+def abrir_segmento(caminho):
+    """Abre um segmento (comprimido ou não) para leitura binária."""
+    if caminho.endswith('.gz'):
+        return gzip.open(caminho, 'rb')
+    if caminho.endswith('.zst'):
+        if zstandard is None:
+            raise OSError(f"Segmento '{caminho}' requer o pacote 'zstandard'.")
+        return zstandard.ZstdDecompressor().stream_reader(open(caminho, 'rb'), closefd=True)
+    return open(caminho, 'rb')
+
+
+def segmentos_no_intervalo(caminho, inicio=None, fim=None):
+    """Caminhos dos segmentos de 'caminho' cujo intervalo [inicio, fim] do manifesto toca o pedido."""
+    diretorio = os.path.dirname(os.path.abspath(caminho))
+    resultado = []
+    for segmento in ler_manifesto(caminho):
+        if fim is not None and segmento.get('inicio') and segmento['inicio'] > fim:
+            continue
+        if inicio is not None and segmento.get('fim') and segmento['fim'] < inicio:
+            continue
+        resultado.append(os.path.join(diretorio, segmento['arquivo']))
+    return resultado
+
+
+def linhas_segmento(caminho, inicio=None, fim=None):
+    """
+    Gera as linhas de dados (bytes, sem o cabeçalho) de um segmento de CSV bruto
+    cuja primeira coluna está em [inicio, fim] (textos no formato dos dados brutos).
+    """
+    alvo = inicio.encode('utf-8') if inicio else None
+    limite = fim.encode('utf-8') if fim else None
+    with abrir_segmento(caminho) as f:
+        f.readline()
+        for linha in f:
+            chave = linha.split(b',', 1)[0].strip()
+            if alvo is not None and chave < alvo:
+                continue
+            if limite is not None and chave > limite:
+                break
+            yield linha.rstrip(b'\r\n')
+
+
+class Rotacionador:
+    """
+    Rotaciona um CSV ativo quando ele passa de 'max_bytes' ou quando seu primeiro
+    registro é de um dia anterior. Deve ser chamado (verificar) pelo único
+    processo que escreve no arquivo, antes de anexar: o arquivo é renomeado
+    para 'segmentos/' e a escrita seguinte recria o ativo com o cabeçalho, sem
+    perder linhas. A compressão do segmento roda numa thread de fundo; o
+    manifesto '<nome>.manifesto.yaml' guarda o intervalo de tempo de cada um.
+    """
+
+    def __init__(self, caminho, politica):
+        self.caminho = caminho
+        self.politica = politica
+        self.diretorio = os.path.dirname(os.path.abspath(caminho))
+        self._inode = None
+        self._dia_inicio = None
+        self._lock = threading.Lock()  # Serializa as escritas do manifesto (rotação x compressão)
+        self._retomar_compressoes()
+
+    def verificar(self):
+        """Rotaciona o arquivo se a política mandar. Retorna True se rotacionou."""
+        try:
+            info = os.stat(self.caminho)
+        except FileNotFoundError:
+            return False
+        if info.st_ino != self._inode:
+            self._inode = info.st_ino
+            self._dia_inicio = None
+
+        vencido = self.politica.max_bytes is not None and info.st_size >= self.politica.max_bytes
+        if not vencido and self.politica.diaria:
+            if self._dia_inicio is None:
+                primeira = self._primeira_linha()
+                self._dia_inicio = primeira[:10] if primeira else None
+            vencido = self._dia_inicio is not None and self._dia_inicio < datetime.now().strftime('%Y-%m-%d')
+        return self.rotacionar() if vencido else False
+
+    def _primeira_linha(self):
+        with open(self.caminho, 'r', encoding='utf-8', errors='replace') as f:
+            f.readline()
+            return normalizar_timestamp(f.readline().split(',', 1)[0])
+
+    def rotacionar(self):
+        """Fecha o arquivo ativo como segmento. Retorna False se não havia dados ou se a troca falhou."""
+        try:
+            inicio = self._primeira_linha()
+            _, ultimas = ultimas_linhas(self.caminho, 1)
+        except OSError as e:
+            print(f"[AVISO] Não foi possível rotacionar '{self.caminho}': {e}")
+            return False
+        if inicio is None or not ultimas:
+            return False
+        fim = normalizar_timestamp(ultimas[-1].split(',', 1)[0]) or inicio
+
+        raiz, extensao = os.path.splitext(os.path.basename(self.caminho))
+        os.makedirs(os.path.join(self.diretorio, DIRETORIO_SEGMENTOS), exist_ok=True)
+        base = os.path.join(DIRETORIO_SEGMENTOS, f"{raiz}.{inicio[:19].replace(' ', 'T').replace(':', '')}")
+        relativo = base + extensao
+        sufixo = 1
+        while any(os.path.exists(os.path.join(self.diretorio, relativo + sufixo_compressao))
+                  for sufixo_compressao in ('',) + tuple(EXTENSOES.values())):
+            relativo = f"{base}-{sufixo}{extensao}"
+            sufixo += 1
+
+        try:
+            # No Windows falha se algum leitor estiver com o arquivo aberto: tenta de novo no próximo lote
+            os.replace(self.caminho, os.path.join(self.diretorio, relativo))
+        except OSError as e:
+            print(f"[AVISO] Não foi possível rotacionar '{self.caminho}': {e}")
+            return False
+
+        # O inode do arquivo rotacionado identifica o segmento para quem o estava lendo (LeitorCauda)
+        info = os.stat(os.path.join(self.diretorio, relativo))
+        entrada = {'arquivo': relativo.replace(os.sep, '/'), 'inicio': inicio, 'fim': fim,
+                   'bytes': info.st_size, 'inode': info.st_ino, 'compressao': None}
+        with self._lock:
+            segmentos = ler_manifesto(self.caminho)
+            segmentos.append(entrada)
+            self._salvar_manifesto(segmentos)
+        print(f"[INFO] '{os.path.basename(self.caminho)}' rotacionado para '{relativo}'.")
+
+        if self.politica.compressao:
+            threading.Thread(target=self._comprimir, args=(entrada['arquivo'],), daemon=True).start()
+        return True
+
+    def _retomar_compressoes(self):
+        """Comprime segmentos que ficaram sem compressão (ex.: processo encerrado no meio)."""
+        if not self.politica.compressao:
+            return
+        for segmento in ler_manifesto(self.caminho):
+            if not segmento.get('compressao') and os.path.exists(os.path.join(self.diretorio, segmento['arquivo'])):
+                threading.Thread(target=self._comprimir, args=(segmento['arquivo'],), daemon=True).start()
+
+    def _comprimir(self, relativo):
+        compressao = self.politica.compressao
+        origem = os.path.join(self.diretorio, relativo)
+        destino = origem + EXTENSOES[compressao]
+        temporario = destino + '.tmp'
+        linhas = 0
+        try:
+            with open(origem, 'rb') as entrada, open(temporario, 'wb') as bruto:
+                if compressao == 'zstd':
+                    saida = zstandard.ZstdCompressor(level=6).stream_writer(bruto, closefd=False)
+                else:
+                    saida = gzip.GzipFile(fileobj=bruto, mode='wb', compresslevel=6)
+                with saida:
+                    for bloco in iter(lambda: entrada.read(1024 * 1024), b''):
+                        linhas += bloco.count(b'\n')
+                        saida.write(bloco)
+            os.replace(temporario, destino)
+        except OSError as e:
+            print(f"[ERRO] Falha ao comprimir o segmento '{relativo}': {e}")
+            if os.path.exists(temporario):
+                os.remove(temporario)
+            return
+
+        with self._lock:
+            segmentos = ler_manifesto(self.caminho)
+            for segmento in segmentos:
+                if segmento['arquivo'] == relativo.replace(os.sep, '/'):
+                    segmento['arquivo'] = segmento['arquivo'] + EXTENSOES[compressao]
+                    segmento['compressao'] = compressao
+                    segmento['linhas'] = max(linhas - 1, 0)  # Sem o cabeçalho
+            self._salvar_manifesto(segmentos)
+        os.remove(origem)
+
+    def _salvar_manifesto(self, segmentos):
+        temporario = caminho_manifesto(self.caminho) + '.tmp'
+        with open(temporario, 'w', encoding='utf-8') as f:
+            yaml.safe_dump({'arquivo_ativo': os.path.basename(self.caminho), 'segmentos': segmentos},
+                           f, sort_keys=False, allow_unicode=True)
+        os.replace(temporario, caminho_manifesto(self.caminho))
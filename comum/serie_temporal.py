@@ -0,0 +1,242 @@
+# serie_temporal.py - Armazenamento binário append-only das amostras brutas
+
+import argparse
+import csv
+import os
+import struct
+import sys
+import time
+from datetime import datetime
+
+import numpy as np
+
+MAGICO = b'TWTS'
+VERSAO = 2
+
+# Cabeçalho do arquivo: mágico, versão, tamanho do registro
+CABECALHO = struct.Struct('<4sHH8x')
+# Registro: timestamp (ms desde a época), RSSI (dBm), luminosidade, status, id do nó, RTT (ms; NaN nas falhas)
+REGISTRO = struct.Struct('<qfHBHf')
+DTYPE = np.dtype([
+    ('timestamp_ms', '<i8'),
+    ('rssi', '<f4'),
+    ('luminosidade', '<u2'),
+    ('status', 'u1'),
+    ('no', '<u2'),
+    ('rtt_ms', '<f4'),
+])
+# Versão 1, sem o RTT: ainda é lida (sem o campo 'rtt_ms') e migrar() a converte
+DTYPE_V1 = np.dtype(DTYPE.descr[:-1])
+DTYPES = {1: DTYPE_V1, VERSAO: DTYPE}
+
+STATUS_SUCESSO = 0
+STATUS_TEXTO = {0: "Sucesso", 1: "Falha (Timeout)", 2: "Falha (Tamanho Incorreto)"}
+CODIGO_STATUS = {texto: codigo for codigo, texto in STATUS_TEXTO.items()}
+
+CABECALHO_REDE = ["Timestamp", "RSSI_Downlink", "Status", "No", "RTT_ms"]
+CABECALHO_APLICACAO = ["Timestamp", "Luminosidade", "No"]
+
+
+FORMATO_TIMESTAMP = '%Y-%m-%d %H:%M:%S.%f'
+ARQUIVO_PADRAO = 'dados_brutos.bin'
+QUARTO_HORA_MS = 15 * 60 * 1000
+
+
+def nome_arquivo_binario(config):
+    """Nome do arquivo da série binária em 'nivel4.nome_arquivo_binario' do YAML."""
+    return str(((config or {}).get('nivel4') or {}).get('nome_arquivo_binario') or ARQUIVO_PADRAO)
+
+
+def formatar_timestamp(timestamp_ms):
+    """Converte ms desde a época para o formato de timestamp dos CSVs brutos."""
+    # Segundos e milissegundos separados: a divisão em ponto flutuante pode cair 1 ms abaixo
+    segundos, milissegundos = divmod(int(timestamp_ms), 1000)
+    return datetime.fromtimestamp(segundos).replace(microsecond=milissegundos * 1000).strftime(FORMATO_TIMESTAMP)[:-3]
+
+
+def ler_timestamp(texto):
+    """Inverso de formatar_timestamp: ms desde a época. Levanta ValueError."""
+    return int(datetime.strptime(texto, FORMATO_TIMESTAMP).timestamp() * 1000)
+
+
+def hora_local(timestamps_ms):
+    """
+    ms desde a época (array) -> hora local dos CSVs, em ms como se fosse UTC.
+    O deslocamento do fuso (horário de verão incluso) é calculado uma vez por
+    quarto de hora.
+    """
+    quartos, posicoes = np.unique(timestamps_ms // QUARTO_HORA_MS, return_inverse=True)
+    deslocamentos = np.array([time.localtime(quarto * QUARTO_HORA_MS // 1000).tm_gmtoff * 1000
+                              for quarto in quartos.tolist()], dtype=np.int64)
+    return timestamps_ms + deslocamentos[posicoes]
+
+
+class SerieTemporal:
+    """
+    Arquivo de registros de tamanho fixo (REGISTRO/DTYPE), só anexados ao final.
+    Um único processo escreve (base.py, via EscritorLotes); os leitores mapeiam
+    o arquivo em memória e recebem os registros como array NumPy, sem cópia.
+    """
+
+    def __init__(self, caminho):
+        self.caminho = caminho
+
+    def __str__(self):
+        return self.caminho
+
+    def gravar(self, registros, fsync=False):
+        """Anexa registros (tuplas timestamp_ms, rssi, luminosidade, status, no, rtt_ms) com uma única escrita."""
+        dados = b''.join(REGISTRO.pack(*registro) for registro in registros)
+        fd = os.open(self.caminho, os.O_RDWR | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            tamanho = os.fstat(fd).st_size
+            if tamanho < CABECALHO.size:
+                os.ftruncate(fd, 0)
+                dados = CABECALHO.pack(MAGICO, VERSAO, REGISTRO.size) + dados
+            else:
+                versao = CABECALHO.unpack(os.pread(fd, CABECALHO.size, 0))[1]
+                if versao != VERSAO:
+                    # Anexar registros de outro tamanho corromperia o arquivo: o lote fica retido
+                    raise IOError(f"'{self.caminho}' está na versão {versao} da série (atual: {VERSAO}); "
+                                  f"converta-o com migrar().")
+                if (tamanho - CABECALHO.size) % REGISTRO.size:
+                    # Registro incompleto de uma escrita interrompida: descarta para manter o alinhamento
+                    os.ftruncate(fd, tamanho - (tamanho - CABECALHO.size) % REGISTRO.size)
+            os.write(fd, dados)
+            if fsync:
+                os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def _formato(self, f):
+        """dtype dos registros do arquivo aberto em 'f'. Levanta ValueError se ele não é uma série válida."""
+        try:
+            magico, versao, tamanho_registro = CABECALHO.unpack(f.read(CABECALHO.size))
+        except struct.error:
+            magico = versao = tamanho_registro = None
+        dtype = DTYPES.get(versao)
+        if magico != MAGICO or dtype is None or tamanho_registro != dtype.itemsize:
+            raise ValueError(f"Arquivo '{self.caminho}' não é uma série temporal TWINsen válida.")
+        return dtype
+
+    def contar(self):
+        """Número de registros completos no arquivo (0 se ele ainda não existe)."""
+        try:
+            with open(self.caminho, 'rb') as f:
+                tamanho = os.fstat(f.fileno()).st_size
+                if tamanho < CABECALHO.size:
+                    return 0
+                try:
+                    tamanho_registro = self._formato(f).itemsize
+                except ValueError:
+                    tamanho_registro = REGISTRO.size  # ler() é quem recusa o arquivo
+        except OSError:
+            return 0
+        return (tamanho - CABECALHO.size) // tamanho_registro
+
+    def ler(self, inicio=0, fim=None):
+        """
+        Retorna os registros [inicio, fim) como array estruturado mapeado em
+        memória (sem cópia). Arquivos da versão 1 vêm com DTYPE_V1 (sem 'rtt_ms').
+        """
+        total = self.contar()
+        fim = total if fim is None else min(fim, total)
+        inicio = min(max(inicio, 0), fim)
+        if fim == inicio:
+            return np.empty(0, dtype=DTYPE)
+
+        with open(self.caminho, 'rb') as f:
+            dtype = self._formato(f)
+        return np.memmap(self.caminho, dtype=dtype, mode='r',
+                         offset=CABECALHO.size + inicio * dtype.itemsize, shape=(fim - inicio,))
+
+    def migrar(self, tamanho_bloco=100000):
+        """
+        Converte um arquivo da versão 1 para a atual, com RTT vazio (NaN) nos
+        registros antigos. A troca do arquivo é atômica. Retorna True se converteu.
+        """
+        try:
+            with open(self.caminho, 'rb') as f:
+                if self._formato(f) is DTYPE:
+                    return False
+        except (OSError, ValueError):
+            return False
+
+        antigos = self.ler()
+        total = len(antigos)
+        temporario = self.caminho + '.tmp'
+        with open(temporario, 'wb') as f:
+            f.write(CABECALHO.pack(MAGICO, VERSAO, REGISTRO.size))
+            for inicio in range(0, total, tamanho_bloco):
+                trecho = antigos[inicio:inicio + tamanho_bloco]
+                novos = np.empty(len(trecho), dtype=DTYPE)
+                for campo in trecho.dtype.names:
+                    novos[campo] = trecho[campo]
+                novos['rtt_ms'] = np.nan
+                f.write(novos.tobytes())
+        antigos = trecho = None  # Solta o mapeamento antes da troca (exigido no Windows)
+        os.replace(temporario, self.caminho)
+        print(f"[INFO] Série '{os.path.basename(self.caminho)}' convertida para a versão {VERSAO} "
+              f"({total} registro(s), sem RTT nos antigos).")
+        return True
+
+    def ultimos(self, quantidade):
+        """Retorna os últimos 'quantidade' registros."""
+        total = self.contar()
+        return self.ler(total - quantidade, total)
+
+
+def exportar_csv(serie, caminho_rede=None, caminho_aplicacao=None, tamanho_bloco=100000):
+    """Exporta a série para CSVs no mesmo formato de dados_brutos_rede.csv e dados_brutos_aplicacao.csv."""
+    arquivos = []
+    try:
+        writer_rede = writer_app = None
+        if caminho_rede:
+            arquivos.append(open(caminho_rede, 'w', newline='', encoding='utf-8'))
+            writer_rede = csv.writer(arquivos[-1])
+            writer_rede.writerow(CABECALHO_REDE)
+        if caminho_aplicacao:
+            arquivos.append(open(caminho_aplicacao, 'w', newline='', encoding='utf-8'))
+            writer_app = csv.writer(arquivos[-1])
+            writer_app.writerow(CABECALHO_APLICACAO)
+
+        total = serie.contar()
+        for inicio in range(0, total, tamanho_bloco):
+            registros = serie.ler(inicio, inicio + tamanho_bloco)
+            # Arquivos da versão 1 não têm RTT: a coluna fica vazia, como nas falhas
+            rtts = registros['rtt_ms'].tolist() if 'rtt_ms' in registros.dtype.names else [None] * len(registros)
+            for (timestamp_ms, rssi, luminosidade, status, id_no, *_), rtt_ms in zip(registros.tolist(), rtts):
+                timestamp = formatar_timestamp(timestamp_ms)
+                sucesso = status == STATUS_SUCESSO
+                if writer_rede:
+                    writer_rede.writerow([timestamp, f"{rssi:.2f}" if sucesso else "N/A",
+                                          STATUS_TEXTO.get(status, "Desconhecido"), id_no,
+                                          f"{rtt_ms:.1f}" if rtt_ms is not None and rtt_ms == rtt_ms else ""])
+                if writer_app and sucesso:
+                    writer_app.writerow([timestamp, luminosidade, id_no])
+        return total
+    finally:
+        for f in arquivos:
+            f.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Exporta a série temporal binária do TWINsen para CSV.")
+    parser.add_argument('arquivo', help="Arquivo binário (ex.: nivel4/dados_brutos.bin)")
+    parser.add_argument('--rede', help="CSV de saída com os dados de rede")
+    parser.add_argument('--aplicacao', help="CSV de saída com os dados de aplicação")
+    args = parser.parse_args()
+
+    if not args.rede and not args.aplicacao:
+        parser.error("informe ao menos um de --rede ou --aplicacao")
+
+    try:
+        total = exportar_csv(SerieTemporal(args.arquivo), args.rede, args.aplicacao)
+    except (OSError, ValueError) as e:
+        print(f"ERRO: {e}")
+        sys.exit(1)
+    print(f"{total} registro(s) exportado(s).")
+
+
+if __name__ == '__main__':
+    main()
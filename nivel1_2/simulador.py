@@ -0,0 +1,315 @@
+# simulador.py - Simula nós sensores (Firmware_Socket_UDP) em portas UDP locais
+#
+# Uso: python nivel1_2/simulador.py --nos 1000 --porta-inicial 9001 --latencia-ms 5 --jitter-ms 2 --perda 0.01
+#      (--config-saida nos.yaml gera o trecho 'nivel1' para colar em nivel4/configuracoes.yaml;
+#       a base continua escutando em 'nivel1.porta', que não pode cair na faixa dos nós)
+
+import argparse
+import heapq
+import math
+import os
+import random
+import selectors
+import socket
+import sys
+import time
+
+import yaml
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')))
+from comum.pacote import TAMANHO_PACOTE
+
+# --- Constantes do Firmware (Bibliotecas.h / _5_App.ino) ---
+INTERVALO_PROCESSAMENTO_S = 0.5  # 'interval' do loop(): App_processamento_local a cada 500 ms
+PISO_RUIDO = 10
+LIMIAR_AMARELO_PADRAO = 500
+LIMIAR_VERMELHO_PADRAO = 200
+RSSI_MODO_3 = (-93, -86, -84, -79, -70)  # Phy_send, byte 51 == 3
+FREQUENCIAS_MODO_4 = {1: 433e6, 2: 915e6, 3: 2.437e9, 4: 5.5e9}
+
+
+def rssi_para_radiuino(rssi_dbm):
+    """Phy_dBm_to_Radiuino: (RSSI_dl, LQI_dl) a partir do RSSI em dBm (conversão inteira como no C)."""
+    if rssi_dbm > -10.5:
+        return 127, 1
+    if rssi_dbm >= -74:
+        return int((rssi_dbm + 74) * 2), 0
+    return int(((rssi_dbm + 74) * 2) + 256), 0
+
+
+class NoSimulado:
+    """
+    Um nó sensor com o mesmo comportamento das camadas do firmware: descarte
+    simulado da Phy (byte 51), filtro de endereço da Net, eco do contador da
+    Transp e a lógica de limiares/piso de ruído da App. A luminosidade segue
+    uma senoide lenta com ruído, com fase diferente por nó.
+    """
+
+    def __init__(self, endereco=1, rssi_dbm=-60.0, sombreamento_db=2.0, periodo_luz_s=120.0, rng=None):
+        self.rng = rng or random.Random()
+        self.my_address = endereco
+        self.rssi_dbm = rssi_dbm
+        self.sombreamento_db = sombreamento_db
+        self.periodo_luz_s = periodo_luz_s
+        self.fase = self.rng.uniform(0, 2 * math.pi)
+        self.contador_mac = 0
+        self.pkt_counter_up = 0
+        self.orig_address = 0
+        self.limiar_amarelo = LIMIAR_AMARELO_PADRAO
+        self.limiar_vermelho = LIMIAR_VERMELHO_PADRAO
+        self.luminosidade = 0
+        self.atuadores = (0, 0, 0, 0)  # verde, amarelo, vermelho, buzzer
+        self.proximo_processamento = 0.0
+
+    # --- App ---
+
+    def ler_sensor(self, agora):
+        """analogRead(A0) simulado: baixo = luz."""
+        luz = 512 + 400 * math.sin(2 * math.pi * agora / self.periodo_luz_s + self.fase) + self.rng.gauss(0, 8)
+        return 1023 - min(max(int(luz), 0), 1023)
+
+    def processamento_local(self, agora):
+        """App_processamento_local, executado no ritmo do loop() do firmware."""
+        if agora < self.proximo_processamento:
+            return
+        self.proximo_processamento = agora + INTERVALO_PROCESSAMENTO_S
+        luminosidade = 1023 - self.ler_sensor(agora)
+        if luminosidade < PISO_RUIDO:
+            luminosidade = 0
+        if luminosidade > self.limiar_amarelo:
+            self.atuadores = (1, 0, 0, 0)
+        elif luminosidade > self.limiar_vermelho:
+            self.atuadores = (0, 1, 0, 0)
+        else:
+            self.atuadores = (0, 0, 1, 1)
+        self.luminosidade = luminosidade
+
+    # --- Camadas ---
+
+    def receber(self, pacote_rx, agora):
+        """Processa um pacote da base; retorna o pacote de resposta (bytes) ou None se não houver resposta."""
+        if len(pacote_rx) < TAMANHO_PACOTE:  # Phy_receive exige packetSize >= 52
+            return None
+        self.processamento_local(agora)
+        if self._descarte_phy(pacote_rx):
+            return None
+        # Net_receive: só responde ao próprio endereço
+        if pacote_rx[8] != self.my_address:
+            return None
+        self.orig_address = pacote_rx[10]
+        self.contador_mac += 10
+        # App_receive: limiares > 0 substituem os atuais (valem a partir do próximo processamento local)
+        limiar_amarelo = pacote_rx[16] * 256 + pacote_rx[17]
+        limiar_vermelho = pacote_rx[18] * 256 + pacote_rx[19]
+        if limiar_amarelo > 0:
+            self.limiar_amarelo = limiar_amarelo
+        if limiar_vermelho > 0:
+            self.limiar_vermelho = limiar_vermelho
+        return self._enviar(pacote_rx)
+
+    def _descarte_phy(self, pacote_rx):
+        """Perda de pacote simulada pelo próprio firmware (modos 1 e 2 do byte 51)."""
+        x = self.rng.randint(1, 100)
+        if pacote_rx[51] == 1:
+            return x <= pacote_rx[50]
+        if pacote_rx[51] == 2:
+            ab = pacote_rx[47] * 10 + pacote_rx[48]
+            cd = pacote_rx[49] * 10 + pacote_rx[50]
+            return x <= (((ab + cd) % 5) + 1) * 10
+        return False
+
+    def _enviar(self, pacote_rx):
+        pacote_tx = bytearray(TAMANHO_PACOTE)
+        # App_send
+        pacote_tx[17] = (self.luminosidade // 256) & 0xFF
+        pacote_tx[18] = self.luminosidade % 256
+        pacote_tx[34], pacote_tx[37], pacote_tx[40], pacote_tx[43] = self.atuadores
+        # Transp_send
+        self.pkt_counter_up = (self.pkt_counter_up + 1) & 0xFFFF
+        pacote_tx[12] = pacote_rx[12]
+        pacote_tx[13] = pacote_rx[13]
+        pacote_tx[14] = self.pkt_counter_up // 256
+        pacote_tx[15] = self.pkt_counter_up % 256
+        # Net_send
+        pacote_tx[8] = self.orig_address
+        pacote_tx[10] = self.my_address
+        # Mac_send
+        pacote_tx[4] = (self.contador_mac // 256) & 0xFF
+        pacote_tx[5] = self.contador_mac % 256
+        # Phy_send
+        pacote_tx[2], pacote_tx[3] = (valor & 0xFF for valor in rssi_para_radiuino(self._rssi_downlink(pacote_rx)))
+        return bytes(pacote_tx)
+
+    def _rssi_downlink(self, pacote_rx):
+        if pacote_rx[51] == 3:
+            ba = pacote_rx[48] * 10 + pacote_rx[47]
+            dc = pacote_rx[50] * 10 + pacote_rx[49]
+            return RSSI_MODO_3[(ba + dc) % 5] + self.rng.gauss(0, 5)
+        if pacote_rx[51] == 4:
+            rssi = self._sombreamento(pacote_rx)
+            if rssi is not None:
+                return rssi
+        # WiFi.RSSI() é inteiro
+        return round(self.rssi_dbm + self.rng.gauss(0, self.sombreamento_db))
+
+    def _sombreamento(self, pacote_rx):
+        """Phy_shadowing: modelo log-distância com os parâmetros dos bytes 42..50."""
+        frequencia = FREQUENCIAS_MODO_4.get(pacote_rx[50], 2.437e9)
+        ptx, gtx, grx = pacote_rx[49] / 10.0, pacote_rx[48] / 10.0, pacote_rx[47] / 10.0
+        d0 = pacote_rx[46]
+        beta = pacote_rx[45] / 10.0
+        distancia = pacote_rx[43] * 256 + pacote_rx[44]
+        if not d0 or not distancia:
+            return None
+        lambda_ = 3e8 / frequencia
+        pd0 = ptx + gtx + grx - 10 * math.log10(((12.5664 * d0) / lambda_) ** 2)
+        return pd0 - 10 * beta * math.log10(distancia / d0) + self.rng.gauss(0, pacote_rx[42] / 10)
+
+
+class Simulador:
+    """
+    Atende vários nós simulados num único processo, um socket por nó. As
+    respostas saem de uma fila por instante de envio, o que permite aplicar
+    latência, jitter, perda e reordenação sem uma thread por nó.
+    """
+
+    def __init__(self, ip, porta_inicial, quantidade, endereco=1, latencia_s=0.0, jitter_s=0.0,
+                 perda=0.0, reordenacao=0.0, rssi_dbm=-60.0, semente=None):
+        self.rng = random.Random(semente)
+        self.latencia_s = latencia_s
+        self.jitter_s = jitter_s
+        self.perda = perda
+        self.reordenacao = reordenacao
+        self.seletor = selectors.DefaultSelector()
+        self.saida = []  # heap de (instante, sequência, socket, dados, destino)
+        self.sequencia = 0
+        self.nos = []
+        self.contadores = {'recebidos': 0, 'respondidos': 0, 'perdidos': 0, 'sem_resposta': 0, 'erros_envio': 0}
+
+        for indice in range(quantidade):
+            udp_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            udp_socket.bind((ip, porta_inicial + indice))
+            udp_socket.setblocking(False)
+            no = NoSimulado(endereco, rssi_dbm, rng=random.Random(self.rng.random()))
+            self.seletor.register(udp_socket, selectors.EVENT_READ, no)
+            self.nos.append((udp_socket, no))
+
+    def _atraso(self):
+        atraso = self.latencia_s + (self.rng.gauss(0, self.jitter_s) if self.jitter_s else 0.0)
+        if self.reordenacao and self.rng.random() < self.reordenacao:
+            # Atrasa o bastante para chegar depois da resposta seguinte do mesmo nó
+            atraso += self.latencia_s + 3 * self.jitter_s + 0.05
+        return max(atraso, 0.0)
+
+    def _receber(self, udp_socket, no, agora):
+        while True:
+            try:
+                dados, origem = udp_socket.recvfrom(1024)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError:
+                return  # ICMP de uma base que já foi encerrada
+            self.contadores['recebidos'] += 1
+            resposta = no.receber(dados, agora)
+            if resposta is None:
+                self.contadores['sem_resposta'] += 1
+                continue
+            if self.perda and self.rng.random() < self.perda:
+                self.contadores['perdidos'] += 1
+                continue
+            self.sequencia += 1
+            heapq.heappush(self.saida, (agora + self._atraso(), self.sequencia, udp_socket, resposta, origem))
+
+    def _enviar_vencidas(self, agora):
+        while self.saida and self.saida[0][0] <= agora:
+            _, _, udp_socket, resposta, destino = heapq.heappop(self.saida)
+            try:
+                udp_socket.sendto(resposta, destino)
+                self.contadores['respondidos'] += 1
+            except OSError:
+                self.contadores['erros_envio'] += 1
+
+    def executar(self, duracao_s=None, intervalo_relatorio_s=5.0):
+        inicio = time.monotonic()
+        proximo_relatorio = inicio + intervalo_relatorio_s
+        ultimo = dict(self.contadores)
+        while duracao_s is None or time.monotonic() - inicio < duracao_s:
+            agora = time.monotonic()
+            espera = proximo_relatorio - agora
+            if duracao_s is not None:
+                espera = min(espera, inicio + duracao_s - agora)
+            if self.saida:
+                espera = min(espera, self.saida[0][0] - agora)
+            for chave, _ in self.seletor.select(max(espera, 0.0)):
+                self._receber(chave.fileobj, chave.data, time.monotonic())
+            agora = time.monotonic()
+            self._enviar_vencidas(agora)
+            if agora >= proximo_relatorio:
+                decorrido = agora - proximo_relatorio + intervalo_relatorio_s
+                print(f"[INFO] {(self.contadores['recebidos'] - ultimo['recebidos']) / decorrido:.0f} req/s, "
+                      f"{(self.contadores['respondidos'] - ultimo['respondidos']) / decorrido:.0f} resp/s "
+                      f"(total: {self.contadores})")
+                ultimo = dict(self.contadores)
+                proximo_relatorio = agora + intervalo_relatorio_s
+
+    def fechar(self):
+        for udp_socket, _ in self.nos:
+            self.seletor.unregister(udp_socket)
+            udp_socket.close()
+        self.seletor.close()
+
+
+def trecho_configuracao(ip, porta_inicial, quantidade, endereco=1, porta_base=8888):
+    """Seção 'nivel1' do configuracoes.yaml apontando para os nós simulados."""
+    return {'nivel1': {
+        'ip': ip,
+        'porta': porta_base,
+        'nos': [{'id': indice + 1, 'ip': ip, 'porta': porta_inicial + indice, 'endereco': endereco}
+                for indice in range(quantidade)],
+    }}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulador UDP do firmware dos nós sensores.")
+    parser.add_argument('--nos', type=int, default=1, help="Quantidade de nós simulados (padrão: 1)")
+    parser.add_argument('--ip', default='127.0.0.1', help="IP onde os nós escutam (padrão: 127.0.0.1)")
+    parser.add_argument('--porta-inicial', type=int, default=9001, help="Porta do primeiro nó; os demais usam as seguintes (padrão: 9001)")
+    parser.add_argument('--porta-base', type=int, default=8888, help="Porta local da base escrita em --config-saida (padrão: 8888)")
+    parser.add_argument('--endereco', type=int, default=1, help="Endereço de rede dos nós, byte 8 (padrão: 1)")
+    parser.add_argument('--latencia-ms', type=float, default=0.0, help="Latência de resposta (padrão: 0)")
+    parser.add_argument('--jitter-ms', type=float, default=0.0, help="Desvio padrão da latência (padrão: 0)")
+    parser.add_argument('--perda', type=float, default=0.0, help="Probabilidade de perder a resposta, 0..1 (padrão: 0)")
+    parser.add_argument('--reordenacao', type=float, default=0.0, help="Probabilidade de atrasar uma resposta para depois da seguinte, 0..1 (padrão: 0)")
+    parser.add_argument('--rssi', type=float, default=-60.0, help="RSSI médio de downlink em dBm (padrão: -60)")
+    parser.add_argument('--duracao', type=float, default=None, help="Encerra após N segundos (padrão: até Ctrl+C)")
+    parser.add_argument('--relatorio', type=float, default=5.0, help="Intervalo do relatório de vazão em segundos (padrão: 5)")
+    parser.add_argument('--semente', type=int, default=None, help="Semente aleatória, para execuções repetíveis")
+    parser.add_argument('--config-saida', help="Grava o trecho 'nivel1' do configuracoes.yaml para estes nós")
+    args = parser.parse_args()
+
+    if args.config_saida:
+        with open(args.config_saida, 'w', encoding='utf-8') as f:
+            yaml.safe_dump(trecho_configuracao(args.ip, args.porta_inicial, args.nos, args.endereco, args.porta_base), f,
+                           sort_keys=False, allow_unicode=True)
+        print(f"[INFO] Configuração dos nós gravada em '{args.config_saida}'.")
+
+    try:
+        simulador = Simulador(args.ip, args.porta_inicial, args.nos, args.endereco, args.latencia_ms / 1000,
+                              args.jitter_ms / 1000, args.perda, args.reordenacao, args.rssi, args.semente)
+    except OSError as e:
+        print(f"[ERRO] Não foi possível abrir as portas dos nós simulados: {e}")
+        sys.exit(1)
+
+    print(f"Simulando {args.nos} nó(s) em {args.ip}:{args.porta_inicial}..{args.porta_inicial + args.nos - 1}")
+    print("Pressione Ctrl+C para encerrar.")
+    try:
+        simulador.executar(args.duracao, args.relatorio)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        simulador.fechar()
+        print(f"Simulador encerrado: {simulador.contadores}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,89 +1,134 @@
-# base.py - Versão com Escrita Segura no YAML
+# base.py - Versão com Coleta Concorrente e Estado ao Vivo em mmap
 
 import socket
 import time
 import os
-import yaml
 import csv
+import signal
+import sys
 import tempfile
-from datetime import datetime
+from itertools import count
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')))
+from coleta import MotorColeta
+from comum.barramento import PublicadorBarramento, bits_atuadores
+from comum.comandos import CanalComandos, porta_comandos
+from comum.configuracao import ID_NO_PADRAO, CacheConfiguracao, listar_nos
+from comum.escritor import EscritorLotes
+from comum.estado import EstadoNos
+from comum.metricas import registro
+from comum.pacote import decodificar_uplink, validar_limiar
+from comum.rotacao import politica_da_config
+from comum.serie_temporal import (CABECALHO_APLICACAO, CABECALHO_REDE, CODIGO_STATUS, SerieTemporal, formatar_timestamp,
+                                  nome_arquivo_binario)
+
+PERIODO_RECARGA_S = 1.0  # De quanto em quanto tempo a configuração é verificada
+CHAVES_NOS = {'nivel1.ip', 'nivel1.porta', 'nivel1.nos'}
+
+# --- Métricas (publicadas para o /metrics do nivel6) ---
+rtt_udp = registro.histograma('twinsen_udp_rtt_segundos', "RTT das respostas UDP por nó", ('no',))
+respostas_udp = registro.contador('twinsen_udp_respostas_total', "Respostas válidas por nó", ('no',))
+falhas_udp = registro.contador('twinsen_udp_falhas_total', "Falhas de coleta por nó e motivo (timeout, tamanho_incorreto)",
+                               ('no', 'motivo'))
+etapas_coleta = registro.histograma('twinsen_coleta_etapa_segundos', "Duração das etapas do loop de coleta", ('etapa',))
+ticks_perdidos = registro.contador('twinsen_coleta_ticks_perdidos_total', "Instantes da grade de envio pulados por nó", ('no',))
+timeout_udp = registro.medidor('twinsen_udp_timeout_segundos', "Timeout atual (RTO) derivado do RTT por nó", ('no',))
+duracao_comandos = registro.histograma('twinsen_comando_limiares_segundos',
+                                       "Tempo entre um comando de limiares e a última confirmação (ou desistência)")
 
 # --- Funções Auxiliares---
 
-def carregar_configuracoes(caminho_config):
-    """Lê o arquivo de configuração YAML e retorna um dicionário."""
+def garantir_cabecalho(caminho_log, cabecalho, valores_padrao):
+    """
+    Atualiza um CSV antigo para o cabeçalho atual, acrescentando as colunas que
+    faltam (ex.: 'No') com os 'valores_padrao' correspondentes em todas as linhas.
+    A troca do arquivo é atômica.
+    """
+    if not os.path.isfile(caminho_log):
+        return
     try:
-        with open(caminho_config, "r") as f:
-            return yaml.safe_load(f)
-    except FileNotFoundError:
-        print(f"Erro: Arquivo de configuração não encontrado em '{caminho_config}'")
-        return None
-    except yaml.YAMLError as e:
-        print(f"Erro ao ler o arquivo YAML: {e}")
-        return None
+        with open(caminho_log, 'r', newline='', encoding='utf-8') as f:
+            cabecalho_atual = next(csv.reader(f), [])
+            if cabecalho_atual == cabecalho or cabecalho[:len(cabecalho_atual)] != cabecalho_atual:
+                return
+            faltantes = valores_padrao[len(cabecalho_atual):]
+            with tempfile.NamedTemporaryFile('w', dir=os.path.dirname(caminho_log), delete=False,
+                                             newline='', encoding='utf-8') as tmp:
+                writer = csv.writer(tmp)
+                writer.writerow(cabecalho)
+                for linha in csv.reader(f):
+                    writer.writerow(linha + faltantes)
+                temp_name = tmp.name
+        os.replace(temp_name, caminho_log)
+        print(f"[INFO] Cabeçalho de '{os.path.basename(caminho_log)}' atualizado para {cabecalho}.")
+    except (IOError, csv.Error) as e:
+        print(f"Erro ao atualizar o cabeçalho de '{caminho_log}': {e}")
 
 
-def registrar_log_rede(caminho_log, timestamp, rssi, status):
-    """Registra dados de rede (RSSI, status) em um arquivo CSV."""
-    file_exists = os.path.isfile(caminho_log)
-    try:
-        with open(caminho_log, mode='a', newline='', encoding='utf-8') as f:
-            writer = csv.writer(f)
-            if not file_exists:
-                writer.writerow(["Timestamp", "RSSI_Downlink", "Status"]) # Cabeçalho
-            writer.writerow([timestamp, rssi, status])
-    except IOError as e:
-        print(f"Erro de I/O ao escrever no log de rede: {e}")
-
-
-def registrar_log_aplicacao(caminho_log, timestamp, luminosidade):
-    """Registra dados de aplicação (luminosidade) em um arquivo CSV."""
-    file_exists = os.path.isfile(caminho_log)
-    try:
-        with open(caminho_log, mode='a', newline='', encoding='utf-8') as f:
-            writer = csv.writer(f)
-            if not file_exists:
-                writer.writerow(["Timestamp", "Luminosidade"]) # Cabeçalho
-            writer.writerow([timestamp, luminosidade])
-    except IOError as e:
-        print(f"Erro de I/O ao escrever no log de aplicação: {e}")
-
-
-def salvar_yaml_seguro(caminho, dados):
-    """Escreve o YAML de forma atômica para evitar corrupção."""
-    dir_name = os.path.dirname(caminho)
-    try:
-        with tempfile.NamedTemporaryFile('w', dir=dir_name, delete=False, encoding="utf-8") as tmp:
-            yaml.dump(dados, tmp, default_flow_style=False, sort_keys=False)
-            temp_name = tmp.name
-        os.replace(temp_name, caminho)
-    except Exception as e:
-        print(f"Erro ao salvar o YAML de forma segura: {e}")
+def registrar_log_rede(escritor, caminho_log, timestamp, rssi, status, id_no=ID_NO_PADRAO, rtt_ms=""):
+    """Enfileira dados de rede (RSSI, status, RTT) de um nó para o CSV de rede."""
+    escritor.registrar_csv(caminho_log, CABECALHO_REDE, [timestamp, rssi, status, id_no, rtt_ms], indexar=True)
+
+
+def registrar_log_aplicacao(escritor, caminho_log, timestamp, luminosidade, id_no=ID_NO_PADRAO):
+    """Enfileira dados de aplicação (luminosidade) de um nó para o CSV de aplicação."""
+    escritor.registrar_csv(caminho_log, CABECALHO_APLICACAO, [timestamp, luminosidade, id_no], indexar=True)
 
 
-def atualizar_status_yaml(caminho_yaml, novos_estados):
-    """Lê o arquivo YAML, atualiza os estados no 'nivel6' e o reescreve de forma segura."""
+def registrar_binario(escritor, serie, timestamp_ms, rssi, luminosidade, status, id_no, rtt_ms=float('nan')):
+    """Enfileira uma amostra (sucesso ou falha) para a série temporal binária."""
+    escritor.registrar(serie, (timestamp_ms, rssi, luminosidade, CODIGO_STATUS[status], id_no, rtt_ms))
+
+
+def criar_publicador():
+    """Barramento em memória para o nivel5/nivel6; sem ele, os dois seguem lendo só os arquivos."""
     try:
-        with open(caminho_yaml, 'r') as f:
-            config_data = yaml.safe_load(f) or {}
+        return PublicadorBarramento()
+    except OSError as e:
+        print(f"[AVISO] Barramento de amostras indisponível, nivel5/nivel6 lerão só os arquivos: {e}")
+        return None
 
-        if 'nivel6' not in config_data:
-            config_data['nivel6'] = {}
 
-        config_data['nivel6']['led_verde'] = novos_estados.get('led_verde', config_data['nivel6'].get('led_verde'))
-        config_data['nivel6']['led_amarelo'] = novos_estados.get('led_amarelo', config_data['nivel6'].get('led_amarelo'))
-        config_data['nivel6']['led_vermelho'] = novos_estados.get('led_vermelho', config_data['nivel6'].get('led_vermelho'))
-        config_data['nivel6']['buzzer'] = novos_estados.get('buzzer', config_data['nivel6'].get('buzzer'))
+def criar_escritor(config):
+    """Cria o escritor em lote dos logs a partir da seção 'nivel4' do YAML."""
+    nivel4 = config.get('nivel4', {})
+    return EscritorLotes(max_linhas=int(nivel4.get('lote_max_linhas', 200)),
+                       max_atraso_s=float(nivel4.get('lote_max_atraso_s', 1.0)),
+                       fsync=bool(nivel4.get('fsync', False)),
+                       rotacao=politica_da_config(nivel4))
 
-        if 'luminosidade' in novos_estados:
-            config_data['nivel6']['luminosidade_atual'] = novos_estados['luminosidade']
 
-        config_data['nivel6']['ultima_atualizacao'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+def criar_canal_comandos(config):
+    """Canal pelo qual o nivel6 pede o envio imediato de limiares; sem ele, valem só as recargas do YAML."""
+    porta = porta_comandos(config)
+    try:
+        return CanalComandos(porta)
+    except OSError as e:
+        print(f"[AVISO] Canal de comandos indisponível na porta {porta}: {e}. Limiares só na recarga do YAML.")
+        return None
 
-        salvar_yaml_seguro(caminho_yaml, config_data)
 
-    except Exception as e:
-        print(f"Erro ao atualizar o arquivo YAML: {e}")
+def resposta_comando(estado):
+    """Resumo de um comando de limiares concluído, com o estado informado por cada nó na confirmação."""
+    confirmados = [dados for dados in estado['nos'].values() if dados[1] is not None]
+    rtts = [dados[1] for dados in confirmados]
+    return {
+        'id': estado['id'],
+        'sucesso': len(confirmados) == len(estado['nos']),
+        'limiar_atencao': estado['limiares'][0],
+        'limiar_critico': estado['limiares'][1],
+        'total': len(estado['nos']),
+        'confirmados': len(confirmados),
+        'duracao_ms': round((time.perf_counter() - estado['inicio']) * 1000, 1),
+        'rtt_ms_medio': round(sum(rtts) / len(rtts), 1) if rtts else None,
+        # [id, rtt_ms, luminosidade, led_verde, led_amarelo, led_vermelho, buzzer]; None sem confirmação
+        'nos': [estado['nos'][id_no] for id_no in sorted(estado['nos'])],
+    }
+
+
+def encerrar_por_sinal(signum, frame):
+    """Converte o SIGTERM (enviado pelo init.py) em saída normal, para que os 'finally' rodem."""
+    sys.exit(0)
 
 # =============================================================================
 
@@ -94,136 +139,230 @@ caminho_nivel4 = os.path.abspath(os.path.join(dir_atual, '..', 'nivel4'))
 caminho_config_yaml = os.path.join(caminho_nivel4, 'configuracoes.yaml')
 caminho_log_rede_csv = os.path.join(caminho_nivel4, 'dados_brutos_rede.csv')
 caminho_log_aplicacao_csv = os.path.join(caminho_nivel4, 'dados_brutos_aplicacao.csv')
+caminho_estado = os.path.join(caminho_nivel4, 'estado_nos.bin')
 
 # --- Script Principal ---
 
+def criar_socket(porta):
+    """Cria o socket UDP local, ligado à porta informada."""
+    udp_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        udp_socket.bind(('', porta))
+    except OSError:
+        udp_socket.close()
+        raise
+    return udp_socket
+
+
 def main():
     """Função principal que executa o loop de comunicação com reconfiguração dinâmica."""
     
-    config_inicial = carregar_configuracoes(caminho_config_yaml)
+    cache_config = CacheConfiguracao(caminho_config_yaml)
+    config_inicial = cache_config.obter()
     if not config_inicial:
         print(f"Verifique o caminho para configuracoes.yaml: {caminho_config_yaml}")
         return
 
     # --- Configuração Inicial do Socket ---
-    current_ip = config_inicial['nivel1']['ip']
     current_port = config_inicial['nivel1']['porta']
-    HOST_LOCAL = ''
-    
-    udp_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-    udp_socket.settimeout(2.0)
     try:
-        udp_socket.bind((HOST_LOCAL, current_port))
+        udp_socket = criar_socket(current_port)
     except OSError as e:
         print(f"Erro ao fazer bind na porta {current_port}: {e}.")
         return
 
+    garantir_cabecalho(caminho_log_rede_csv, CABECALHO_REDE, ["", "", "", ID_NO_PADRAO, ""])
+    garantir_cabecalho(caminho_log_aplicacao_csv, CABECALHO_APLICACAO, ["", "", ID_NO_PADRAO])
+
+    nos_iniciais = listar_nos(config_inicial)
+    estado_nos = EstadoNos(caminho_estado, escrita=True)
+    escritor = criar_escritor(config_inicial)
+    barramento = criar_publicador()
+
+    # 'nivel4.armazenamento: binario' troca os CSVs brutos pela série temporal binária
+    serie = None
+    if config_inicial.get('nivel4', {}).get('armazenamento', 'csv') == 'binario':
+        caminho_serie_binaria = os.path.join(caminho_nivel4, nome_arquivo_binario(config_inicial))
+        serie = SerieTemporal(caminho_serie_binaria)
+        serie.migrar()  # Séries da versão 1 ganham o campo de RTT
+        print(f"Armazenamento binário ativo em '{caminho_serie_binaria}'")
+    signal.signal(signal.SIGTERM, encerrar_por_sinal)
+    registro.iniciar_publicacao('nivel3')
+
+    def ao_receber(no, Pacote_RX, rtt):
+        inicio = time.perf_counter()
+        rtt_udp.observar(rtt, no=no.id)
+        respostas_udp.inc(no=no.id)
+        timestamp_ms = int(time.time() * 1000)
+        timestamp_recebido = formatar_timestamp(timestamp_ms)
+        dados = decodificar_uplink(Pacote_RX)
+
+        rtt_ms = rtt * 1000
+        # Publica antes de enfileirar para os arquivos: o que já está no disco já passou pelo barramento
+        if barramento is not None:
+            barramento.publicar(timestamp_ms, no.id, dados['rssi'], dados['luminosidade'], CODIGO_STATUS["Sucesso"],
+                                rtt_ms, bits_atuadores(dados))
+
+        print(f"[{timestamp_recebido}] Nó {no.id} sincronizado! RSSI: {dados['rssi']:.2f} dBm, Luminosidade: {dados['luminosidade']}, Status LED Vd:{dados['led_verde']}, Am:{dados['led_amarelo']}, Vm:{dados['led_vermelho']}, RTT: {rtt_ms:.1f} ms")
+
+        if serie is not None:
+            registrar_binario(escritor, serie, timestamp_ms, dados['rssi'], dados['luminosidade'], "Sucesso", no.id, rtt_ms)
+        else:
+            registrar_log_rede(escritor, caminho_log_rede_csv, timestamp_recebido, f"{dados['rssi']:.2f}", "Sucesso", no.id, f"{rtt_ms:.1f}")
+            registrar_log_aplicacao(escritor, caminho_log_aplicacao_csv, timestamp_recebido, dados['luminosidade'], no.id)
+
+        with etapas_coleta.cronometrar(etapa='escrita_estado'):
+            estado_nos.atualizar(no.id, dados, dados['luminosidade'], dados['rssi'], rtt_ms)
+        etapas_coleta.observar(time.perf_counter() - inicio, etapa='processar_resposta')
+
+    comandos = {}  # chave interna -> estado de um comando de limiares em andamento
+    chaves_comando = count(1)
+
+    def ao_chegar_comando():
+        for comando, origem in canal.receber():
+            try:
+                if comando.get('tipo') != 'limiares':
+                    raise ValueError(f"tipo de comando desconhecido: {comando.get('tipo')!r}")
+                limiares = (validar_limiar(comando['limiar_atencao']), validar_limiar(comando['limiar_critico']))
+                ids = None if comando.get('nos') is None else [int(id_no) for id_no in comando['nos']]
+            except (KeyError, TypeError, ValueError) as e:
+                canal.responder(origem, {'id': comando.get('id'), 'sucesso': False, 'erro': f"Comando inválido: {e}"})
+                continue
+
+            # A grade passa a usar os limiares novos já, sem esperar a recarga do YAML (onde o nivel6 também os grava)
+            motor.limiares = limiares
+            chave = next(chaves_comando)
+            alvos = motor.enviar_agora(ids, limiares, chave)
+            if not alvos:
+                canal.responder(origem, {'id': comando.get('id'), 'sucesso': False, 'erro': "Nenhum nó conhecido entre os pedidos."})
+                continue
+            comandos[chave] = {'id': comando.get('id'), 'origem': origem, 'limiares': limiares, 'inicio': time.perf_counter(),
+                               'nos': {no.id: [no.id, None, None, None, None, None, None] for no in alvos},
+                               'faltam': {no.id for no in alvos}}
+            print(f"[INFO] Limiares {limiares[0]}/{limiares[1]} enviados imediatamente a {len(alvos)} nó(s).")
+
+    def ao_responder_comando(chave, no, Pacote_RX, rtt):
+        estado = comandos.get(chave)
+        if estado is None or no.id not in estado['faltam']:
+            return
+        if Pacote_RX is not None:
+            dados = decodificar_uplink(Pacote_RX)
+            estado['nos'][no.id] = [no.id, round(rtt * 1000, 1), dados['luminosidade'], dados['led_verde'],
+                                    dados['led_amarelo'], dados['led_vermelho'], dados['buzzer']]
+        estado['faltam'].discard(no.id)
+        if not estado['faltam']:
+            del comandos[chave]
+            resposta = resposta_comando(estado)
+            duracao_comandos.observar(resposta['duracao_ms'] / 1000)
+            print(f"[INFO] Limiares confirmados por {resposta['confirmados']}/{resposta['total']} nó(s) em {resposta['duracao_ms']} ms.")
+            canal.responder(estado['origem'], resposta)
+
+    def ao_falhar(no, status, tamanho):
+        falhas_udp.inc(no=no.id, motivo='timeout' if tamanho is None else 'tamanho_incorreto')
+        timestamp_ms = int(time.time() * 1000)
+        timestamp_falha = formatar_timestamp(timestamp_ms)
+        if tamanho is not None:
+            print(f"[{timestamp_falha}] Erro: Pacote do nó {no.id} recebido com tamanho inesperado ({tamanho} bytes).")
+        else:
+            print(f"[{timestamp_falha}] Timeout: Nenhuma resposta recebida do nó {no.id} em {no.endereco}.")
+        if barramento is not None:
+            barramento.publicar(timestamp_ms, no.id, float('nan'), 0, CODIGO_STATUS[status])
+        if serie is not None:
+            registrar_binario(escritor, serie, timestamp_ms, float('nan'), 0, status, no.id)
+        else:
+            registrar_log_rede(escritor, caminho_log_rede_csv, timestamp_falha, "N/A", status, no.id)
+
+    motor = MotorColeta(udp_socket, ao_receber, ao_falhar, ao_comando=ao_responder_comando)
+    canal = criar_canal_comandos(config_inicial)
+    if canal is not None:
+        motor.registrar_leitura(canal.socket, ao_chegar_comando)
+    motor.atualizar_nos(nos_iniciais)
+    porta_pendente = False
+    pausado = True  # A grade de envios (re)começa quando a coleta (re)inicia
+
     print(f"Servidor UDP escutando na porta {current_port}")
-    print(f"Monitorando e configurando o Nó Sensor em {current_ip}")
+    print(f"Monitorando e configurando {len(nos_iniciais)} nó(s) sensor(es): " + ", ".join(f"{no['id']}@{no['ip']}" for no in nos_iniciais))
     print("Pressione Ctrl+C para encerrar.")
 
-    pkt_down_counter = 0
-
     try:
         while True:
-            config = carregar_configuracoes(caminho_config_yaml)
+            if comandos:
+                # A recarga do YAML (que o nivel6 acabou de gravar) bloquearia o loop com as
+                # confirmações chegando: espera o comando terminar
+                motor.rodar(PERIODO_RECARGA_S, enviar=not pausado)
+                continue
+
+            with etapas_coleta.cronometrar(etapa='recarga_yaml'):
+                config, alteradas = cache_config.carregar()
             if not config:
                 print("Falha ao recarregar configurações. Aguardando...")
+                pausado = True
                 time.sleep(5)
                 continue
 
             if not config.get('nivel3', {}).get('ligado', False):
                 print("Coleta de dados pausada via arquivo de configuração (ligado: False).   ", end="\r")
-                time.sleep(5)
+                pausado = True
+                motor.rodar(5, enviar=False)  # Sem consultas, mas comandos de limiares ainda são atendidos
                 continue
             
             print("                                                                          ", end="\r")
             intervalo = config['nivel3']['intervalo_medicoes']
 
-            # --- Início da Modificação: Reconfiguração Dinâmica de Rede ---
-            new_ip = config['nivel1']['ip']
+            # --- Reconfiguração Dinâmica de Rede (apenas quando o YAML muda) ---
             new_port = config['nivel1']['porta']
 
-            if new_port != current_port:
+            if ('nivel1.porta' in alteradas or porta_pendente) and new_port != current_port:
                 print(f"\n[INFO] Detectada mudança de porta. Reiniciando socket de {current_port} para {new_port}...")
                 try:
-                    udp_socket.close()
-                    udp_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-                    udp_socket.settimeout(2.0)
-                    udp_socket.bind((HOST_LOCAL, new_port))
-                    current_port = new_port
-                    print(f"[INFO] Socket reconfigurado com sucesso para porta {current_port}.")
+                    novo_socket = criar_socket(new_port)
                 except OSError as e:
                     print(f"[ERRO] Falha ao reconfigurar para porta {new_port}: {e}. Tentando novamente no próximo ciclo.")
+                    porta_pendente = True
+                    pausado = True
                     time.sleep(intervalo)
                     continue
-
-            current_ip = new_ip
-            ENDERECO_SENSOR = (current_ip, current_port)
-            # --- Fim da Modificação ---
-
-            # --- Preparação do Pacote de Saída ---
-            PacoteTX = [0] * 52
-            pkt_down_counter = (pkt_down_counter + 1) % 256
-            PacoteTX[12] = pkt_down_counter
-            PacoteTX[8] = 1 
-            PacoteTX[10] = 0 
+                motor.trocar_socket(novo_socket)
+                udp_socket.close()
+                udp_socket = novo_socket
+                current_port = new_port
+                porta_pendente = False
+                print(f"[INFO] Socket reconfigurado com sucesso para porta {current_port}.")
+
+            if alteradas & CHAVES_NOS:
+                try:
+                    nos = listar_nos(config)
+                except (KeyError, TypeError, ValueError) as e:
+                    print(f"[ERRO] Lista de nós inválida em 'nivel1': {e}. Mantendo a lista anterior.")
+                else:
+                    motor.atualizar_nos(nos)
+            # --- Fim da Reconfiguração ---
 
             try:
-                limiar_para_envio_1 = int(config['nivel6']['limiar_atencao'])
-                limiar_para_envio_2 = int(config['nivel6']['limiar_critico'])
+                limiar_para_envio_1 = validar_limiar(config['nivel6']['limiar_atencao'])
+                limiar_para_envio_2 = validar_limiar(config['nivel6']['limiar_critico'])
             except (KeyError, TypeError, ValueError):
                 limiar_para_envio_1 = 0
                 limiar_para_envio_2 = 0
 
-            PacoteTX[16] = limiar_para_envio_1 // 256
-            PacoteTX[17] = limiar_para_envio_1 % 256
-            PacoteTX[18] = limiar_para_envio_2 // 256
-            PacoteTX[19] = limiar_para_envio_2 % 256
-            # --- Fim do Empacotamento ---
-
-            # --- Envio e Recepção ---
-            udp_socket.sendto(bytes(PacoteTX), ENDERECO_SENSOR)
-
-            try:
-                Pacote_RX, cliente = udp_socket.recvfrom(1024)
-                if len(Pacote_RX) == 52:
-                    timestamp_recebido = datetime.now().strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]
-                    
-                    byte2 = Pacote_RX[2]
-                    rssi_dl = ((byte2 - 256) / 2.0) - 74 if byte2 > 128 else (byte2 / 2.0) - 74
-                    luminosidade_calculada = Pacote_RX[17] * 256 + Pacote_RX[18]
-                    
-                    led_verde_status = bool(Pacote_RX[34])
-                    led_amarelo_status = bool(Pacote_RX[37])
-                    led_vermelho_status = bool(Pacote_RX[40])
-                    buzzer_status = bool(Pacote_RX[43])
-
-                    print(f"[{timestamp_recebido}] Sincronizado! RSSI: {rssi_dl:.2f} dBm, Luminosidade: {luminosidade_calculada}, Status LED Vd:{led_verde_status}, Am:{led_amarelo_status}, Vm:{led_vermelho_status}")
-                    
-                    registrar_log_rede(caminho_log_rede_csv, timestamp_recebido, f"{rssi_dl:.2f}", "Sucesso")
-                    registrar_log_aplicacao(caminho_log_aplicacao_csv, timestamp_recebido, luminosidade_calculada)
-
-                    novos_estados = {
-                        'led_verde': led_verde_status, 
-                        'led_amarelo': led_amarelo_status,
-                        'led_vermelho': led_vermelho_status, 
-                        'buzzer': buzzer_status,
-                        'luminosidade': luminosidade_calculada
-                    }
-                    atualizar_status_yaml(caminho_config_yaml, novos_estados)
-
-                else:
-                    timestamp_falha = datetime.now().strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]
-                    print(f"[{timestamp_falha}] Erro: Pacote recebido com tamanho inesperado ({len(Pacote_RX)} bytes).")
-                    registrar_log_rede(caminho_log_rede_csv, timestamp_falha, "N/A", "Falha (Tamanho Incorreto)")
-            
-            except socket.timeout:
-                timestamp_falha = datetime.now().strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]
-                print(f"[{timestamp_falha}] Timeout: Nenhuma resposta recebida do sensor.")
-                registrar_log_rede(caminho_log_rede_csv, timestamp_falha, "N/A", "Falha (Timeout)")
-            
-            time.sleep(float(intervalo))
+            motor.intervalo = float(intervalo)
+            motor.limiares = (limiar_para_envio_1, limiar_para_envio_2)
+            motor.definir_janela(config['nivel3'].get('janela_requisicoes', 1))
+            if pausado:
+                motor.reiniciar_grade()
+                pausado = False
+
+            # --- Envio e Recepção (todos os nós em paralelo) ---
+            motor.rodar(PERIODO_RECARGA_S)
+
+            for id_no, (atrasadas, fora_de_ordem, perdidos) in motor.coletar_contadores().items():
+                if atrasadas or fora_de_ordem:
+                    print(f"[INFO] Nó {id_no}: {atrasadas} resposta(s) atrasada(s) descartada(s), {fora_de_ordem} fora de ordem.")
+                if perdidos:
+                    print(f"[AVISO] Nó {id_no}: {perdidos} instante(s) de consulta perdido(s) (janela cheia ou loop atrasado).")
+                    ticks_perdidos.inc(perdidos, no=id_no)
+            for no in motor.nos.values():
+                timeout_udp.definir(no.rto, no=no.id)
 
     except KeyboardInterrupt:
         print("\nExecução interrompida pelo usuário.")
@@ -231,8 +370,13 @@ def main():
         print(f"Erro inesperado no loop principal: {e}")
     finally:
         udp_socket.close()
-        print("Socket fechado. Fim da execução.")
+        if canal is not None:
+            canal.fechar()
+        estado_nos.fechar()
+        if barramento is not None:
+            barramento.fechar()
+        escritor.fechar()
+        print("Socket fechado e logs gravados. Fim da execução.")
 
 if __name__ == "__main__":
     main()
-
@@ -0,0 +1,354 @@
+# coleta.py - Motor de coleta concorrente para múltiplos nós sensores
+
+import selectors
+import socket
+import struct
+import time
+from collections import deque
+
+from comum.pacote import TAMANHO_PACOTE, ReceptorPacotes, codificar_downlink_em
+
+TIMEOUT_PADRAO = 2.0  # Timeout inicial (antes de haver amostras de RTT) e máximo
+TIMEOUT_MINIMO = 0.2
+GRANULARIDADE_S = 0.001
+# Estimador de RTT da RFC 6298 (o mesmo do TCP)
+ALFA_RTT = 1 / 8
+BETA_RTT = 1 / 4
+K_RTT = 4
+JANELA_MAXIMA = 64  # Limite de requisições pendentes por nó (o contador tem só 255 valores)
+TENTATIVAS_COMANDO = 3  # Envios de um downlink imediato antes de dar o nó como sem confirmação
+COMANDOS_EM_VOO = 128  # Downlinks imediatos sem resposta ao mesmo tempo: numa difusão a todos os nós,
+                       # as respostas simultâneas estourariam o buffer de recepção do socket
+
+
+class NoSensor:
+    """Estado de polling de um nó sensor: endereço, contador, requisições pendentes e estimativa de RTT."""
+
+    def __init__(self, id_no, ip, porta, endereco_rede=1, timeout=TIMEOUT_PADRAO):
+        self.id = id_no
+        self.ip = ip
+        self.porta = porta
+        self.endereco_rede = endereco_rede
+        try:
+            self.endereco = (socket.gethostbyname(ip), porta)
+        except OSError:
+            self.endereco = (ip, porta)
+        self.contador = 0
+        self.pendentes = {}  # contador -> instante_envio, em ordem de envio
+        self.comandos = {}  # contador -> (comando, limiares, tentativa) dos downlinks imediatos pendentes
+        self.expirados = deque(maxlen=JANELA_MAXIMA)  # contadores que já deram timeout
+        self.proximo_envio = 0.0
+        self.respostas_atrasadas = 0
+        self.respostas_fora_de_ordem = 0
+        self.ticks_perdidos = 0
+        self.timeout_maximo = timeout
+        self.srtt = None
+        self.rttvar = None
+        self.rto = timeout
+
+    def registrar_rtt(self, rtt):
+        """Atualiza SRTT/RTTVAR com uma amostra e recalcula o timeout (RTO = SRTT + 4 * RTTVAR)."""
+        if self.srtt is None:
+            self.srtt = rtt
+            self.rttvar = rtt / 2
+        else:
+            self.rttvar = (1 - BETA_RTT) * self.rttvar + BETA_RTT * abs(self.srtt - rtt)
+            self.srtt = (1 - ALFA_RTT) * self.srtt + ALFA_RTT * rtt
+        rto = self.srtt + max(GRANULARIDADE_S, K_RTT * self.rttvar)
+        self.rto = min(max(rto, TIMEOUT_MINIMO), self.timeout_maximo)
+
+    def recuar(self):
+        """Após um timeout, dobra o RTO (até o máximo), como o TCP."""
+        self.rto = min(self.rto * 2, self.timeout_maximo)
+
+    def proximo_contador(self):
+        """Avança o contador de downlink (byte 12), evitando o 0, que indica firmware sem echo."""
+        self.contador = self.contador % 255 + 1
+        return self.contador
+
+
+class MotorColeta:
+    """
+    Mantém todos os nós em andamento ao mesmo tempo sobre um único socket UDP.
+    As respostas são associadas pelo endereço de origem e pelo contador do byte 12,
+    de modo que um nó que não responde não atrasa os demais.
+
+    Cada nó é consultado numa grade fixa de instantes (relógio monotônico), a
+    cada 'intervalo' segundos, independentemente do RTT e dos timeouts: o
+    período não acumula atraso. Quando um instante inteiro passa sem envio
+    (janela cheia ou loop atrasado), ele é pulado e contado em 'ticks_perdidos'.
+
+    Com 'janela' > 1, até 'janela' requisições ficam pendentes por nó, sem
+    esperar a resposta da anterior. Respostas fora de ordem são aceitas;
+    respostas de requisições que já expiraram são contadas como atrasadas e
+    descartadas. O timeout de cada nó segue o RTT medido (SRTT/RTTVAR da
+    RFC 6298), entre TIMEOUT_MINIMO e 'timeout'.
+
+    enviar_agora() manda um downlink fora da grade (ex.: limiares novos) e
+    chama 'ao_comando' com a resposta de cada nó ou após TENTATIVAS_COMANDO
+    timeouts seguidos. A resposta também passa por 'ao_receber', como qualquer
+    amostra. Numa difusão, no máximo COMANDOS_EM_VOO ficam sem resposta ao mesmo tempo.
+
+    Os pacotes são recebidos num buffer pré-alocado: o 'Pacote_RX' passado a
+    'ao_receber' e 'ao_comando' só vale durante a chamada (decodifique, não guarde).
+    """
+
+    def __init__(self, udp_socket, ao_receber, ao_falhar, timeout=TIMEOUT_PADRAO, janela=1, ao_comando=None):
+        self.seletor = selectors.DefaultSelector()
+        self.udp_socket = None
+        self.ao_receber = ao_receber
+        self.ao_falhar = ao_falhar
+        self.ao_comando = ao_comando
+        self.timeout = timeout
+        self.intervalo = 1.0
+        self.janela = janela
+        self.limiares = (0, 0)
+        self.nos = {}
+        self.por_endereco = {}
+        self.fila_comandos = deque()  # (nó, limiares, comando, tentativa) aguardando vaga
+        self.comandos_em_voo = 0
+        self.receptor = ReceptorPacotes()
+        self.pacote_envio = bytearray(TAMANHO_PACOTE)  # Downlink montado no lugar a cada envio
+        self.trocar_socket(udp_socket)
+
+    def trocar_socket(self, udp_socket):
+        """Passa a usar um novo socket (ex.: após mudança de porta), descartando pendências."""
+        if self.udp_socket is not None:
+            self.seletor.unregister(self.udp_socket)
+        udp_socket.setblocking(False)
+        self.seletor.register(udp_socket, selectors.EVENT_READ)
+        self.udp_socket = udp_socket
+        for no in self.nos.values():
+            no.pendentes.clear()
+            self._abandonar_comandos(no)
+
+    def registrar_leitura(self, sock, ao_ler):
+        """Acorda o loop de 'rodar' quando 'sock' tiver dados e chama 'ao_ler()' (ex.: canal de comandos)."""
+        self.seletor.register(sock, selectors.EVENT_READ, ao_ler)
+
+    def definir_janela(self, janela):
+        """Define quantas requisições podem ficar pendentes por nó (1 = modo síncrono)."""
+        self.janela = min(max(int(janela), 1), JANELA_MAXIMA)
+
+    def coletar_contadores(self):
+        """
+        Retorna e zera as respostas atrasadas, fora de ordem e os ticks perdidos
+        de cada nó: {id: (atrasadas, fora_de_ordem, ticks_perdidos)}.
+        """
+        contadores = {}
+        for no in self.nos.values():
+            if no.respostas_atrasadas or no.respostas_fora_de_ordem or no.ticks_perdidos:
+                contadores[no.id] = (no.respostas_atrasadas, no.respostas_fora_de_ordem, no.ticks_perdidos)
+                no.respostas_atrasadas = 0
+                no.respostas_fora_de_ordem = 0
+                no.ticks_perdidos = 0
+        return contadores
+
+    def atualizar_nos(self, definicoes):
+        """Sincroniza os nós com a configuração, preservando o estado dos que não mudaram."""
+        agora = time.monotonic()
+        novos = {}
+        for definicao in definicoes:
+            atual = self.nos.get(definicao['id'])
+            if (atual is not None and atual.ip == definicao['ip'] and atual.porta == definicao['porta']
+                    and atual.endereco_rede == definicao['endereco_rede']):
+                novos[atual.id] = atual
+                continue
+            if atual is not None:
+                self._abandonar_comandos(atual)
+            no = NoSensor(definicao['id'], definicao['ip'], definicao['porta'], definicao['endereco_rede'], self.timeout)
+            # Espalha o primeiro envio dos nós novos ao longo de um intervalo
+            no.proximo_envio = agora + self.intervalo * len(novos) / max(len(definicoes), 1)
+            novos[no.id] = no
+
+        for id_no in self.nos.keys() - {definicao['id'] for definicao in definicoes}:
+            self._abandonar_comandos(self.nos[id_no])
+        self.nos = novos
+        self.por_endereco = {}
+        for no in novos.values():
+            if no.endereco in self.por_endereco:
+                print(f"[AVISO] Nós {self.por_endereco[no.endereco].id} e {no.id} usam o mesmo endereço {no.endereco}.")
+            self.por_endereco[no.endereco] = no
+
+    def reiniciar_grade(self):
+        """Recomeça a grade de envios a partir de agora (ex.: ao retomar uma coleta pausada)."""
+        agora = time.monotonic()
+        for indice, no in enumerate(self.nos.values()):
+            no.proximo_envio = agora + self.intervalo * indice / max(len(self.nos), 1)
+
+    def enviar_agora(self, ids, limiares, comando):
+        """
+        Envia já, fora da grade e sem respeitar a janela, um downlink com
+        'limiares' aos nós 'ids' (todos, se None). Retorna os nós alvo.
+        """
+        nos = list(self.nos.values()) if ids is None else [self.nos[id_no] for id_no in ids if id_no in self.nos]
+        self.fila_comandos.extend((no, limiares, comando, 1) for no in nos)
+        self._enviar_comandos(time.monotonic())
+        return nos
+
+    def rodar(self, duracao, enviar=True):
+        """
+        Executa envios, recepções e timeouts de todos os nós durante 'duracao'
+        segundos. Com 'enviar=False' (coleta pausada), a grade fica parada, mas
+        respostas, timeouts e comandos continuam sendo tratados.
+        """
+        fim = time.monotonic() + duracao
+        while True:
+            self._receber()  # Respostas que já chegaram não podem ser dadas como expiradas
+            agora = time.monotonic()
+            self._expirar(agora)
+            self._enviar_comandos(agora)
+            if enviar:
+                self._enviar(agora)
+            if agora >= fim:
+                break
+
+            proximo_evento = fim
+            for no in self.nos.values():
+                if no.pendentes:
+                    proximo_evento = min(proximo_evento, next(iter(no.pendentes.values())) + no.rto)
+                if enviar and len(no.pendentes) < self.janela:
+                    proximo_evento = min(proximo_evento, no.proximo_envio)
+
+            for chave, _ in self.seletor.select(max(proximo_evento - agora, 0)):
+                if chave.data is not None:
+                    chave.data()
+
+    def _enviar(self, agora):
+        limiar_1, limiar_2 = self.limiares
+        for no in self.nos.values():
+            if len(no.pendentes) >= self.janela or agora < no.proximo_envio:
+                continue
+            self._avancar_grade(no, agora)
+            contador = no.proximo_contador()
+            if contador in no.expirados:
+                no.expirados.remove(contador)  # O contador voltou a ser usado
+            try:
+                codificar_downlink_em(self.pacote_envio, contador, no.endereco_rede, limiar_1, limiar_2)
+                self.udp_socket.sendto(self.pacote_envio, no.endereco)
+            except BlockingIOError:
+                return  # Buffer de envio cheio: tenta de novo na próxima volta
+            except OSError as e:
+                print(f"[ERRO] Falha ao enviar para o nó {no.id} em {no.endereco}: {e}")
+                continue
+            except struct.error as e:
+                print(f"[ERRO] Downlink inválido para o nó {no.id} (limiares {self.limiares}): {e}")
+                continue
+            no.pendentes[contador] = agora
+
+    def _enviar_comandos(self, agora):
+        while self.fila_comandos and self.comandos_em_voo < COMANDOS_EM_VOO:
+            no, limiares, comando, tentativa = self.fila_comandos.popleft()
+            if self.nos.get(no.id) is not no:
+                if self.ao_comando is not None:
+                    self.ao_comando(comando, no, None, None)  # Nó removido enquanto esperava vaga
+                continue
+            self._enviar_comando(no, limiares, comando, tentativa, agora)
+
+    def _enviar_comando(self, no, limiares, comando, tentativa, agora):
+        contador = no.proximo_contador()
+        if contador in no.expirados:
+            no.expirados.remove(contador)
+        try:
+            codificar_downlink_em(self.pacote_envio, contador, no.endereco_rede, *limiares)
+        except struct.error as e:
+            # Reenviar não adianta: o comando falha para este nó
+            print(f"[ERRO] Comando inválido para o nó {no.id} (limiares {limiares}): {e}")
+            if self.ao_comando is not None:
+                self.ao_comando(comando, no, None, None)
+            return
+        try:
+            self.udp_socket.sendto(self.pacote_envio, no.endereco)
+        except BlockingIOError:
+            pass  # Conta como tentativa perdida: o timeout reenvia
+        except OSError as e:
+            print(f"[ERRO] Falha ao enviar comando para o nó {no.id} em {no.endereco}: {e}")
+        no.pendentes[contador] = agora
+        no.comandos[contador] = (comando, limiares, tentativa)
+        self.comandos_em_voo += 1
+
+    def _concluir_comando(self, no, contador, Pacote_RX=None, rtt=None):
+        """Se 'contador' era um downlink imediato, repassa a resposta (ou a falha, com Pacote_RX None)."""
+        envio = no.comandos.pop(contador, None)
+        if envio is None:
+            return
+        self.comandos_em_voo -= 1
+        if self.ao_comando is not None:
+            self.ao_comando(envio[0], no, Pacote_RX, rtt)
+
+    def _abandonar_comandos(self, no):
+        """Nó removido ou socket trocado: os comandos pendentes dele terminam sem confirmação."""
+        for contador in list(no.comandos):
+            self._concluir_comando(no, contador)
+
+    def _avancar_grade(self, no, agora):
+        """
+        Agenda o próximo envio no instante seguinte da grade (e não em 'agora +
+        intervalo'), contando os instantes que passaram inteiros sem envio.
+        """
+        perdidos = int((agora - no.proximo_envio) // self.intervalo) if self.intervalo > 0 else 0
+        no.ticks_perdidos += perdidos
+        no.proximo_envio += (perdidos + 1) * self.intervalo
+
+    def _expirar(self, agora):
+        for no in self.nos.values():
+            # As pendentes estão em ordem de envio: basta olhar as mais antigas
+            while no.pendentes:
+                contador, instante_envio = next(iter(no.pendentes.items()))
+                if agora - instante_envio < no.rto:
+                    break
+                del no.pendentes[contador]
+                no.expirados.append(contador)
+                no.recuar()
+                self.ao_falhar(no, "Falha (Timeout)", None)
+                comando, limiares, tentativa = no.comandos.get(contador, (None, None, TENTATIVAS_COMANDO))
+                if tentativa < TENTATIVAS_COMANDO:
+                    del no.comandos[contador]
+                    self.comandos_em_voo -= 1
+                    self.fila_comandos.appendleft((no, limiares, comando, tentativa + 1))
+                else:
+                    self._concluir_comando(no, contador)
+
+    def _receber(self):
+        while True:
+            try:
+                Pacote_RX, cliente = self.receptor.receber(self.udp_socket)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError as e:
+                # No Windows um ICMP "port unreachable" aparece como erro no recvfrom
+                print(f"[ERRO] Falha na recepção UDP: {e}")
+                return
+
+            agora = time.monotonic()
+            no = self.por_endereco.get(cliente[:2])
+            if no is None:
+                continue
+
+            if len(Pacote_RX) != TAMANHO_PACOTE:
+                # Sem contador confiável: a falha consome a requisição mais antiga
+                if no.pendentes:
+                    contador = next(iter(no.pendentes))
+                    del no.pendentes[contador]
+                    self.ao_falhar(no, "Falha (Tamanho Incorreto)", len(Pacote_RX))
+                    self._concluir_comando(no, contador)
+                continue
+
+            contador = Pacote_RX[12]
+            sem_echo = contador == 0
+            if sem_echo and no.pendentes:
+                contador = next(iter(no.pendentes))  # Firmware sem echo: assume a mais antiga
+
+            if contador not in no.pendentes:
+                if contador in no.expirados:
+                    no.respostas_atrasadas += 1
+                continue
+
+            if contador != next(iter(no.pendentes)):
+                no.respostas_fora_de_ordem += 1
+
+            instante_envio = no.pendentes.pop(contador)
+            if not sem_echo:
+                no.registrar_rtt(agora - instante_envio)  # Sem echo a associação é incerta (algoritmo de Karn)
+            self.ao_receber(no, Pacote_RX, agora - instante_envio)
+            self._concluir_comando(no, contador, Pacote_RX, agora - instante_envio)
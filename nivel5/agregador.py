@@ -0,0 +1,69 @@
+# agregador.py - Estatísticas de janelas deslizantes atualizadas a cada amostra
+
+from collections import deque
+
+
+class JanelaDeslizante:
+    """
+    Média, mínimo e máximo das últimas 'tamanho' amostras, em O(1) amortizado
+    por amostra: soma corrente para a média e deques monotônicos para mín/máx.
+    """
+
+    def __init__(self, tamanho):
+        if tamanho <= 0:
+            raise ValueError("O tamanho da janela deve ser positivo.")
+        self.tamanho = tamanho
+        self.valores = deque()
+        self.soma = 0
+        self._indice = 0
+        self._minimos = deque()  # (índice, valor), valores crescentes
+        self._maximos = deque()  # (índice, valor), valores decrescentes
+
+    def __len__(self):
+        return len(self.valores)
+
+    def adicionar(self, valor):
+        self.valores.append(valor)
+        self.soma += valor
+        if len(self.valores) > self.tamanho:
+            self.soma -= self.valores.popleft()
+
+        while self._minimos and self._minimos[-1][1] >= valor:
+            self._minimos.pop()
+        self._minimos.append((self._indice, valor))
+        while self._maximos and self._maximos[-1][1] <= valor:
+            self._maximos.pop()
+        self._maximos.append((self._indice, valor))
+
+        limite = self._indice - self.tamanho
+        if self._minimos[0][0] <= limite:
+            self._minimos.popleft()
+        if self._maximos[0][0] <= limite:
+            self._maximos.popleft()
+
+        self._indice += 1
+        # Recalcula a soma a cada volta completa para não acumular erro de ponto flutuante
+        if self._indice % self.tamanho == 0:
+            self.soma = sum(self.valores)
+
+    def estatisticas(self):
+        """Retorna (média, mínimo, máximo) da janela, ou None se ela estiver vazia."""
+        if not self.valores:
+            return None
+        return self.soma / len(self.valores), self._minimos[0][1], self._maximos[0][1]
+
+
+class AgregadorJanelas:
+    """Alimenta várias janelas deslizantes (ex.: 12, 600 e 36000 amostras) com a mesma série."""
+
+    def __init__(self, tamanhos):
+        self.janelas = {tamanho: JanelaDeslizante(tamanho) for tamanho in sorted(set(tamanhos))}
+
+    def adicionar(self, valores):
+        for valor in valores:
+            for janela in self.janelas.values():
+                janela.adicionar(valor)
+
+    def estatisticas(self):
+        """Retorna {tamanho: (média, mínimo, máximo)} das janelas que já têm amostras."""
+        return {tamanho: janela.estatisticas() for tamanho, janela in self.janelas.items() if len(janela)}
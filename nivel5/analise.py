@@ -1,16 +1,36 @@
-# nivel5/analise.py - Versão com Escrita Segura preparada
+# nivel5/analise.py - Versão com Janelas Deslizantes Incrementais
 
+import csv
 import os
+import signal
+import sys
 import time
 from datetime import datetime
+import numpy as np
 import yaml
-import pandas as pd
-from collections import deque
-import io
 import tempfile
+from agregador import AgregadorJanelas
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')))
+from comum.barramento import LeitorBarramento
+from comum.cauda import LeitorCauda
+from comum.configuracao import ID_NO_PADRAO, CacheConfiguracao
+from comum.metricas import registro
+from comum.rollup import Rollups
+from comum.rotacao import Rotacionador, politica_da_config
+from comum.serie_temporal import STATUS_SUCESSO, SerieTemporal, formatar_timestamp, nome_arquivo_binario
 
 # --- Configuração de Caminhos ---
 CONFIG_PATH = os.path.join(os.path.dirname(__file__), '..', 'nivel4', 'configuracoes.yaml')
+cache_config = CacheConfiguracao(CONFIG_PATH)
+
+BUFFER_MULTIPLIER = 3  # Amostras lidas a mais na carga inicial, para compensar as falhas no log de rede
+INTERVALO_ESTADO_ROLLUP_S = 30  # Salva os intervalos abertos no máximo a cada tanto, salvo quando algum fecha
+CABECALHO_STATS_REDE = ["Timestamp", "RSSI_Downlink_Media", "RSSI_Downlink_Min", "RSSI_Downlink_Max"]
+CABECALHO_STATS_APLICACAO = ["Timestamp", "Luminosidade_Media", "Luminosidade_Min", "Luminosidade_Max"]
+
+duracao_ciclo = registro.histograma('twinsen_analise_ciclo_segundos', "Duração de um ciclo de análise (rede + aplicação)")
+duracao_fluxo = registro.histograma('twinsen_analise_fluxo_segundos', "Duração da análise de cada fluxo", ('fluxo',))
 
 def salvar_yaml_seguro(caminho, dados):
     """Escreve o YAML de forma atômica para evitar corrupção."""
@@ -24,48 +44,225 @@ def salvar_yaml_seguro(caminho, dados):
         print(f"Erro ao salvar o YAML de forma segura: {e}")
 
 
-def carregar_configuracoes():
-    """Lê e retorna as configurações do arquivo YAML."""
-    try:
-        with open(CONFIG_PATH, 'r') as f:
-            return yaml.safe_load(f) or {}
-    except FileNotFoundError:
-        print(f"ERRO: Arquivo de configuração não encontrado em '{CONFIG_PATH}'. Verifique o caminho.")
-        return None
-    except yaml.YAMLError as e:
-        print(f"ERRO: Formato inválido no arquivo YAML: {e}")
-        return None
+def caminho_stats_janela(caminho_stats, tamanho):
+    """Arquivo de estatísticas de uma janela adicional: 'estatisticas_rede_j600.csv', por exemplo."""
+    raiz, extensao = os.path.splitext(caminho_stats)
+    return f"{raiz}_j{tamanho}{extensao}"
+
+
+def registrar_estatisticas(caminho, cabecalho, timestamp, stats):
+    """Anexa uma linha (timestamp, média, mínimo, máximo) ao CSV de estatísticas."""
+    file_exists = os.path.exists(caminho)
+    with open(caminho, 'a', newline='') as f:
+        writer = csv.writer(f)
+        if not file_exists:
+            writer.writerow(cabecalho)
+        writer.writerow([timestamp] + [f"{valor:.2f}" if isinstance(valor, float) else valor for valor in stats])
 
 
-def read_last_lines_as_dataframe(file_path, num_lines_to_read):
+class FluxoEstatisticas:
     """
-    Lê as últimas 'num_lines_to_read' linhas de um arquivo CSV e as carrega
-    em um DataFrame do Pandas de forma eficiente.
+    Estado de uma grandeza (RSSI ou luminosidade) entre os ciclos de análise:
+    até onde o arquivo bruto já foi lido e as janelas deslizantes alimentadas.
+    A cada ciclo, só as amostras novas são lidas e somadas às janelas e,
+    se houver 'caminho_rollup', aos agregados de 1 min / 1 h / 1 dia por nó.
+
+    Com o barramento do nivel3 contínuo, as amostras vêm dele e o arquivo só
+    é pulado até o fim; sem barramento ou após uma lacuna, o arquivo é lido
+    como antes e o último timestamp por nó descarta o que chegar repetido.
     """
-    try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            header = f.readline().strip()
-            if num_lines_to_read <= 0:
-                num_lines_to_read = 1 
-            last_n_lines = deque(f, num_lines_to_read)
-        
-        if not last_n_lines:
-            return pd.DataFrame(columns=header.split(','))
-
-        csv_in_memory = header + "\n" + "\n".join(last_n_lines)
-        return pd.read_csv(io.StringIO(csv_in_memory))
-    
-    except FileNotFoundError:
-        raise FileNotFoundError(f"Arquivo não encontrado: {file_path}")
-    except Exception as e:
-        print(f"Aviso: Não foi possível processar {file_path}. Erro: {e}")
-        return pd.DataFrame()
+
+    def __init__(self, caminho_bruto, binario, coluna, conversor, janela, janelas_adicionais, caminho_stats, cabecalho_stats,
+                 caminho_rollup=None, rotacao=None, campo_barramento=None):
+        self.caminho_bruto = caminho_bruto
+        self.coluna = coluna
+        self.conversor = conversor
+        self.campo_barramento = campo_barramento
+        self.sincronizado = False  # Já alcançou o arquivo e segue só pelo barramento
+        self.ultimo = {}  # nó -> timestamp da última amostra somada às janelas
+        self.janela = janela
+        self.agregador = AgregadorJanelas([janela] + list(janelas_adicionais))
+        self.cabecalho_stats = cabecalho_stats
+        self.caminhos_stats = {tamanho: caminho_stats_janela(caminho_stats, tamanho) for tamanho in self.agregador.janelas}
+        self.caminhos_stats[janela] = caminho_stats
+        self.rotacionadores = {tamanho: Rotacionador(caminho, rotacao) for tamanho, caminho in self.caminhos_stats.items()} \
+            if rotacao else {}
+
+        maior_janela = max(self.agregador.janelas)
+        self.carga_inicial = maior_janela * BUFFER_MULTIPLIER
+        self.serie = SerieTemporal(caminho_bruto) if binario else None
+        self.posicao = None
+        self.leitor = None if binario else LeitorCauda(caminho_bruto, self.carga_inicial, reter=False)
+
+        self.rollups = None
+        self.estado_salvo_em = time.monotonic()
+        if caminho_rollup:
+            self.rollups = Rollups(caminho_rollup)
+            self.caminho_estado_rollup = os.path.splitext(caminho_rollup)[0] + '_abertos.yaml'
+            try:
+                with open(self.caminho_estado_rollup, 'r', encoding='utf-8') as f:
+                    self.rollups.restaurar(yaml.safe_load(f) or {})
+            except FileNotFoundError:
+                pass
+            except (yaml.YAMLError, AttributeError, TypeError) as e:
+                print(f"  - Aviso: estado dos rollups '{self.caminho_estado_rollup}' inválido, recomeçando: {e}")
+
+    def _novas_amostras_csv(self):
+        """Amostras (timestamp, nó, valor) anexadas ao CSV bruto desde o ciclo anterior."""
+        linhas = self.leitor.novas()
+        cabecalho = next(csv.reader([self.leitor.cabecalho]), [])
+        if self.coluna not in cabecalho:
+            return []
+        indice = cabecalho.index(self.coluna)
+        indice_status = cabecalho.index('Status') if 'Status' in cabecalho else None
+        indice_no = cabecalho.index('No') if 'No' in cabecalho else None
+
+        amostras = []
+        for row in csv.reader(linhas):
+            if len(row) <= indice:
+                continue
+            if indice_status is not None and (len(row) <= indice_status or row[indice_status] != 'Sucesso'):
+                continue
+            try:
+                valor = self.conversor(row[indice])
+                no = int(row[indice_no]) if indice_no is not None and len(row) > indice_no else ID_NO_PADRAO
+            except ValueError:
+                continue
+            amostras.append((row[0], no, valor))
+        return amostras
+
+    def _novas_amostras_binarias(self):
+        if not os.path.exists(self.caminho_bruto):
+            raise FileNotFoundError(f"Arquivo não encontrado: {self.caminho_bruto}")
+        total = self.serie.contar()
+        if self.posicao is None or self.posicao > total:
+            self.posicao = max(total - self.carga_inicial, 0)
+        registros = self.serie.ler(self.posicao, total)
+        self.posicao = total
+        registros = registros[registros['status'] == STATUS_SUCESSO]
+        return [(formatar_timestamp(timestamp_ms), no, valor) for timestamp_ms, no, valor in
+                zip(registros['timestamp_ms'].tolist(), registros['no'].tolist(), registros[self.coluna].tolist())]
+
+    def _amostras_barramento(self, registros):
+        registros = registros[registros['status'] == STATUS_SUCESSO]
+        valores = registros[self.campo_barramento]
+        if valores.dtype.kind == 'f':
+            valores = np.round(valores.astype(np.float64), 2)  # Como no CSV ('%.2f')
+        return [(formatar_timestamp(timestamp_ms), no, valor) for timestamp_ms, no, valor in
+                zip(registros['timestamp_ms'].tolist(), registros['no'].tolist(), valores.tolist())]
+
+    def _pular_arquivo(self):
+        """O barramento já entregou tudo o que está no arquivo: só avança a posição de leitura."""
+        try:
+            if self.serie is not None:
+                self.posicao = self.serie.contar()
+            else:
+                self.leitor.avancar_para_fim()
+        except FileNotFoundError:
+            pass
+
+    def _novas_amostras(self, registros, continuo):
+        if registros is None:
+            self.sincronizado = False
+            return self._novas_amostras_binarias() if self.serie is not None else self._novas_amostras_csv()
+        if continuo and self.sincronizado:
+            amostras = self._amostras_barramento(registros)
+            self._pular_arquivo()
+            return amostras
+        # Primeira leitura ou lacuna: alcança o arquivo e completa com o que o anel ainda retém
+        self.sincronizado = False
+        amostras = self._novas_amostras_binarias() if self.serie is not None else self._novas_amostras_csv()
+        self.sincronizado = True
+        return amostras + self._amostras_barramento(registros)
+
+    def _descartar_repetidas(self, amostras):
+        novas = []
+        for amostra in amostras:
+            timestamp, no, _ = amostra
+            if timestamp > self.ultimo.get(no, ''):
+                self.ultimo[no] = timestamp
+                novas.append(amostra)
+        return novas
+
+    def atualizar_e_registrar(self, timestamp, registros=None, continuo=False):
+        """
+        Lê as amostras novas (do barramento, se 'registros' não for None, ou do
+        arquivo), atualiza as janelas e grava uma linha por janela. Retorna se gravou.
+        """
+        amostras = self._descartar_repetidas(self._novas_amostras(registros, continuo))
+        self.agregador.adicionar(valor for _, _, valor in amostras)
+        if self.rollups is not None:
+            self.atualizar_rollups(amostras)
+
+        estatisticas = self.agregador.estatisticas()
+        for tamanho, stats in estatisticas.items():
+            if tamanho in self.rotacionadores:
+                self.rotacionadores[tamanho].verificar()
+            registrar_estatisticas(self.caminhos_stats[tamanho], self.cabecalho_stats, timestamp, stats)
+        return self.janela in estatisticas
+
+    def atualizar_rollups(self, amostras):
+        """Agrega as amostras, fecha os intervalos vencidos e salva os intervalos abertos (ver salvar_estado_rollups)."""
+        self.rollups.adicionar(amostras)
+        self.rollups.fechar_vencidos(datetime.now().strftime('%Y-%m-%d %H:%M:%S.%f')[:-3])
+        self.salvar_estado_rollups()
+
+    def salvar_estado_rollups(self, forcar=False):
+        """
+        Salva os intervalos abertos logo que um intervalo fecha (senão ele seria
+        gravado de novo ao restaurar um estado antigo) e, fora isso, no máximo a
+        cada INTERVALO_ESTADO_ROLLUP_S. Após uma queda, as amostras desde o último
+        estado salvo que a carga inicial relê são agregadas de novo.
+        """
+        if self.rollups is None or not self.rollups.alterado:
+            return
+        if not (forcar or self.rollups.fechou or time.monotonic() - self.estado_salvo_em >= INTERVALO_ESTADO_ROLLUP_S):
+            return
+        salvar_yaml_seguro(self.caminho_estado_rollup, self.rollups.estado())
+        self.rollups.alterado = self.rollups.fechou = False
+        self.estado_salvo_em = time.monotonic()
+
+
+def valor_inteiro(texto):
+    """Luminosidade é inteira; aceita também '162.0'."""
+    valor = float(texto)
+    return int(valor) if valor.is_integer() else valor
+
+
+def caminhos_dados(nivel4_config, rollups=True):
+    """
+    Caminhos dos arquivos brutos, de estatísticas e de rollups definidos na seção
+    'nivel4' do YAML. No armazenamento binário, os dois fluxos leem o mesmo arquivo.
+    """
+    dir_dados = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', nivel4_config.get('diretorio_logs', 'nivel4')))
+    binario = nivel4_config.get('armazenamento', 'csv') == 'binario'
+    caminhos = {
+        'dir_dados': dir_dados,
+        'binario': binario,
+        'rede_bruto': os.path.join(dir_dados, nivel4_config.get('nome_arquivo_rede', 'dados_brutos_rede.csv')),
+        'app_bruto': os.path.join(dir_dados, nivel4_config.get('nome_arquivo_aplicacao', 'dados_brutos_aplicacao.csv')),
+        'rede_stats': os.path.join(dir_dados, nivel4_config.get('nome_arquivo_stats_rede', 'estatisticas_rede.csv')),
+        'app_stats': os.path.join(dir_dados, nivel4_config.get('nome_arquivo_stats_aplicacao', 'estatisticas_aplicacao.csv')),
+        'rede_rollup': None,
+        'app_rollup': None,
+    }
+    if rollups:
+        caminhos['rede_rollup'] = os.path.join(dir_dados, nivel4_config.get('nome_arquivo_rollup_rede', 'rollup_rede.csv'))
+        caminhos['app_rollup'] = os.path.join(dir_dados, nivel4_config.get('nome_arquivo_rollup_aplicacao', 'rollup_aplicacao.csv'))
+    if binario:
+        caminhos['rede_bruto'] = caminhos['app_bruto'] = os.path.join(
+            dir_dados, nome_arquivo_binario({'nivel4': nivel4_config}))
+    return caminhos
+
+
+fluxos = {'chave': None, 'rede': None, 'aplicacao': None}
+barramento = LeitorBarramento()
 
 
 def analisar_e_registrar(config):
     """
-    Função principal otimizada para ler apenas as caudas dos arquivos de dados brutos,
-    com acesso seguro às configurações e tratamento de casos extremos.
+    Atualiza as janelas deslizantes com as amostras novas dos arquivos brutos
+    e grava as estatísticas, com acesso seguro às configurações.
     """
     print(f"[{datetime.now().strftime('%H:%M:%S')}] Executando análise...")
 
@@ -74,49 +271,46 @@ def analisar_e_registrar(config):
     nivel5_config = config.get('nivel5', {})
 
     try:
-        dir_logs_name = nivel4_config.get('diretorio_logs', 'nivel4')
-        dir_dados = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', dir_logs_name))
-        
-        path_rede_bruto = os.path.join(dir_dados, nivel4_config.get('nome_arquivo_rede', 'dados_brutos_rede.csv'))
-        path_app_bruto = os.path.join(dir_dados, nivel4_config.get('nome_arquivo_aplicacao', 'dados_brutos_aplicacao.csv'))
-        path_rede_stats = os.path.join(dir_dados, nivel4_config.get('nome_arquivo_stats_rede', 'estatisticas_rede.csv'))
-        path_app_stats = os.path.join(dir_dados, nivel4_config.get('nome_arquivo_stats_aplicacao', 'estatisticas_aplicacao.csv'))
+        caminhos = caminhos_dados(nivel4_config, nivel5_config.get('rollups_ativados', True))
+        path_rede_bruto, path_app_bruto = caminhos['rede_bruto'], caminhos['app_bruto']
+        path_rede_stats, path_app_stats = caminhos['rede_stats'], caminhos['app_stats']
+        path_rede_rollup, path_app_rollup = caminhos['rede_rollup'], caminhos['app_rollup']
+        binario = caminhos['binario']
+        rotacao = politica_da_config(nivel4_config)
 
         janela_rede = int(nivel5_config.get('janela_rede', 10))
         janela_app = int(nivel5_config.get('janela_aplicacao', 10))
+        janelas_adicionais = tuple(int(tamanho) for tamanho in nivel5_config.get('janelas_adicionais') or [])
+        if min((janela_rede, janela_app) + janelas_adicionais) <= 0:
+            raise ValueError("as janelas devem ser positivas")
     
     except (ValueError, TypeError) as e:
         print(f"ERRO CRÍTICO: Configuração de janela ou caminho inválida no YAML. Erro: {e}")
         return
     # --- Fim Leitura Segura ---
 
+    # Recria o estado incremental apenas quando arquivos ou janelas mudam
+    chave = (path_rede_bruto, path_app_bruto, path_rede_stats, path_app_stats, path_rede_rollup, path_app_rollup,
+             binario, janela_rede, janela_app, janelas_adicionais, rotacao)
+    if fluxos['chave'] != chave:
+        salvar_estados_rollups()
+        fluxos['chave'] = chave
+        fluxos['rede'] = FluxoEstatisticas(path_rede_bruto, binario, 'rssi' if binario else 'RSSI_Downlink', float,
+                                           janela_rede, janelas_adicionais, path_rede_stats, CABECALHO_STATS_REDE,
+                                           path_rede_rollup, rotacao, 'rssi')
+        fluxos['aplicacao'] = FluxoEstatisticas(path_app_bruto, binario, 'luminosidade' if binario else 'Luminosidade', valor_inteiro,
+                                                janela_app, janelas_adicionais, path_app_stats, CABECALHO_STATS_APLICACAO,
+                                                path_app_rollup, rotacao, 'luminosidade')
+
+    timestamp = datetime.now().strftime('%d-%m-%Y %H:%M:%S')
+    registros, continuo = barramento.ler()
+
     # --- 1. Análise dos Dados de Rede ---
     try:
-        buffer_multiplier = 3 
-        linhas_a_ler_rede = janela_rede * buffer_multiplier
-        df_rede = read_last_lines_as_dataframe(path_rede_bruto, linhas_a_ler_rede)
-
-        if not df_rede.empty:
-            df_rede_ok = df_rede[df_rede['Status'] == 'Sucesso'].copy()
-            df_janela_rede = df_rede_ok.tail(janela_rede).copy()
-
-            if not df_janela_rede.empty:
-                df_janela_rede['RSSI_Downlink'] = pd.to_numeric(df_janela_rede['RSSI_Downlink'], errors='coerce')
-                df_janela_rede.dropna(subset=['RSSI_Downlink'], inplace=True) 
-
-                if not df_janela_rede.empty:
-                    stats_rede = {
-                        'Timestamp': datetime.now().strftime('%d-%m-%Y %H:%M:%S'),
-                        'RSSI_Downlink_Media': df_janela_rede['RSSI_Downlink'].mean(),
-                        'RSSI_Downlink_Min': df_janela_rede['RSSI_Downlink'].min(),
-                        'RSSI_Downlink_Max': df_janela_rede['RSSI_Downlink'].max(),
-                    }
-                    file_exists = os.path.exists(path_rede_stats)
-                    with open(path_rede_stats, 'a', newline='') as f:
-                        writer = pd.DataFrame([stats_rede])
-                        writer.to_csv(f, sep=',', header=not file_exists, index=False, float_format='%.2f')
-                    print("  - Estatísticas de rede salvas.")
-
+        with duracao_fluxo.cronometrar(fluxo='rede'):
+            gravou = fluxos['rede'].atualizar_e_registrar(timestamp, registros, continuo)
+        if gravou:
+            print("  - Estatísticas de rede salvas.")
     except FileNotFoundError:
         print(f"  - Aviso: Arquivo de dados brutos da rede '{path_rede_bruto}' ainda não existe.")
     except Exception as e:
@@ -124,71 +318,60 @@ def analisar_e_registrar(config):
 
     # --- 2. Análise dos Dados de Aplicação ---
     try:
-        buffer_multiplier_app = 3
-        linhas_a_ler_app = janela_app * buffer_multiplier_app
-        df_app = read_last_lines_as_dataframe(path_app_bruto, linhas_a_ler_app)
-        
-        if not df_app.empty:
-            df_janela_app = df_app.tail(janela_app).copy()
-
-            if not df_janela_app.empty:
-                df_janela_app['Luminosidade'] = pd.to_numeric(df_janela_app['Luminosidade'], errors='coerce')
-                df_janela_app.dropna(subset=['Luminosidade'], inplace=True)
-
-                if not df_janela_app.empty:
-                    if (df_janela_app['Luminosidade'] == 0).all():
-                        stats_app = {
-                            'Timestamp': datetime.now().strftime('%d-%m-%Y %H:%M:%S'),
-                            'Luminosidade_Media': 0.0,
-                            'Luminosidade_Min': 0.0,
-                            'Luminosidade_Max': 0.0,
-                        }
-                    else:
-                        stats_app = {
-                            'Timestamp': datetime.now().strftime('%d-%m-%Y %H:%M:%S'),
-                            'Luminosidade_Media': df_janela_app['Luminosidade'].mean(),
-                            'Luminosidade_Min': df_janela_app['Luminosidade'].min(),
-                            'Luminosidade_Max': df_janela_app['Luminosidade'].max(),
-                        }
-                    
-                    file_exists = os.path.exists(path_app_stats)
-                    with open(path_app_stats, 'a', newline='') as f:
-                        writer = pd.DataFrame([stats_app])
-                        writer.to_csv(f, sep=',', header=not file_exists, index=False, float_format='%.2f')
-                    print("  - Estatísticas de aplicação salvas.")
-
+        with duracao_fluxo.cronometrar(fluxo='aplicacao'):
+            gravou = fluxos['aplicacao'].atualizar_e_registrar(timestamp, registros, continuo)
+        if gravou:
+            print("  - Estatísticas de aplicação salvas.")
     except FileNotFoundError:
         print(f"  - Aviso: Arquivo de dados brutos da aplicação '{path_app_bruto}' ainda não existe.")
     except Exception as e:
         print(f"  - ERRO inesperado ao analisar dados da aplicação: {e}")
 
 
+def salvar_estados_rollups():
+    """Salva já os intervalos abertos pendentes (antes de recriar os fluxos ou de encerrar)."""
+    for nome in ('rede', 'aplicacao'):
+        if fluxos[nome] is not None:
+            fluxos[nome].salvar_estado_rollups(forcar=True)
+
+
+def encerrar_por_sinal(signum, frame):
+    """Converte o SIGTERM (enviado pelo init.py) em saída normal, para que os 'finally' rodem."""
+    sys.exit(0)
+
+
 def main():
     """Função principal que executa o loop de análise."""
-    while True:
-        config = carregar_configuracoes()
-        if config and config.get('nivel5', {}).get('ativado', False):
-            try:
-                analisar_e_registrar(config)
-                intervalo = config.get('nivel5', {}).get('intervalo_analise_s', 10)
-            except Exception as e:
-                print(f"ERRO fatal não esperado na função analisar_e_registrar: {e}")
-                intervalo = 10 
-        else:
-            if config is None:
-                print("Análise pausada: não foi possível carregar o arquivo de configuração.", end="\r")
+    signal.signal(signal.SIGTERM, encerrar_por_sinal)
+    registro.iniciar_publicacao('nivel5')
+    try:
+        while True:
+            config = cache_config.obter()
+            if config and config.get('nivel5', {}).get('ativado', False):
+                try:
+                    with duracao_ciclo.cronometrar():
+                        analisar_e_registrar(config)
+                    intervalo = config.get('nivel5', {}).get('intervalo_analise_s', 10)
+                except Exception as e:
+                    print(f"ERRO fatal não esperado na função analisar_e_registrar: {e}")
+                    intervalo = 10 
             else:
-                print("Análise pausada via arquivo de configuração (ativado: False).", end="\r")
-            intervalo = 5
-        
-        try:
-            time.sleep(float(intervalo))
-        except ValueError:
-            print(f"ERRO: Intervalo de análise '{intervalo}' não é um número válido. Usando padrão 10s.")
-            time.sleep(10)
-        except KeyboardInterrupt:
-            print("\nScript de análise encerrado pelo usuário.")
-            break
+                if config is None:
+                    print("Análise pausada: não foi possível carregar o arquivo de configuração.", end="\r")
+                else:
+                    print("Análise pausada via arquivo de configuração (ativado: False).", end="\r")
+                intervalo = 5
+            
+            try:
+                time.sleep(float(intervalo))
+            except ValueError:
+                print(f"ERRO: Intervalo de análise '{intervalo}' não é um número válido. Usando padrão 10s.")
+                time.sleep(10)
+    except KeyboardInterrupt:
+        print("\nScript de análise encerrado pelo usuário.")
+    finally:
+        # Ctrl+C, SIGTERM ou erro: os intervalos abertos dos rollups não se perdem
+        salvar_estados_rollups()
 
 if __name__ == "__main__":
     main()
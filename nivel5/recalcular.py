@@ -0,0 +1,485 @@
+# recalcular.py - Recalcula, em paralelo, as estatísticas e os rollups a partir dos dados brutos
+#
+# Uso: python recalcular.py [--processos N] [--bloco-mb 32] [--intervalo S] [--saida DIR | --substituir]
+#                           [--sem-rollups]
+#
+# Os CSVs brutos (segmentos do manifesto + arquivo ativo) são divididos em blocos
+# de bytes alinhados em quebras de linha; na série binária, em faixas de
+# registros. Cada bloco é lido com pandas por um processo do pool, que calcula
+# as janelas deslizantes com rolling() e agrega os rollups por nó. Só as linhas
+# que dependem das amostras do bloco anterior (início de cada janela) e os
+# intervalos de rollup nas bordas são completados aqui, em ordem.
+#
+# As estatísticas têm uma linha por 'intervalo' (nivel5.intervalo_analise_s) com
+# amostras, no fim do intervalo, como o analise.py gravaria se estivesse rodando.
+
+import argparse
+import csv
+import io
+import os
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+import yaml
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')))
+from analise import (CABECALHO_STATS_APLICACAO, CABECALHO_STATS_REDE, CONFIG_PATH, caminho_stats_janela,
+                     caminhos_dados, salvar_yaml_seguro)
+from comum.cauda import fim_linhas_completas
+from comum.configuracao import ID_NO_PADRAO
+from comum.esboco import DESLOCAMENTO, LOG_GAMA, MINIMO_INDEXAVEL, EsbocoQuantis
+from comum.rollup import CABECALHO_ROLLUP, RESOLUCOES, RESOLUCOES_ESBOCO, cabecalho_rollup, caminho_rollup
+from comum.rotacao import abrir_segmento, caminho_manifesto, segmentos_no_intervalo
+from comum.serie_temporal import FORMATO_TIMESTAMP, REGISTRO, STATUS_SUCESSO, SerieTemporal, hora_local
+
+BLOCO_MB_PADRAO = 32
+# Duração de cada resolução dos rollups, em ms (os timestamps locais são tratados como UTC)
+PASSOS_ROLLUP = {'1min': 60 * 1000, '1h': 3600 * 1000, '1d': 86400 * 1000}
+# Posições de 'AAAA-MM-DDTHH:MM:SS' que formam o timestamp das estatísticas, 'DD-MM-AAAA HH:MM:SS'
+ORDEM_STATS = [8, 9, 7, 5, 6, 4, 0, 1, 2, 3, 10, 11, 12, 13, 14, 15, 16, 17, 18]
+EPOCA = datetime(1970, 1, 1)
+
+
+# --- Divisão em blocos ---
+
+def blocos_csv(caminho, tamanho_bloco):
+    """Blocos de um CSV bruto: ('csv', caminho, início, fim) alinhados em linhas, ou o segmento comprimido inteiro."""
+    if caminho.endswith(('.gz', '.zst')):
+        return [('segmento', caminho, 0, 0)]
+    blocos = []
+    with open(caminho, 'rb') as f:
+        inicio = len(f.readline())
+        fim = fim_linhas_completas(f, inicio, f.seek(0, os.SEEK_END))
+        while inicio < fim:
+            f.seek(min(inicio + tamanho_bloco, fim))
+            if f.tell() < fim:
+                f.readline()
+            limite = min(f.tell(), fim)
+            blocos.append(('csv', caminho, inicio, limite))
+            inicio = limite
+    return blocos
+
+
+def blocos_fluxo(caminho_bruto, binario, tamanho_bloco):
+    """Blocos de um fluxo em ordem cronológica."""
+    if binario:
+        total = SerieTemporal(caminho_bruto).contar()
+        passo = max(tamanho_bloco // REGISTRO.size, 1)
+        return [('binario', caminho_bruto, inicio, min(inicio + passo, total)) for inicio in range(0, total, passo)]
+    blocos = []
+    for segmento in segmentos_no_intervalo(caminho_bruto):
+        if os.path.exists(segmento):
+            blocos.extend(blocos_csv(segmento, tamanho_bloco))
+        else:
+            print(f"[AVISO] Segmento '{segmento}' do manifesto não encontrado; ignorado.")
+    if os.path.exists(caminho_bruto):
+        blocos.extend(blocos_csv(caminho_bruto, tamanho_bloco))
+    return blocos
+
+
+# --- Leitura de um bloco ---
+
+def ler_bloco(bloco, coluna):
+    """Amostras de sucesso do bloco: (timestamps em ms, hora local tratada como UTC), nós e valores."""
+    tipo, caminho, inicio, fim = bloco
+    if tipo == 'binario':
+        registros = SerieTemporal(caminho).ler(inicio, fim)
+        registros = registros[registros['status'] == STATUS_SUCESSO]
+        return (hora_local(registros['timestamp_ms'].astype(np.int64)), registros['no'].astype(np.int64),
+                registros[coluna].astype(np.float64))
+
+    with abrir_segmento(caminho) as f:
+        cabecalho = next(csv.reader([f.readline().decode('utf-8').rstrip('\r\n')]), [])
+        if tipo == 'segmento':
+            dados = f.read()
+        else:
+            f.seek(inicio)
+            dados = f.read(fim - inicio)
+    if coluna not in cabecalho or not dados:
+        return np.empty(0, np.int64), np.empty(0, np.int64), np.empty(0)
+
+    usadas = [nome for nome in (cabecalho[0], coluna, 'Status', 'No') if nome in cabecalho]
+    tabela = pd.read_csv(io.BytesIO(dados), header=None, names=cabecalho, usecols=usadas, on_bad_lines='skip',
+                         dtype={cabecalho[0]: str, 'Status': str})
+    if 'Status' in tabela:
+        tabela = tabela[tabela['Status'] == 'Sucesso']
+    instantes = pd.to_datetime(tabela[cabecalho[0]], format=FORMATO_TIMESTAMP, errors='coerce')
+    valores = pd.to_numeric(tabela[coluna], errors='coerce')
+    nos = pd.to_numeric(tabela['No'], errors='coerce') if 'No' in tabela else pd.Series(ID_NO_PADRAO, index=tabela.index)
+    validos = (instantes.notna() & valores.notna() & nos.notna()).to_numpy()
+    return (instantes.to_numpy()[validos].astype('datetime64[ms]').astype(np.int64),
+            nos.to_numpy()[validos].astype(np.int64), valores.to_numpy()[validos].astype(np.float64))
+
+
+# --- Trabalho de cada processo ---
+
+def formatar_instantes_stats(instantes_ms):
+    """ms -> 'DD-MM-AAAA HH:MM:SS' sem strftime por linha: reordena os caracteres do formato ISO do NumPy."""
+    iso = np.asarray(instantes_ms, dtype='datetime64[ms]').astype('datetime64[s]').astype('S19')
+    caracteres = iso.view('S1').reshape(-1, 19)[:, ORDEM_STATS]
+    caracteres[:, 10] = b' '
+    return caracteres.copy().view('S19').ravel().astype(str)
+
+
+def linhas_stats(baldes, medias, minimos, maximos, intervalo_ms, inteiro):
+    """Linhas do CSV de estatísticas: fim do intervalo, média e extremos (inteiros na luminosidade)."""
+    instantes = (np.asarray(baldes, dtype=np.int64) + 1) * intervalo_ms
+    colunas = {'Timestamp': formatar_instantes_stats(instantes), 'Media': duas_casas(medias)}
+    for nome, valores in (('Min', minimos), ('Max', maximos)):
+        colunas[nome] = np.asarray(valores, dtype=np.int64) if inteiro else duas_casas(valores)
+    return pd.DataFrame(colunas)
+
+
+def duas_casas(valores):
+    """'%.2f' como no registrar_estatisticas; a formatação por elemento do to_csv é bem mais lenta."""
+    return [f"{valor:.2f}" for valor in np.asarray(valores, dtype=np.float64).tolist()]
+
+
+def gravar_csv(tabela, caminho):
+    """Linhas sem cabeçalho, com o mesmo fim de linha do csv.writer usado pelo analise.py."""
+    tabela.to_csv(caminho, header=False, index=False, lineterminator='\r\n')
+
+
+def processar_bloco(tarefa):
+    """
+    Estatísticas e rollups de um bloco. As linhas que só dependem do bloco vão
+    para arquivos parciais; o resto (início das janelas, último intervalo e
+    rollups das bordas) volta para o processo principal.
+    """
+    indice, bloco, coluna, inteiro, janelas, intervalo_ms, rollups, diretorio = tarefa
+    instantes, nos, valores = ler_bloco(bloco, coluna)
+    quantidade = len(valores)
+    resultado = {'quantidade': quantidade}
+    if not quantidade:
+        return resultado
+
+    anteriores = max(janelas) - 1  # Amostras de blocos anteriores que uma janela pode precisar
+    baldes = instantes // intervalo_ms
+    fins = np.flatnonzero(baldes[1:] != baldes[:-1])  # Última amostra de cada intervalo, exceto o último
+    serie = pd.Series(valores)
+    resultado.update({
+        'primeiro': int(baldes[0]), 'ultimo': int(baldes[-1]),
+        'inicio_valores': valores[:anteriores].copy(),
+        'fim_valores': valores[max(quantidade - anteriores, 0):].copy() if anteriores else valores[:0].copy(),
+        'pendentes': {}, 'final': {}, 'partes': {},
+    })
+    for tamanho in janelas:
+        pendentes = fins[fins < tamanho - 1]
+        exatos = fins[fins >= tamanho - 1]
+        resultado['pendentes'][tamanho] = list(zip(pendentes.tolist(), baldes[pendentes].tolist()))
+        janela = serie.rolling(tamanho, min_periods=1)
+        medias, minimos, maximos = janela.mean().to_numpy(), janela.min().to_numpy(), janela.max().to_numpy()
+        resultado['final'][tamanho] = (medias[-1], minimos[-1], maximos[-1]) if quantidade >= tamanho else None
+        if len(exatos):
+            parte = os.path.join(diretorio, f"stats_{coluna}_j{tamanho}_{indice:06d}.csv")
+            gravar_csv(linhas_stats(baldes[exatos], medias[exatos], minimos[exatos], maximos[exatos], intervalo_ms, inteiro), parte)
+            resultado['partes'][tamanho] = parte
+
+    if rollups:
+        resultado['rollups'] = agregar_rollups(indice, instantes, nos, valores, coluna, inteiro, diretorio)
+        tabela = pd.DataFrame({'No': nos, 'Instante': instantes}).groupby('No')['Instante'].max()
+        resultado['ultimo_por_no'] = dict(zip(tabela.index.tolist(), tabela.tolist()))
+    return resultado
+
+
+def chaves_esboco(valores):
+    """chave_esboco() de cada valor, vetorizada."""
+    modulos = np.abs(valores)
+    chaves = np.zeros(len(valores), dtype=np.int64)
+    indexaveis = modulos >= MINIMO_INDEXAVEL
+    chaves[indexaveis] = (np.ceil(np.log(modulos[indexaveis]) / LOG_GAMA).astype(np.int64) + DESLOCAMENTO) * \
+        np.where(valores[indexaveis] > 0, 1, -1)
+    return chaves
+
+
+def esbocos_por_intervalo(tabela):
+    """Esboço codificado (EsbocoQuantis.codificar) de cada (início, nó), na ordem do groupby."""
+    contagens = tabela.groupby(['Inicio', 'No', 'Chave'], sort=True).size().reset_index(name='Contagem')
+    contagens['Item'] = contagens['Chave'].astype(str) + ':' + contagens['Contagem'].astype(str)
+    return contagens.groupby(['Inicio', 'No'], sort=True)['Item'].agg(' '.join).to_numpy()
+
+
+def agregar_rollups(indice, instantes, nos, valores, coluna, inteiro, diretorio):
+    """Agrega o bloco por (início do intervalo, nó); os intervalos internos vão direto para arquivos parciais."""
+    tabela = pd.DataFrame({'No': nos, 'Valor': valores, 'Quadrado': valores * valores, 'Chave': chaves_esboco(valores)})
+    rollups = {}
+    for resolucao, passo in PASSOS_ROLLUP.items():
+        tabela['Inicio'] = instantes - instantes % passo
+        agregados = tabela.groupby(['Inicio', 'No'], sort=True).agg(
+            Contagem=('Valor', 'size'), Soma=('Valor', 'sum'), Minimo=('Valor', 'min'), Maximo=('Valor', 'max'),
+            SomaQuadrados=('Quadrado', 'sum')).reset_index()
+        if inteiro:
+            agregados[['Soma', 'Minimo', 'Maximo', 'SomaQuadrados']] = \
+                agregados[['Soma', 'Minimo', 'Maximo', 'SomaQuadrados']].astype(np.int64)
+        if resolucao in RESOLUCOES_ESBOCO:
+            agregados['Esboco'] = esbocos_por_intervalo(tabela)
+        primeiro, ultimo = int(agregados['Inicio'].iloc[0]), int(agregados['Inicio'].iloc[-1])
+        borda = agregados['Inicio'].isin((primeiro, ultimo))
+        internos = agregados[~borda]
+        parte = None
+        if len(internos):
+            parte = os.path.join(diretorio, f"rollup_{coluna}_{resolucao}_{indice:06d}.csv")
+            # astype(str) do NumPy dá o repr mais curto de cada float, como o csv.writer, bem mais rápido que o to_csv
+            internos = internos.assign(Inicio=pd.to_datetime(internos['Inicio'], unit='ms').astype(str),
+                                       **{nome: internos[nome].to_numpy().astype(str) for nome in CABECALHO_ROLLUP[3:]
+                                          if not inteiro})
+            gravar_csv(internos[cabecalho_rollup(resolucao)], parte)
+        rollups[resolucao] = {'primeiro': primeiro, 'ultimo': ultimo, 'parte': parte,
+                              'borda': list(agregados[borda].itertuples(index=False, name=None))}
+    return rollups
+
+
+# --- Montagem dos arquivos finais ---
+
+def estatisticas_com_anteriores(anteriores, valores, tamanho):
+    janela = np.concatenate([anteriores, valores])[-tamanho:]
+    return janela.mean(), janela.min(), janela.max()
+
+
+def copiar_parte(parte, destino):
+    with open(parte, 'rb') as origem:
+        shutil.copyfileobj(origem, destino)
+    os.remove(parte)
+
+
+def montar_estatisticas(resultados, janelas, caminhos, cabecalho, intervalo_ms, inteiro):
+    """Junta, em ordem, as linhas completadas com as amostras dos blocos anteriores e os arquivos parciais."""
+    anteriores_max = max(janelas) - 1
+    arquivos = {tamanho: open(caminhos[tamanho], 'w', newline='', encoding='utf-8') for tamanho in janelas}
+    try:
+        for arquivo in arquivos.values():
+            csv.writer(arquivo).writerow(cabecalho)
+        anteriores = np.empty(0)
+        for posicao, resultado in enumerate(resultados):
+            # O último intervalo do bloco continua no próximo: a linha sai de lá
+            continua = posicao + 1 < len(resultados) and resultados[posicao + 1]['primeiro'] == resultado['ultimo']
+            for tamanho, arquivo in arquivos.items():
+                linhas = [(balde, estatisticas_com_anteriores(anteriores, resultado['inicio_valores'][:fim + 1], tamanho))
+                          for fim, balde in resultado['pendentes'][tamanho]]
+                if linhas:
+                    gravar_linhas(arquivo, linhas, intervalo_ms, inteiro)
+                if tamanho in resultado['partes']:
+                    arquivo.flush()
+                    copiar_parte(resultado['partes'][tamanho], arquivo.buffer)
+                if not continua:
+                    stats = resultado['final'][tamanho] or \
+                        estatisticas_com_anteriores(anteriores, resultado['inicio_valores'], tamanho)
+                    gravar_linhas(arquivo, [(resultado['ultimo'], stats)], intervalo_ms, inteiro)
+            if not anteriores_max:
+                continue
+            if resultado['quantidade'] > anteriores_max:
+                anteriores = resultado['fim_valores']
+            else:
+                anteriores = np.concatenate([anteriores, resultado['inicio_valores']])[-anteriores_max:]
+    finally:
+        for arquivo in arquivos.values():
+            arquivo.close()
+
+
+def gravar_linhas(arquivo, linhas, intervalo_ms, inteiro):
+    baldes = [balde for balde, _ in linhas]
+    medias, minimos, maximos = zip(*(stats for _, stats in linhas))
+    arquivo.write(linhas_stats(baldes, medias, minimos, maximos, intervalo_ms, inteiro)
+                  .to_csv(header=False, index=False, lineterminator='\r\n'))
+
+
+def texto_instante(instante_ms, formato=FORMATO_TIMESTAMP):
+    texto = (EPOCA + timedelta(milliseconds=int(instante_ms))).strftime(formato)
+    return texto[:-3] if formato == FORMATO_TIMESTAMP else texto
+
+
+def montar_rollups(resultados, caminho_base, caminho_estado, agora_ms):
+    """
+    Junta as bordas de blocos vizinhos e grava cada resolução em ordem de início.
+    Os intervalos ainda em curso ficam no estado de abertos, como o analise.py os deixaria.
+    """
+    bordas = {}
+    for resultado in resultados:
+        for resolucao, rollup in resultado['rollups'].items():
+            for inicio, no, contagem, soma, minimo, maximo, soma_quadrados, *esboco in rollup['borda']:
+                esboco = [EsbocoQuantis.decodificar(texto) for texto in esboco]
+                atual = bordas.setdefault((resolucao, inicio), {}).get(no)
+                if atual is None:
+                    bordas[(resolucao, inicio)][no] = [contagem, soma, minimo, maximo, soma_quadrados] + esboco
+                    continue
+                atual[0] += contagem
+                atual[1] += soma
+                atual[2] = min(atual[2], minimo)
+                atual[3] = max(atual[3], maximo)
+                atual[4] += soma_quadrados
+                for parcial, novo in zip(atual[5:], esboco):
+                    parcial.juntar(novo)
+
+    abertos = {resolucao: {} for resolucao in RESOLUCOES}
+    for resolucao, passo in PASSOS_ROLLUP.items():
+        inicio_atual = agora_ms - agora_ms % passo
+        gravados = set()
+
+        def gravar_borda(escritor, inicio):
+            if inicio in gravados:
+                return
+            gravados.add(inicio)
+            texto = texto_instante(inicio, '%Y-%m-%d %H:%M:%S')
+            for no, bucket in sorted(bordas[(resolucao, inicio)].items()):
+                bucket = bucket[:5] + [esboco.codificar() for esboco in bucket[5:]]
+                if inicio >= inicio_atual:
+                    abertos[resolucao][no] = [texto] + bucket
+                else:
+                    escritor.writerow([texto, no] + bucket)
+
+        with open(caminho_rollup(caminho_base, resolucao), 'w', newline='', encoding='utf-8') as f:
+            escritor = csv.writer(f)
+            escritor.writerow(cabecalho_rollup(resolucao))
+            for resultado in resultados:
+                rollup = resultado['rollups'][resolucao]
+                gravar_borda(escritor, rollup['primeiro'])
+                if rollup['parte']:
+                    f.flush()
+                    copiar_parte(rollup['parte'], f.buffer)
+                gravar_borda(escritor, rollup['ultimo'])
+
+    ultimo = {}
+    for resultado in resultados:
+        for no, instante in resultado['ultimo_por_no'].items():
+            ultimo[no] = max(ultimo.get(no, instante), instante)
+    salvar_yaml_seguro(caminho_estado, {
+        'ultimo': {no: texto_instante(instante) for no, instante in sorted(ultimo.items())},
+        'abertos': abertos,
+    })
+
+
+# --- Execução ---
+
+def recalcular_fluxo(executor, nome, caminho_bruto, binario, coluna, inteiro, janelas, caminhos_stats, cabecalho,
+                     caminho_rollup_base, args, diretorio, agora_ms):
+    inicio = time.perf_counter()
+    blocos = blocos_fluxo(caminho_bruto, binario, int(args.bloco_mb * 1024 * 1024))
+    if not blocos:
+        print(f"[AVISO] Sem dados brutos de {nome} em '{caminho_bruto}'.")
+        return 0
+    print(f"[INFO] {nome}: {len(blocos)} bloco(s) em {args.processos} processo(s)...")
+    intervalo_ms = int(round(args.intervalo * 1000))
+    tarefas = [(indice, bloco, coluna, inteiro, janelas, intervalo_ms, caminho_rollup_base is not None, diretorio)
+               for indice, bloco in enumerate(blocos)]
+    resultados = [resultado for resultado in executor.map(processar_bloco, tarefas) if resultado['quantidade']]
+    if not resultados:
+        print(f"[AVISO] Nenhuma amostra válida de {nome}.")
+        return 0
+
+    montar_estatisticas(resultados, janelas, caminhos_stats, cabecalho, intervalo_ms, inteiro)
+    if caminho_rollup_base is not None:
+        montar_rollups(resultados, caminho_rollup_base, os.path.splitext(caminho_rollup_base)[0] + '_abertos.yaml',
+                       agora_ms)
+    amostras = sum(resultado['quantidade'] for resultado in resultados)
+    duracao = time.perf_counter() - inicio
+    print(f"[INFO] {nome}: {amostras} amostras em {duracao:.1f} s ({amostras / max(duracao, 1e-9):.0f} amostras/s).")
+    return amostras
+
+
+def arquivos_de_saida(caminhos, janelas_fluxo, rollups):
+    """Arquivos gerados, por nome no diretório de dados: {chave: [nomes]}."""
+    saida = {}
+    for chave, janelas in janelas_fluxo.items():
+        principal, adicionais = janelas
+        nomes = [os.path.basename(caminhos[f'{chave}_stats'])]
+        nomes += [os.path.basename(caminho_stats_janela(caminhos[f'{chave}_stats'], tamanho))
+                  for tamanho in adicionais if tamanho != principal]
+        if rollups:
+            base = caminhos[f'{chave}_rollup']
+            nomes += [os.path.basename(caminho_rollup(base, resolucao)) for resolucao in RESOLUCOES]
+            nomes.append(os.path.basename(os.path.splitext(base)[0] + '_abertos.yaml'))
+        saida[chave] = nomes
+    return saida
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recalcula as estatísticas e os rollups do nivel5 a partir dos dados brutos.")
+    parser.add_argument('--config', default=CONFIG_PATH, help="Arquivo de configuração (padrão: nivel4/configuracoes.yaml)")
+    parser.add_argument('--processos', type=int, default=os.cpu_count() or 1, help="Processos em paralelo (padrão: núcleos)")
+    parser.add_argument('--bloco-mb', type=float, default=BLOCO_MB_PADRAO, help="Tamanho de cada bloco dos dados brutos")
+    parser.add_argument('--intervalo', type=float, help="Segundos entre linhas de estatísticas (padrão: nivel5.intervalo_analise_s)")
+    destino = parser.add_mutually_exclusive_group()
+    destino.add_argument('--saida', help="Diretório dos arquivos recalculados (padrão: <dados>/recalculo)")
+    destino.add_argument('--substituir', action='store_true',
+                         help="Substitui os arquivos do nivel4, guardando os anteriores (pause o nivel5 e reinicie-o depois)")
+    parser.add_argument('--sem-rollups', action='store_true', help="Não recalcula os rollups")
+    args = parser.parse_args()
+
+    try:
+        with open(args.config, 'r', encoding='utf-8') as f:
+            config = yaml.safe_load(f) or {}
+    except (OSError, yaml.YAMLError) as e:
+        print(f"[ERRO] Não foi possível ler a configuração '{args.config}': {e}")
+        sys.exit(1)
+    nivel4_config = config.get('nivel4', {})
+    nivel5_config = config.get('nivel5', {})
+    if args.substituir and nivel5_config.get('ativado', False):
+        print("[ERRO] Pause a análise (nivel5.ativado: false) antes de substituir os arquivos.")
+        sys.exit(1)
+
+    rollups = nivel5_config.get('rollups_ativados', True) and not args.sem_rollups
+    caminhos = caminhos_dados(nivel4_config, rollups)
+    janela_rede = int(nivel5_config.get('janela_rede', 10))
+    janela_app = int(nivel5_config.get('janela_aplicacao', 10))
+    janelas_adicionais = [int(tamanho) for tamanho in nivel5_config.get('janelas_adicionais') or []]
+    if args.intervalo is None:
+        args.intervalo = float(nivel5_config.get('intervalo_analise_s', 10))
+    if min([janela_rede, janela_app, args.processos, args.bloco_mb, args.intervalo] + janelas_adicionais) <= 0:
+        print("[ERRO] Janelas, processos, tamanho do bloco e intervalo devem ser positivos.")
+        sys.exit(1)
+
+    dir_dados = caminhos['dir_dados']
+    saida = dir_dados if args.substituir else os.path.abspath(args.saida or os.path.join(dir_dados, 'recalculo'))
+    os.makedirs(saida, exist_ok=True)
+    temporario = tempfile.mkdtemp(prefix='.recalculo-', dir=saida)
+    janelas_fluxo = {'rede': (janela_rede, janelas_adicionais), 'app': (janela_app, janelas_adicionais)}
+    nomes = arquivos_de_saida(caminhos, janelas_fluxo, rollups)
+
+    def em_temporario(caminho):
+        return os.path.join(temporario, os.path.basename(caminho))
+
+    fluxos = [
+        ('rede', 'rede', 'rssi' if caminhos['binario'] else 'RSSI_Downlink', False, CABECALHO_STATS_REDE),
+        ('aplicação', 'app', 'luminosidade' if caminhos['binario'] else 'Luminosidade', True, CABECALHO_STATS_APLICACAO),
+    ]
+    agora_ms = (datetime.now() - EPOCA) // timedelta(milliseconds=1)
+    inicio = time.perf_counter()
+    try:
+        with ProcessPoolExecutor(max_workers=args.processos) as executor:
+            for nome, chave, coluna, inteiro, cabecalho in fluxos:
+                principal, adicionais = janelas_fluxo[chave]
+                janelas = sorted(set([principal] + adicionais))
+                caminhos_stats = {tamanho: em_temporario(caminho_stats_janela(caminhos[f'{chave}_stats'], tamanho))
+                                  for tamanho in janelas}
+                caminhos_stats[principal] = em_temporario(caminhos[f'{chave}_stats'])
+                base_rollup = em_temporario(caminhos[f'{chave}_rollup']) if rollups else None
+                if not recalcular_fluxo(executor, nome, caminhos[f'{chave}_bruto'], caminhos['binario'], coluna, inteiro,
+                                        janelas, caminhos_stats, cabecalho, base_rollup, args, temporario, agora_ms):
+                    nomes[chave] = []
+
+        # Só agora os arquivos recalculados tomam o lugar dos anteriores
+        anteriores = os.path.join(dir_dados, datetime.now().strftime('recalculo_anterior_%Y%m%d-%H%M%S'))
+        for nome in (nome for lista in nomes.values() for nome in lista):
+            destino_final = os.path.join(saida, nome)
+            if args.substituir:
+                for existente in (destino_final, caminho_manifesto(destino_final)):
+                    if os.path.exists(existente):
+                        os.makedirs(anteriores, exist_ok=True)
+                        os.replace(existente, os.path.join(anteriores, os.path.basename(existente)))
+            os.replace(os.path.join(temporario, nome), destino_final)
+    finally:
+        shutil.rmtree(temporario, ignore_errors=True)
+
+    print(f"[INFO] Recálculo concluído em {time.perf_counter() - inicio:.1f} s. Arquivos em '{saida}'.")
+    if args.substituir and os.path.isdir(anteriores):
+        print(f"[INFO] Arquivos anteriores (e manifestos de segmentos já rotacionados) guardados em '{anteriores}'.")
+
+
+if __name__ == '__main__':
+    main()
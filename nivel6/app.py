@@ -1,15 +1,35 @@
-# nivel6/app.py - Versão com Escrita Segura no YAML
+# nivel6/app.py - Versão com Estado ao Vivo Lido do Registro mmap
 
 import os
+import sys
 import yaml
 import csv
 import io
 import tempfile
-from flask import Flask, render_template, request, jsonify
+import threading
+import time
+from flask import Flask, Response, g, make_response, render_template, request, jsonify
 from markupsafe import Markup
-from collections import deque
 from datetime import datetime
 
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')))
+from comum.barramento import LeitorBarramento
+from comum.cauda import LeitorCauda
+from comum.comandos import enviar_comando, porta_comandos
+from comum.configuracao import ID_NO_PADRAO, CacheConfiguracao, listar_nos
+from comum.estado import ATUADORES, EstadoNos
+from comum.indice import IndiceEsparso
+from comum.metricas import formatar_prometheus, ler_publicados, registro
+from comum.pacote import LIMIAR_MAXIMO, validar_limiar
+from comum.esboco import PERCENTIS_PADRAO
+from comum.serie_temporal import STATUS_SUCESSO, SerieTemporal, formatar_timestamp, nome_arquivo_binario
+import historico
+import exportacao
+from transmissao import Transmissor, formatar_evento
+from cache_respostas import CacheRespostas
+from buffer_amostras import BuffersPorNo
+from lttb import lttb
+
 app = Flask(__name__)
 
 # --- CONFIGURAÇÃO DE CAMINHOS ---
@@ -18,7 +38,24 @@ NIVEL4_PATH = os.path.join(BASE_DIR, '..', 'nivel4')
 
 YAML_PATH = os.path.join(NIVEL4_PATH, 'configuracoes.yaml')
 CSV_RAW_PATH = os.path.join(NIVEL4_PATH, 'dados_brutos_aplicacao.csv')
+CSV_REDE_PATH = os.path.join(NIVEL4_PATH, 'dados_brutos_rede.csv')
 CSV_STATS_PATH = os.path.join(NIVEL4_PATH, 'estatisticas_aplicacao.csv')
+ESTADO_PATH = os.path.join(NIVEL4_PATH, 'estado_nos.bin')
+CAPACIDADE_BUFFER = 3000  # Maior janela do gráfico servida da memória
+JANELA_PADRAO = 30
+DURACAO_DISTRIBUICAO_S = 24 * 3600  # Período padrão dos percentis em /api/estatisticas
+ROLLUP_PATHS = {'luminosidade': os.path.join(NIVEL4_PATH, 'rollup_aplicacao.csv'),
+                'rssi': os.path.join(NIVEL4_PATH, 'rollup_rede.csv')}
+
+cache_config = CacheConfiguracao(YAML_PATH)
+estado_nos = EstadoNos(ESTADO_PATH)
+cauda_estatisticas = LeitorCauda(CSV_STATS_PATH, 1)
+indices_brutos = {'luminosidade': IndiceEsparso(CSV_RAW_PATH), 'rssi': IndiceEsparso(CSV_REDE_PATH)}
+yaml_lock = threading.Lock()  # Serializa o read-modify-write do YAML entre requisições
+cache_respostas = CacheRespostas()
+registro.processo = 'nivel6'
+duracao_requisicao = registro.histograma('twinsen_http_requisicao_segundos', "Duração das requisições por rota e status",
+                                         ('rota', 'status'))
 
 
 def salvar_yaml_seguro(caminho, dados):
@@ -33,15 +70,58 @@ def salvar_yaml_seguro(caminho, dados):
         print(f"Erro ao salvar o YAML de forma segura: {e}")
 
 
+def nos_configurados():
+    """Nós definidos no YAML (lista vazia se a configuração está ausente ou incompleta)."""
+    try:
+        return listar_nos(cache_config.obter() or {})
+    except (KeyError, TypeError, ValueError):
+        return []
+
+
+def no_selecionado(config):
+    """Id do nó pedido em '?no=' ou, na falta dele, o do primeiro nó configurado."""
+    try:
+        return int(request.args['no'])
+    except (KeyError, ValueError):
+        pass
+    try:
+        return listar_nos(config)[0]['id']
+    except (KeyError, TypeError, ValueError, IndexError):
+        return ID_NO_PADRAO
+
+
+def resposta_em_cache(nome, caminhos, extras, construir):
+    """
+    Responde com ETag/Last-Modified derivados dos arquivos de dados: 304 se o
+    navegador já tem a versão atual; senão o corpo do cache compartilhado ou,
+    se os arquivos mudaram, o gerado por 'construir()' (que é então salvo).
+    """
+    etag, modificado = cache_respostas.versao(caminhos, extras)
+    if request.if_none_match.contains(etag):
+        resposta = Response(status=304)
+    else:
+        corpo = cache_respostas.obter(nome, etag)
+        if corpo is not None:
+            resposta = Response(corpo, mimetype='application/json')
+        else:
+            resposta = make_response(construir())
+            if resposta.status_code == 200:
+                cache_respostas.salvar(nome, etag, resposta.get_data())
+    resposta.set_etag(etag)
+    if modificado is not None:
+        resposta.last_modified = modificado
+    resposta.headers['Cache-Control'] = 'no-cache'  # Sempre revalida (barato: 304)
+    return resposta
+
+
 # --- ROTA PRINCIPAL ---
 @app.route('/')
 def home():
-    try:
-        with open(YAML_PATH, 'r') as f:
-            config_data = yaml.safe_load(f) or {}
-        initial_data = config_data.get('nivel6', {})
-    except FileNotFoundError:
+    config_data = cache_config.obter()
+    if config_data is None:
         return "Erro: O arquivo 'configuracoes.yaml' não foi encontrado!", 404
+    initial_data = dict(config_data.get('nivel6', {}))
+    initial_data.update(estado_nos.ler(no_selecionado(config_data)) or {})
         
     try:
         svg_path = os.path.join(BASE_DIR, 'static', 'pk2.svg')
@@ -56,30 +136,218 @@ def home():
 
 
 # --- API PARA DADOS DE LUMINOSIDADE (GRÁFICO) ---
+def armazenamento_binario():
+    """Indica se o nivel3 grava as amostras na série temporal binária em vez dos CSVs."""
+    config = cache_config.obter() or {}
+    return config.get('nivel4', {}).get('armazenamento', 'csv') == 'binario'
+
+
+def serie_binaria():
+    """Série binária bruta, no arquivo 'nivel4.nome_arquivo_binario' do YAML (o mesmo que o nivel3 grava)."""
+    return SerieTemporal(os.path.join(NIVEL4_PATH, nome_arquivo_binario(cache_config.obter())))
+
+
+def leituras_csv(linhas):
+    """
+    Converte linhas do CSV bruto de aplicação em (nós, timestamps em ms, labels,
+    values) para o gráfico. Linhas sem a coluna No são do nó padrão.
+    """
+    nos = []
+    timestamps = []
+    labels = []
+    values = []
+    for row in csv.reader(linhas):
+        if len(row) >= 2 and "Timestamp" not in row[0]:
+            try:
+                dt_object = datetime.strptime(row[0], '%Y-%m-%d %H:%M:%S.%f')
+                value = float(row[1])
+                no = int(row[2]) if len(row) > 2 else ID_NO_PADRAO
+            except (ValueError, IndexError):
+                continue
+            nos.append(no)
+            values.append(value)
+            timestamps.append(int(dt_object.timestamp() * 1000))
+            labels.append(dt_object.strftime('%H:%M:%S'))
+    return nos, timestamps, labels, values
+
+
+def leituras_binarias(registros):
+    """
+    Converte registros da série binária ou do barramento em (nós, timestamps em
+    ms, labels, values), descartando as falhas.
+    """
+    registros = registros[registros['status'] == STATUS_SUCESSO]
+    timestamps = registros['timestamp_ms'].tolist()
+    labels = [datetime.fromtimestamp(ms / 1000).strftime('%H:%M:%S') for ms in timestamps]
+    values = [float(valor) for valor in registros['luminosidade'].tolist()]
+    return registros['no'].tolist(), timestamps, labels, values
+
+
+class AlimentadorBuffer:
+    """
+    Mantém os buffers de amostras recentes (um por nó) em dia. Com o barramento do nivel3
+    publicado, as amostras vêm dele assim que são decodificadas (a thread dorme
+    até o aviso de cada publicação); sem ele, do arquivo bruto (CSV ou binário),
+    lendo só o que foi anexado a cada 'intervalo'. Roda numa thread de fundo e
+    também pode ser chamado diretamente para alcançar os dados antes de
+    responder. 'ao_adicionar' é chamado quando chegam amostras.
+    """
+
+    def __init__(self, buffers, intervalo=0.25):
+        self.buffers = buffers
+        self.intervalo = intervalo
+        self.arquivo_existe = False
+        self.ao_adicionar = None
+        self._barramento = LeitorBarramento()
+        self._usando_barramento = False
+        self._arquivo = None
+        self._cauda = None
+        self._posicao_binaria = None
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def iniciar(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._executar, name="AlimentadorBuffer", daemon=True)
+                self._thread.start()
+
+    def atualizar(self):
+        with self._lock:
+            registros, _ = self._barramento.ler()
+            self._usando_barramento = registros is not None
+            if registros is not None:
+                # Lacunas (app lento) só abrem um buraco no gráfico; ao trocar do arquivo
+                # para o barramento, o anel ainda retém amostras já lidas do arquivo
+                ultimo = self.buffers.ultimo_timestamp()
+                if ultimo is not None:
+                    registros = registros[registros['timestamp_ms'] > ultimo]
+                self.arquivo_existe = True
+                self._adicionar(*leituras_binarias(registros))
+                self._arquivo = None  # Se o barramento sumir, recomeça do fim do arquivo
+                return
+
+            serie = serie_binaria() if armazenamento_binario() else None
+            arquivo = serie.caminho if serie is not None else CSV_RAW_PATH
+            # As amostras dos nós se intercalam no arquivo: a cauda inicial cobre o buffer de todos
+            amostras_iniciais = self.buffers.capacidade * max(len(nos_configurados()), 1)
+            if arquivo != self._arquivo:
+                # Troca de armazenamento (ou de arquivo): recomeça do fim do novo arquivo
+                self._arquivo = arquivo
+                self._cauda = LeitorCauda(CSV_RAW_PATH, amostras_iniciais, reter=False)
+                self._posicao_binaria = None
+                self.buffers.limpar()
+            try:
+                if serie is not None:
+                    if not os.path.exists(serie.caminho):
+                        raise FileNotFoundError(serie.caminho)
+                    total = serie.contar()
+                    if self._posicao_binaria is None or self._posicao_binaria > total:
+                        # Os registros de falha não têm luminosidade: lê uma margem a mais
+                        self._posicao_binaria = max(total - amostras_iniciais * 3, 0)
+                    leituras = leituras_binarias(serie.ler(self._posicao_binaria, total))
+                    self._posicao_binaria = total
+                else:
+                    leituras = leituras_csv(self._cauda.novas())
+            except FileNotFoundError:
+                self.arquivo_existe = False
+                return
+            self.arquivo_existe = True
+            self._adicionar(*leituras)
+
+    def _adicionar(self, nos, timestamps, labels, values):
+        if values:
+            self.buffers.adicionar(nos, timestamps, values, labels)
+            if self.ao_adicionar is not None:
+                self.ao_adicionar()
+
+    def _executar(self):
+        while True:
+            try:
+                self.atualizar()
+            except Exception as e:
+                print(f"[ERRO] Falha ao atualizar o buffer de amostras: {e}")
+            if self._usando_barramento:
+                # Acorda a cada publicação do nivel3; o intervalo só limita a espera se um aviso se perder
+                self._barramento.aguardar(self.intervalo)
+            else:
+                time.sleep(self.intervalo)
+
+
+buffers_luminosidade = BuffersPorNo(CAPACIDADE_BUFFER)
+alimentador = AlimentadorBuffer(buffers_luminosidade)
+
+
+def dados_luminosidade(no, quantidade=JANELA_PADRAO, max_pontos=None):
+    """
+    Últimas 'quantidade' leituras de luminosidade do nó 'no', do buffer em
+    memória, reduzidas por LTTB a 'max_pontos' se necessário. Levanta FileNotFoundError.
+    """
+    alimentador.iniciar()
+    alimentador.atualizar()  # Alcança o que foi anexado desde a última passada da thread
+    if not alimentador.arquivo_existe and not len(buffers_luminosidade):
+        raise FileNotFoundError(CSV_RAW_PATH)
+    timestamps, values, labels = buffers_luminosidade.ultimos(no, quantidade)
+    latest_value = float(values[-1]) if len(values) else "N/A"
+    if max_pontos is not None and len(values) > max_pontos:
+        indices = lttb(timestamps, values, max_pontos)
+        values = values[indices]
+        labels = [labels[i] for i in indices.tolist()]
+    return {'labels': labels, 'values': values.tolist(), 'latest_value': latest_value}
+
+
+def max_pontos_pedido():
+    """Limite de pontos pedido em '?max_points=' (None = sem redução). Levanta ValueError."""
+    if not request.args.get('max_points'):
+        return None
+    max_pontos = int(request.args['max_points'])
+    if max_pontos < 3:
+        raise ValueError("max_points deve ser pelo menos 3")
+    return max_pontos
+
+
+def janela_pedida():
+    """Quantidade de pontos pedida em '?janela=' (padrão 30, limitada à capacidade do buffer)."""
+    try:
+        return min(max(int(request.args.get('janela', JANELA_PADRAO)), 1), CAPACIDADE_BUFFER)
+    except ValueError:
+        return JANELA_PADRAO
+
+
 @app.route('/api/luminosidade')
 def get_luminosidade_data():
+    """
+    Últimas leituras do nó em '?no=' para o gráfico; '?janela=' escolhe quantas
+    (ex.: 30, 300 ou 3000) e '?max_points=' limita os pontos enviados (redução LTTB).
+    """
+    no = no_selecionado(cache_config.obter() or {})
+    janela = janela_pedida()
     try:
-        with open(CSV_RAW_PATH, 'r', encoding='utf-8') as f:
-            last_lines = deque(f, 30) 
-        
-        labels = []
-        values = []
-        latest_value = "N/A"
-
-        for row in csv.reader(last_lines):
-            if len(row) >= 2 and "Timestamp" not in row[0]:
-                try:
-                    dt_object = datetime.strptime(row[0], '%Y-%m-%d %H:%M:%S.%f')
-                    labels.append(dt_object.strftime('%H:%M:%S'))
-                    values.append(float(row[1]))
-                except (ValueError, IndexError):
-                    continue
+        max_pontos = max_pontos_pedido()
+    except ValueError as e:
+        return jsonify(labels=[], values=[], latest_value="N/A", error=f"Parâmetros inválidos: {e}"), 400
+    # A versão sai do conteúdo do buffer do nó (que pode estar à frente do arquivo: lotes do escritor,
+    # barramento): última amostra e quantas entram na janela. Todos os workers, em dia com a mesma
+    # fonte, chegam à mesma versão, então o cache em disco e os 304 valem entre eles.
+    alimentador.iniciar()
+    alimentador.atualizar()
+    return resposta_em_cache(f'luminosidade-{no}-{janela}-{max_pontos}', [YAML_PATH],
+                             (no, janela, max_pontos) + versao_luminosidade(no, janela),
+                             lambda: montar_luminosidade(no, janela, max_pontos))
 
-        if values:
-            latest_value = values[-1]
-        
-        return jsonify({'labels': labels, 'values': values, 'latest_value': latest_value})
 
+def versao_luminosidade(no, janela):
+    """(timestamp da última amostra do nó, amostras na janela, arquivo existe): muda só com o gráfico."""
+    buffer = buffers_luminosidade.buffer(no)
+    if buffer is None or not len(buffer):
+        return None, 0, alimentador.arquivo_existe
+    timestamps = buffer.ultimos(1)[0]
+    return int(timestamps[-1]), min(len(buffer), janela), alimentador.arquivo_existe
+
+
+def montar_luminosidade(no, janela, max_pontos):
+    try:
+        return jsonify(dados_luminosidade(no, janela, max_pontos))
     except FileNotFoundError:
         return jsonify(labels=[], values=[], latest_value="N/A", error="Arquivo não encontrado"), 200
     except Exception as e:
@@ -87,71 +355,158 @@ def get_luminosidade_data():
 
 
 # --- API PARA ATUALIZAR LIMIARES ---
+CAMPOS_CONFIRMACAO = ('id', 'rtt_ms', 'luminosidade', 'led_verde', 'led_amarelo', 'led_vermelho', 'buzzer')
+
+
+def confirmar_limiares(limiar_atencao, limiar_critico, nos):
+    """
+    Pede ao nivel3 o envio imediato dos limiares aos nós ('nos' None = todos) e
+    espera as confirmações. Retorna a resposta do nivel3 ou None se ele não respondeu.
+    """
+    resposta = enviar_comando(porta_comandos(cache_config.obter()), {
+        'id': f"{os.getpid()}-{threading.get_ident()}-{time.monotonic_ns()}", 'tipo': 'limiares',
+        'limiar_atencao': limiar_atencao, 'limiar_critico': limiar_critico, 'nos': nos,
+    })
+    if resposta is not None and resposta.get('nos') is not None:
+        resposta['nos'] = [{**dict(zip(CAMPOS_CONFIRMACAO, dados)), 'confirmado': dados[1] is not None}
+                           for dados in resposta['nos']]
+    return resposta
+
+
 @app.route('/update_thresholds', methods=['POST'])
 def update_thresholds():
+    """
+    Grava os limiares no YAML (valem para as próximas consultas) e os envia já
+    aos nós pelo nivel3, respondendo com as confirmações, o estado informado por
+    cada nó e o RTT. 'nos' opcional restringe o envio a uma lista de ids.
+    """
     data = request.get_json()
     if not data or 'limiar_atencao' not in data or 'limiar_critico' not in data:
         return jsonify(success=False, error="Dados inválidos"), 400
     
     try:
-        with open(YAML_PATH, 'r') as f:
-            config_data = yaml.safe_load(f) or {}
+        limiar_atencao = validar_limiar(data['limiar_atencao'])
+        limiar_critico = validar_limiar(data['limiar_critico'])
+        nos = None if data.get('nos') is None else [int(id_no) for id_no in data['nos']]
+
+        with yaml_lock:
+            with open(YAML_PATH, 'r') as f:
+                config_data = yaml.safe_load(f) or {}
+
+            if 'nivel6' not in config_data:
+                config_data['nivel6'] = {}
 
-        if 'nivel6' not in config_data:
-            config_data['nivel6'] = {}
+            config_data['nivel6']['limiar_atencao'] = limiar_atencao
+            config_data['nivel6']['limiar_critico'] = limiar_critico
 
-        config_data['nivel6']['limiar_atencao'] = int(data['limiar_atencao'])
-        config_data['nivel6']['limiar_critico'] = int(data['limiar_critico'])
+            salvar_yaml_seguro(YAML_PATH, config_data)
 
-        salvar_yaml_seguro(YAML_PATH, config_data)
-            
-        return jsonify(success=True, message="Limiares atualizados com sucesso!")
+        confirmacao = confirmar_limiares(limiar_atencao, limiar_critico, nos)
+        if confirmacao is None:
+            return jsonify(success=True, confirmacao=None,
+                           message="Limiares salvos; o nivel3 não respondeu e os aplicará na próxima recarga.")
+        if confirmacao.get('erro'):
+            return jsonify(success=True, confirmacao=confirmacao,
+                           message=f"Limiares salvos, mas o envio imediato falhou: {confirmacao['erro']}")
+        return jsonify(success=True, confirmacao=confirmacao,
+                       message=f"Limiares confirmados por {confirmacao['confirmados']}/{confirmacao['total']} nó(s) "
+                               f"em {confirmacao['duracao_ms']} ms.")
         
     except (ValueError, TypeError):
-        return jsonify(success=False, error="Valores dos limiares devem ser números inteiros."), 400
+        return jsonify(success=False, error=f"Valores dos limiares devem ser números inteiros entre 0 e {LIMIAR_MAXIMO}."), 400
     except Exception as e:
         return jsonify(success=False, error=str(e)), 500
 
 
 # --- API PARA DADOS ESTATÍSTICOS ---
+def converter_estatisticas(header_str, last_line_str):
+    """Converte uma linha do CSV de estatísticas em dicionário formatado para exibição."""
+    header = next(csv.reader(io.StringIO(header_str)))
+    last_line_data = next(csv.reader(io.StringIO(last_line_str)))
+    latest_stats_raw = dict(zip(header, last_line_data))
+
+    latest_stats_converted = {}
+    for key, value in latest_stats_raw.items():
+        try:
+            numeric_value = float(value)
+            if key == 'Luminosidade_Media':
+                latest_stats_converted[key] = f"{numeric_value:.2f}"
+            elif key in ['Luminosidade_Min', 'Luminosidade_Max']:
+                latest_stats_converted[key] = f"{int(numeric_value)}"
+            else:
+                latest_stats_converted[key] = numeric_value
+        except (ValueError, TypeError):
+            latest_stats_converted[key] = value
+    return latest_stats_converted
+
+
+def percentis_pedidos():
+    """Percentis pedidos em '?percentis=5,50,95' (padrão: p5, p50 e p95). Levanta ValueError."""
+    if not request.args.get('percentis'):
+        return PERCENTIS_PADRAO
+    percentis = tuple(float(texto) for texto in request.args['percentis'].split(','))
+    if not all(0 <= percentil <= 100 for percentil in percentis):
+        raise ValueError("os percentis devem estar entre 0 e 100")
+    return percentis
+
+
 @app.route('/api/estatisticas')
 def get_estatisticas_data():
-    """Lê o YAML e a última linha do CSV, formatando os dados para exibição correta."""
-    response_data = {}
+    """
+    Última linha das estatísticas com os atuadores do nó. Com '?from=', '?to=' ou
+    '?percentis=', inclui em 'distribuicao' os percentis de luminosidade e RSSI
+    no período (padrão: as últimas 24 h), de todos os nós ou do nó em '?node='.
+    """
+    # Do estado ao vivo entram só os atuadores (o resto muda a cada amostra e está em /api/estado),
+    # de modo que a chave é a do arquivo de estatísticas e só muda com uma nova linha ou um atuador
+    no = no_selecionado(cache_config.obter() or {})
+    estado = estado_nos.ler(no) or {}
+    estado = {chave: estado[chave] for chave in ATUADORES if chave in estado}
+    if not any(chave in request.args for chave in ('from', 'to', 'percentis')):
+        return resposta_em_cache(f'estatisticas-{no}', [CSV_STATS_PATH, YAML_PATH],
+                                 (no, tuple(sorted(estado.items()))), lambda: montar_estatisticas(estado))
+
     try:
-        with open(YAML_PATH, 'r') as f:
-            config = yaml.safe_load(f) or {}
+        fim_ms = historico.interpretar_instante(request.args['to']) if 'to' in request.args else \
+            int(datetime.now().timestamp() * 1000)
+        inicio_ms = historico.interpretar_instante(request.args['from']) if 'from' in request.args else \
+            fim_ms - DURACAO_DISTRIBUICAO_S * 1000
+        no_distribuicao = int(request.args['node']) if request.args.get('node') else None
+        percentis = percentis_pedidos()
+    except ValueError as e:
+        return jsonify(error=f"Parâmetros inválidos: {e}"), 400
+    if inicio_ms > fim_ms:
+        return jsonify(error="'from' deve ser anterior a 'to'."), 400
+    return montar_estatisticas(estado, (inicio_ms, fim_ms, no_distribuicao, percentis))
+
+
+def montar_estatisticas(estado, distribuicao=None):
+    """
+    Combina o YAML, os atuadores do nó e a última linha do CSV, formatando os dados para exibição.
+    'distribuicao' = (início ms, fim ms, nó ou None, percentis) junta os esboços dos rollups no período.
+    """
+    response_data = {}
+    config = cache_config.obter()
+    if config is not None:
         response_data.update(config.get('nivel6', {}))
+        response_data.update(estado)
         response_data.update(config.get('nivel5', {}))
-    except Exception as e:
-        response_data['error_yaml'] = str(e)
+    else:
+        response_data['error_yaml'] = "Não foi possível carregar o arquivo de configuração."
+    if distribuicao is not None:
+        inicio_ms, fim_ms, no, percentis = distribuicao
+        response_data['distribuicao'] = {
+            serie: {'de': formatar_timestamp(inicio_ms), 'ate': formatar_timestamp(fim_ms), 'no': no,
+                    **historico.distribuicao(caminho, inicio_ms, fim_ms, no, percentis)}
+            for serie, caminho in ROLLUP_PATHS.items()}
 
     try:
-        with open(CSV_STATS_PATH, 'r', encoding='utf-8') as f:
-            header_str = f.readline()
-            try:
-                last_line_str = deque(f, 1)[0]
-            except IndexError:
-                return jsonify(response_data)
-
-        header = next(csv.reader(io.StringIO(header_str)))
-        last_line_data = next(csv.reader(io.StringIO(last_line_str)))
-        latest_stats_raw = dict(zip(header, last_line_data))
+        header_str, last_lines = cauda_estatisticas.ler()
+        if not last_lines:
+            return jsonify(response_data)
+        last_line_str = last_lines[-1]
 
-        latest_stats_converted = {}
-        for key, value in latest_stats_raw.items():
-            try:
-                numeric_value = float(value)
-                if key == 'Luminosidade_Media':
-                    latest_stats_converted[key] = f"{numeric_value:.2f}"
-                elif key in ['Luminosidade_Min', 'Luminosidade_Max']:
-                    latest_stats_converted[key] = f"{int(numeric_value)}"
-                else:
-                    latest_stats_converted[key] = numeric_value
-            except (ValueError, TypeError):
-                latest_stats_converted[key] = value
-        
-        response_data.update(latest_stats_converted)
+        response_data.update(converter_estatisticas(header_str, last_line_str))
         return jsonify(response_data)
 
     except FileNotFoundError:
@@ -162,6 +517,199 @@ def get_estatisticas_data():
         return jsonify(response_data), 500
 
 
+# --- API PARA HISTÓRICO POR INTERVALO DE TEMPO ---
+@app.route('/api/historico')
+def get_historico():
+    """
+    Série de luminosidade (ou 'serie=rssi') entre 'from' e 'to' (ISO 8601 ou
+    época), opcionalmente de um nó ('node'). 'resolution' escolhe entre os dados
+    brutos e os rollups de 1min/1h/1d; 'auto' (padrão) decide pelo tamanho do intervalo.
+    'max_points' reduz a série por LTTB antes de serializar.
+    """
+    serie = request.args.get('serie', 'luminosidade')
+    if serie not in ROLLUP_PATHS:
+        return jsonify(error="Série inválida (use luminosidade ou rssi)."), 400
+    try:
+        fim_ms = historico.interpretar_instante(request.args['to']) if 'to' in request.args else \
+            int(datetime.now().timestamp() * 1000)
+        inicio_ms = historico.interpretar_instante(request.args['from']) if 'from' in request.args else \
+            fim_ms - 3600 * 1000
+        no = int(request.args['node']) if request.args.get('node') else None
+        resolucao = historico.escolher_resolucao(request.args.get('resolution'), inicio_ms, fim_ms)
+        max_pontos = max_pontos_pedido()
+    except ValueError as e:
+        return jsonify(error=f"Parâmetros inválidos: {e}"), 400
+    if inicio_ms > fim_ms:
+        return jsonify(error="'from' deve ser anterior a 'to'."), 400
+
+    try:
+        if resolucao != 'bruto':
+            pontos = historico.rollups(ROLLUP_PATHS[serie], resolucao, inicio_ms, fim_ms, no)
+        elif armazenamento_binario():
+            serie_bruta = serie_binaria()
+            pontos = historico.bruto_binario(serie_bruta, serie, inicio_ms, fim_ms, no) \
+                if os.path.exists(serie_bruta.caminho) else []
+        elif serie == 'luminosidade':
+            pontos = historico.bruto_csv(CSV_RAW_PATH, indices_brutos[serie], 'Luminosidade', inicio_ms, fim_ms, no)
+        else:
+            pontos = historico.bruto_csv(CSV_REDE_PATH, indices_brutos[serie], 'RSSI_Downlink', inicio_ms, fim_ms, no)
+    except FileNotFoundError:
+        pontos = []
+    except Exception as e:
+        return jsonify(error=str(e)), 500
+
+    truncado = len(pontos) >= historico.LIMITE_PONTOS
+    return jsonify(serie=serie, resolucao=resolucao, no=no, pontos=historico.reduzir_pontos(pontos, max_pontos),
+                   truncado=truncado)
+
+
+# --- API DE EXPORTAÇÃO COLUNAR (ARROW IPC / PARQUET) ---
+@app.route('/api/exportar')
+def get_exportar():
+    """
+    Dados brutos de 'fonte' (rede|aplicacao) entre 'from' e 'to' (padrão: tudo
+    até agora), opcionalmente só dos nós em 'node' (ex.: 1,2,3), em
+    'formato' arrow (stream IPC) ou parquet. A resposta é gerada lote a lote.
+    """
+    if not exportacao.disponivel():
+        return jsonify(error="Exportação indisponível: instale o pacote 'pyarrow'."), 501
+    fonte = request.args.get('fonte', 'aplicacao')
+    formato = request.args.get('formato', 'parquet')
+    if fonte not in exportacao.FONTES or formato not in exportacao.FORMATOS:
+        return jsonify(error=f"Use fonte={'|'.join(exportacao.FONTES)} e formato={'|'.join(exportacao.FORMATOS)}."), 400
+    try:
+        fim_ms = historico.interpretar_instante(request.args['to']) if 'to' in request.args else \
+            int(datetime.now().timestamp() * 1000)
+        inicio_ms = historico.interpretar_instante(request.args['from']) if 'from' in request.args else 0
+        nos = exportacao.interpretar_nos(request.args.get('node'))
+    except ValueError as e:
+        return jsonify(error=f"Parâmetros inválidos: {e}"), 400
+    if inicio_ms > fim_ms:
+        return jsonify(error="'from' deve ser anterior a 'to'."), 400
+
+    lotes = exportacao.lotes_fonte(cache_config.obter(), fonte, NIVEL4_PATH, inicio_ms, fim_ms, nos,
+                                   indices_brutos.values())
+    tipo, extensao = exportacao.FORMATOS[formato]
+    return Response(exportacao.serializar(lotes, fonte, formato), mimetype=tipo,
+                    headers={'Content-Disposition': f'attachment; filename=twinsen_{fonte}{extensao}'})
+
+
+# --- API PARA O ESTADO AO VIVO DE TODOS OS NÓS ---
+@app.route('/api/estado')
+def get_estado_nos():
+    return jsonify(nos=estado_nos.ler_todos())
+
+
+
+# --- STREAM DE EVENTOS (SSE) PARA O PAINEL ---
+class ObservadorPainel:
+    """
+    Lado servidor do /api/stream: lembra o que já foi lido para publicar só as
+    novidades (leituras novas de luminosidade de cada nó, nova linha de
+    estatísticas e mudanças dos atuadores de cada nó). As leituras novas saem
+    dos buffers em memória, que o AlimentadorBuffer mantém em dia (pelo
+    barramento ou pelo arquivo).
+    """
+
+    def __init__(self):
+        self.cauda_stats = LeitorCauda(CSV_STATS_PATH, 1, reter=False)
+        self.totais_buffer = {}  # id do nó -> amostras do seu buffer já publicadas
+        self.atuadores = {}  # id do nó -> estados dos atuadores já publicados
+
+    def _novas_leituras(self):
+        """[(nó, labels, values)] das leituras ainda não publicadas de cada nó."""
+        alimentador.iniciar()
+        novas_por_no = []
+        for no, buffer in list(buffers_luminosidade.buffers.items()):
+            total = buffer.total
+            publicado = self.totais_buffer.get(no)
+            novas = total - publicado if publicado is not None and total >= publicado else total
+            self.totais_buffer[no] = total
+            _, values, labels = buffer.ultimos(min(novas, 30))
+            if len(values):
+                novas_por_no.append((no, labels, values.tolist()))
+        return novas_por_no
+
+    def coletar(self):
+        eventos = []
+        for no, labels, values in self._novas_leituras():
+            eventos.append(('luminosidade', no, {'labels': labels, 'values': values, 'latest_value': values[-1]}))
+
+        try:
+            linhas = self.cauda_stats.novas()
+            if linhas:
+                eventos.append(('estatisticas', None, estatisticas_painel(self.cauda_stats.cabecalho, linhas[-1])))
+        except FileNotFoundError:
+            pass
+
+        for estado in estado_nos.ler_todos():
+            atuadores = {chave: estado[chave] for chave in ATUADORES}
+            if self.atuadores.get(estado['id']) != atuadores:
+                self.atuadores[estado['id']] = atuadores
+                eventos.append(('estado', estado['id'], atuadores))
+        return eventos
+
+
+def estatisticas_painel(header_str, last_line_str):
+    """Cards de estatísticas do painel: última linha do CSV mais o tamanho da janela."""
+    dados = converter_estatisticas(header_str, last_line_str)
+    dados['janela_aplicacao'] = (cache_config.obter() or {}).get('nivel5', {}).get('janela_aplicacao')
+    return dados
+
+
+transmissor = Transmissor(ObservadorPainel().coletar)
+alimentador.ao_adicionar = transmissor.acordar  # Leituras novas vão ao painel sem esperar o próximo ciclo
+
+
+@app.route('/api/stream')
+def stream():
+    """Eventos 'inicial' (estado completo) e depois 'luminosidade', 'estatisticas' e 'estado' (só mudanças)."""
+    no = no_selecionado(cache_config.obter() or {})
+    fila = transmissor.inscrever(no)
+
+    inicial = {}
+    try:
+        inicial['luminosidade'] = dados_luminosidade(no)
+    except Exception:
+        pass
+    try:
+        header_str, last_lines = cauda_estatisticas.ler()
+        if last_lines:
+            inicial['estatisticas'] = estatisticas_painel(header_str, last_lines[-1])
+    except Exception:
+        pass
+    estado = estado_nos.ler(no)
+    if estado:
+        inicial['estado'] = {chave: estado[chave] for chave in ATUADORES}
+
+    return Response(transmissor.eventos(fila, [formatar_evento('inicial', inicial)]),
+                    mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+# --- MÉTRICAS ---
+@app.before_request
+def iniciar_cronometro():
+    g.inicio_requisicao = time.perf_counter()
+
+
+@app.after_request
+def registrar_duracao(resposta):
+    inicio = g.get('inicio_requisicao')
+    if inicio is not None:
+        # Rotas desconhecidas ficam agrupadas, para não criar uma série por URL
+        rota = request.url_rule.rule if request.url_rule is not None else 'desconhecida'
+        duracao_requisicao.observar(time.perf_counter() - inicio, rota=rota, status=resposta.status_code)
+    return resposta
+
+
+@app.route('/metrics')
+def metricas():
+    """Métricas deste processo e as publicadas pelo nivel3 e nivel5, no formato texto do Prometheus."""
+    texto = formatar_prometheus([registro.retrato()] + ler_publicados(ignorar=registro.processo))
+    return Response(texto, content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000, debug=False)
 
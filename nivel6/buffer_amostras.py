@@ -0,0 +1,105 @@
+# buffer_amostras.py - Buffer circular de tamanho fixo com as amostras mais recentes
+
+import threading
+
+import numpy as np
+
+
+class BufferAmostras:
+    """
+    Últimas 'capacidade' amostras (timestamp em ms, valor e rótulo já formatado
+    para o gráfico) em arrays pré-alocados, sobrescritos circularmente. Inserir
+    e fatiar não alocam por amostra nem reformatam timestamps.
+    """
+
+    def __init__(self, capacidade):
+        self.capacidade = capacidade
+        self.timestamps = np.zeros(capacidade, dtype=np.int64)
+        self.valores = np.zeros(capacidade, dtype=np.float64)
+        self.rotulos = [''] * capacidade
+        self.total = 0  # Amostras já inseridas; a próxima vai em total % capacidade
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return min(self.total, self.capacidade)
+
+    def adicionar(self, timestamps_ms, valores, rotulos):
+        quantidade = len(valores)
+        if quantidade > self.capacidade:
+            timestamps_ms, valores, rotulos = (timestamps_ms[-self.capacidade:], valores[-self.capacidade:],
+                                               rotulos[-self.capacidade:])
+            quantidade = self.capacidade
+        if not quantidade:
+            return
+        with self._lock:
+            indices = (self.total + np.arange(quantidade)) % self.capacidade
+            self.timestamps[indices] = timestamps_ms
+            self.valores[indices] = valores
+            for indice, rotulo in zip(indices.tolist(), rotulos):
+                self.rotulos[indice] = rotulo
+            self.total += quantidade
+
+    def ultimos(self, quantidade):
+        """Retorna (timestamps, valores, rótulos) das últimas 'quantidade' amostras, da mais antiga à mais nova."""
+        with self._lock:
+            quantidade = max(min(quantidade, len(self)), 0)
+            indices = (self.total - quantidade + np.arange(quantidade)) % self.capacidade
+            return self.timestamps[indices], self.valores[indices], [self.rotulos[i] for i in indices.tolist()]
+
+    def limpar(self):
+        with self._lock:
+            self.total = 0
+
+
+class BuffersPorNo:
+    """
+    Um BufferAmostras por nó, criado na primeira amostra do nó, para que o
+    gráfico de um nó não misture as leituras dos outros. 'versao' muda a cada
+    inserção ou limpeza (serve de ETag para as respostas montadas a partir dele).
+    """
+
+    def __init__(self, capacidade):
+        self.capacidade = capacidade
+        self.buffers = {}
+        self.versao = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return sum(len(buffer) for buffer in list(self.buffers.values()))
+
+    def buffer(self, no):
+        """Buffer do nó, ou None se ainda não chegou nenhuma amostra dele."""
+        return self.buffers.get(no)
+
+    def adicionar(self, nos, timestamps_ms, valores, rotulos):
+        """Distribui as amostras (em ordem de chegada) pelos buffers dos seus nós."""
+        if not len(valores):
+            return
+        nos = np.asarray(nos)
+        timestamps_ms = np.asarray(timestamps_ms)
+        valores = np.asarray(valores)
+        with self._lock:
+            for no in np.unique(nos).tolist():
+                selecao = np.flatnonzero(nos == no)
+                buffer = self.buffers.get(no)
+                if buffer is None:
+                    buffer = self.buffers[no] = BufferAmostras(self.capacidade)
+                buffer.adicionar(timestamps_ms[selecao], valores[selecao], [rotulos[i] for i in selecao.tolist()])
+            self.versao += 1
+
+    def ultimos(self, no, quantidade):
+        """Como BufferAmostras.ultimos(), para o nó 'no' (vazio se ele não tem amostras)."""
+        buffer = self.buffers.get(no)
+        if buffer is None:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float64), []
+        return buffer.ultimos(quantidade)
+
+    def ultimo_timestamp(self):
+        """Timestamp (ms) da amostra mais nova entre todos os nós, ou None."""
+        ultimos = [buffer.ultimos(1)[0] for buffer in list(self.buffers.values())]
+        return max((int(ultimo[0]) for ultimo in ultimos if len(ultimo)), default=None)
+
+    def limpar(self):
+        with self._lock:
+            self.buffers = {}
+            self.versao += 1
@@ -0,0 +1,63 @@
+# cache_respostas.py - Cache de respostas JSON compartilhado entre processos, versionado pelos arquivos de dados
+
+import hashlib
+import os
+import tempfile
+
+
+def diretorio_padrao():
+    """Em memória (/dev/shm) quando disponível, para não gastar o cartão SD com escritas a cada segundo."""
+    base = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+    return os.path.join(base, 'twinsen-cache')
+
+
+def assinatura_arquivo(caminho):
+    """(mtime, tamanho, inode) do arquivo, ou None se ele não existe."""
+    try:
+        info = os.stat(caminho)
+    except OSError:
+        return None
+    return info.st_mtime_ns, info.st_size, info.st_ino
+
+
+class CacheRespostas:
+    """
+    Guarda o último corpo de cada rota em um arquivo por rota, num diretório
+    comum a todos os processos (ex.: workers do gunicorn). A versão (ETag) é
+    um hash das assinaturas dos arquivos de dados e de valores extras; se ela
+    não mudou, o corpo salvo é reaproveitado sem reler os dados.
+    """
+
+    def __init__(self, diretorio=None):
+        self.diretorio = diretorio or diretorio_padrao()
+        os.makedirs(self.diretorio, exist_ok=True)
+
+    def versao(self, caminhos, extras=()):
+        """Retorna (etag, última modificação em segundos ou None) dos arquivos e extras informados."""
+        assinaturas = [assinatura_arquivo(caminho) for caminho in caminhos]
+        chave = repr((list(zip(caminhos, assinaturas)), list(extras))).encode('utf-8')
+        mtimes = [assinatura[0] for assinatura in assinaturas if assinatura]
+        return hashlib.sha1(chave).hexdigest(), max(mtimes) / 1e9 if mtimes else None
+
+    def _caminho(self, nome):
+        return os.path.join(self.diretorio, hashlib.sha1(nome.encode('utf-8')).hexdigest())
+
+    def obter(self, nome, etag):
+        """Corpo salvo para 'nome' se ele foi gerado na versão 'etag'; senão None."""
+        try:
+            with open(self._caminho(nome), 'rb') as f:
+                conteudo = f.read()
+        except OSError:
+            return None
+        etag_salvo, _, corpo = conteudo.partition(b'\n')
+        return corpo if etag_salvo == etag.encode('ascii') else None
+
+    def salvar(self, nome, etag, corpo):
+        """Substitui atomicamente o corpo salvo para 'nome'."""
+        try:
+            with tempfile.NamedTemporaryFile('wb', dir=self.diretorio, delete=False) as tmp:
+                tmp.write(etag.encode('ascii') + b'\n' + corpo)
+                temp_name = tmp.name
+            os.replace(temp_name, self._caminho(nome))
+        except OSError as e:
+            print(f"[AVISO] Não foi possível salvar a resposta '{nome}' no cache: {e}")
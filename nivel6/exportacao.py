@@ -0,0 +1,291 @@
+# exportacao.py - Exportação colunar (Arrow IPC ou Parquet) dos dados brutos, em lotes
+#
+# Uso: python exportacao.py --fonte rede|aplicacao --saida dados.parquet [--de 2025-01-01T00:00] [--ate ...]
+#                           [--nos 1,2,3] [--formato parquet|arrow] [--dados ../nivel4]
+#
+# Lê só o intervalo pedido dos CSVs brutos (segmentos do manifesto + arquivo
+# ativo, com o índice esparso) ou da série binária, e converte LINHAS_POR_LOTE
+# linhas por vez num lote Arrow, que vira um lote do stream IPC ou um row group
+# do Parquet. A memória não depende do tamanho do intervalo. O mesmo gerador
+# alimenta o /api/exportar do app.py.
+#
+# O pyarrow é opcional: sem ele, só a exportação fica indisponível.
+
+import argparse
+import io
+import itertools
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+import yaml
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')))
+from comum.configuracao import ID_NO_PADRAO
+from comum.indice import linhas_no_intervalo
+from comum.rotacao import abrir_segmento, linhas_segmento, segmentos_no_intervalo
+from comum.serie_temporal import (FORMATO_TIMESTAMP, STATUS_SUCESSO, STATUS_TEXTO, SerieTemporal, formatar_timestamp,
+                                  hora_local, nome_arquivo_binario)
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Opcional: sem ele, a exportação responde com erro
+    pa = pq = None
+
+FONTES = ('rede', 'aplicacao')
+# Fonte -> (chave do nome do CSV bruto na seção 'nivel4' do YAML, nome padrão)
+ARQUIVOS_CSV = {'rede': ('nome_arquivo_rede', 'dados_brutos_rede.csv'),
+                'aplicacao': ('nome_arquivo_aplicacao', 'dados_brutos_aplicacao.csv')}
+# Formato -> (tipo MIME, extensão)
+FORMATOS = {'arrow': ('application/vnd.apache.arrow.stream', '.arrows'),
+            'parquet': ('application/vnd.apache.parquet', '.parquet')}
+LINHAS_POR_LOTE = 65536
+STATUS = [STATUS_TEXTO[codigo] for codigo in sorted(STATUS_TEXTO)]  # Índice = código do status na série binária
+
+
+def disponivel():
+    return pa is not None
+
+
+def esquema(fonte):
+    """Colunas com os nomes dos CSVs; o Timestamp é a hora local, como nos CSVs, sem fuso."""
+    colunas = [pa.field('Timestamp', pa.timestamp('ms'), nullable=False),
+               pa.field('No', pa.uint16(), nullable=False)]
+    if fonte == 'rede':
+        colunas += [pa.field('RSSI_Downlink', pa.float32()),
+                    pa.field('Status', pa.dictionary(pa.int8(), pa.string())),
+                    pa.field('RTT_ms', pa.float32())]
+    else:
+        colunas.append(pa.field('Luminosidade', pa.uint16(), nullable=False))
+    return pa.schema(colunas)
+
+
+def interpretar_nos(texto):
+    """'1,2,3' -> {1, 2, 3}; vazio -> None (todos). Levanta ValueError."""
+    if not texto:
+        return None
+    return {int(parte) for parte in texto.split(',') if parte.strip()}
+
+
+# --- Montagem dos lotes ---
+
+def _lote(fonte, instantes_ms, nos, valores):
+    """Lote Arrow a partir das colunas em NumPy; valores NaN viram nulos."""
+    colunas = [pa.array(instantes_ms.astype('datetime64[ms]')), pa.array(nos.astype(np.uint16))]
+    if fonte == 'rede':
+        rssi, status, rtt = valores
+        indices = pa.array(status, type=pa.int8(), from_pandas=True)
+        colunas += [pa.array(rssi.astype(np.float32), from_pandas=True),
+                    pa.DictionaryArray.from_arrays(indices, pa.array(STATUS, type=pa.string())),
+                    pa.array(rtt.astype(np.float32), from_pandas=True)]
+    else:
+        colunas.append(pa.array(valores.astype(np.uint16)))
+    return pa.RecordBatch.from_arrays(colunas, schema=esquema(fonte))
+
+
+def _lote_csv(fonte, linhas, cabecalho, nos_pedidos):
+    """Converte linhas de um CSV bruto num lote; linhas malformadas são descartadas."""
+    tabela = pd.read_csv(io.BytesIO(b'\n'.join(linhas)), header=None, names=cabecalho, on_bad_lines='skip',
+                         dtype={cabecalho[0]: str, 'Status': str})
+
+    def numerica(coluna, padrao=np.nan):
+        if coluna not in tabela:
+            return pd.Series(padrao, index=tabela.index, dtype=np.float64)
+        return pd.to_numeric(tabela[coluna], errors='coerce')
+
+    instantes = pd.to_datetime(tabela[cabecalho[0]], format=FORMATO_TIMESTAMP, errors='coerce')
+    nos = numerica('No', ID_NO_PADRAO)
+    validos = instantes.notna() & nos.notna()
+    if fonte == 'aplicacao':
+        luminosidade = numerica('Luminosidade')
+        validos &= luminosidade.notna()
+    if nos_pedidos is not None:
+        validos &= nos.isin(nos_pedidos)
+    validos = validos.to_numpy()
+
+    instantes_ms = instantes.to_numpy()[validos].astype('datetime64[ms]').astype(np.int64)
+    nos = nos.to_numpy()[validos]
+    if fonte == 'aplicacao':
+        return _lote(fonte, instantes_ms, nos, luminosidade.to_numpy()[validos])
+    status = tabela['Status'] if 'Status' in tabela else pd.Series(STATUS_TEXTO[STATUS_SUCESSO], index=tabela.index)
+    codigos = status.map({texto: codigo for codigo, texto in enumerate(STATUS)}).to_numpy(dtype=np.float64)
+    return _lote(fonte, instantes_ms, nos, (numerica('RSSI_Downlink').to_numpy()[validos], codigos[validos],
+                                            numerica('RTT_ms').to_numpy()[validos]))
+
+
+def lotes_csv(fonte, caminho, inicio_ms, fim_ms, nos=None, indice=None):
+    """
+    Lotes do CSV bruto 'caminho' (e dos seus segmentos rotacionados) no
+    intervalo, lidos em sequência sem carregar os arquivos inteiros.
+    """
+    inicio, fim = formatar_timestamp(inicio_ms), formatar_timestamp(fim_ms)
+    fontes = [(segmento, lambda segmento=segmento: linhas_segmento(segmento, inicio, fim))
+              for segmento in segmentos_no_intervalo(caminho, inicio, fim)]
+    if os.path.exists(caminho):
+        fontes.append((caminho, lambda: linhas_no_intervalo(caminho, inicio, fim, indice)))
+
+    for origem, gerar_linhas in fontes:
+        # Cada arquivo traz o seu cabeçalho (os antigos não têm as colunas No/RTT_ms)
+        with abrir_segmento(origem) as f:
+            cabecalho = f.readline().decode('utf-8').strip().split(',')
+        linhas = gerar_linhas()
+        while True:
+            bloco = list(itertools.islice(linhas, LINHAS_POR_LOTE))
+            if not bloco:
+                break
+            lote = _lote_csv(fonte, bloco, cabecalho, nos)
+            if lote.num_rows:
+                yield lote
+
+
+def lotes_binario(fonte, serie, inicio_ms, fim_ms, nos=None):
+    """Lotes da série binária: busca binária no timestamp e fatias do arquivo mapeado."""
+    registros = serie.ler()
+    if not len(registros):
+        return
+    timestamps = registros['timestamp_ms']
+    primeiro = int(np.searchsorted(timestamps, inicio_ms, side='left'))
+    ultimo = int(np.searchsorted(timestamps, fim_ms, side='right'))
+    for inicio in range(primeiro, ultimo, LINHAS_POR_LOTE):
+        trecho = registros[inicio:min(inicio + LINHAS_POR_LOTE, ultimo)]
+        sucesso = trecho['status'] == STATUS_SUCESSO
+        selecao = sucesso if fonte == 'aplicacao' else np.ones(len(trecho), dtype=bool)
+        if nos is not None:
+            selecao &= np.isin(trecho['no'], list(nos))
+        trecho, sucesso = trecho[selecao], sucesso[selecao]
+        if not len(trecho):
+            continue
+        instantes_ms = hora_local(trecho['timestamp_ms'].astype(np.int64))
+        if fonte == 'aplicacao':
+            yield _lote(fonte, instantes_ms, trecho['no'], trecho['luminosidade'])
+            continue
+        status = trecho['status'].astype(np.float64)
+        status[status >= len(STATUS)] = np.nan
+        rssi = np.where(sucesso, trecho['rssi'].astype(np.float64), np.nan)
+        # Séries da versão 1 não guardam o RTT
+        rtt = trecho['rtt_ms'].astype(np.float64) if 'rtt_ms' in trecho.dtype.names else np.full(len(trecho), np.nan)
+        yield _lote(fonte, instantes_ms, trecho['no'], (rssi, status, rtt))
+
+
+# --- Serialização ---
+
+class SaidaIncremental(io.RawIOBase):
+    """Destino em memória que o escritor do pyarrow preenche e o gerador esvazia a cada lote."""
+
+    def __init__(self):
+        super().__init__()
+        self._partes = []
+        self._posicao = 0
+
+    def writable(self):
+        return True
+
+    def write(self, dados):
+        self._partes.append(bytes(dados))
+        self._posicao += len(dados)
+        return len(dados)
+
+    def tell(self):
+        return self._posicao
+
+    def drenar(self):
+        dados = b''.join(self._partes)
+        self._partes = []
+        return dados
+
+
+def serializar(lotes, fonte, formato):
+    """Gera os bytes do stream Arrow IPC ou do Parquet (um row group por lote) à medida que os lotes chegam."""
+    saida = SaidaIncremental()
+    if formato == 'arrow':
+        escritor = pa.ipc.new_stream(saida, esquema(fonte))
+    else:
+        escritor = pq.ParquetWriter(saida, esquema(fonte))
+    try:
+        for lote in lotes:
+            escritor.write_batch(lote)
+            dados = saida.drenar()
+            if dados:
+                yield dados
+    finally:
+        escritor.close()
+    yield saida.drenar()
+
+
+def caminho_fonte(config, fonte, dir_dados):
+    """(binário?, caminho) do arquivo bruto de 'fonte' no armazenamento e com os nomes da seção 'nivel4' do YAML."""
+    nivel4 = (config or {}).get('nivel4') or {}
+    if nivel4.get('armazenamento', 'csv') == 'binario':
+        return True, os.path.join(dir_dados, nome_arquivo_binario(config))
+    chave, padrao = ARQUIVOS_CSV[fonte]
+    return False, os.path.join(dir_dados, str(nivel4.get(chave) or padrao))
+
+
+def lotes_fonte(config, fonte, dir_dados, inicio_ms, fim_ms, nos=None, indices=()):
+    """
+    Lotes da fonte no armazenamento em uso (série binária ou CSVs). 'indices'
+    são IndiceEsparso já abertos; usa o do CSV lido, se houver.
+    """
+    binario, caminho = caminho_fonte(config, fonte, dir_dados)
+    if binario:
+        return lotes_binario(fonte, SerieTemporal(caminho), inicio_ms, fim_ms, nos) if os.path.exists(caminho) else iter(())
+    indice = next((indice for indice in indices if os.path.abspath(indice.caminho_csv) == os.path.abspath(caminho)), None)
+    return lotes_csv(fonte, caminho, inicio_ms, fim_ms, nos, indice)
+
+
+# --- Linha de comando ---
+
+def main():
+    import historico  # Só para interpretar as datas, como o /api/historico
+
+    dir_padrao = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'nivel4'))
+    parser = argparse.ArgumentParser(description="Exporta os dados brutos do TWINsen em Arrow IPC ou Parquet.")
+    parser.add_argument('--fonte', choices=FONTES, required=True, help="Dados de rede ou de aplicação")
+    parser.add_argument('--saida', required=True, help="Arquivo de saída (.parquet ou .arrows)")
+    parser.add_argument('--de', help="Início (ISO 8601 ou época; padrão: desde o começo)")
+    parser.add_argument('--ate', help="Fim (ISO 8601 ou época; padrão: agora)")
+    parser.add_argument('--nos', help="Ids dos nós separados por vírgula (padrão: todos)")
+    parser.add_argument('--formato', choices=FORMATOS, help="Padrão: pela extensão da saída (Parquet se não for .arrows)")
+    parser.add_argument('--dados', default=dir_padrao, help="Diretório dos dados brutos (padrão: nivel4)")
+    args = parser.parse_args()
+
+    if not disponivel():
+        print("[ERRO] A exportação requer o pacote 'pyarrow' (pip install pyarrow).")
+        sys.exit(1)
+    try:
+        inicio_ms = historico.interpretar_instante(args.de) if args.de else 0
+        fim_ms = historico.interpretar_instante(args.ate) if args.ate else int(time.time() * 1000)
+        nos = interpretar_nos(args.nos)
+    except ValueError as e:
+        print(f"[ERRO] Parâmetros inválidos: {e}")
+        sys.exit(1)
+    formato = args.formato or ('arrow' if args.saida.endswith(('.arrow', '.arrows')) else 'parquet')
+
+    try:
+        with open(os.path.join(args.dados, 'configuracoes.yaml'), 'r', encoding='utf-8') as f:
+            config = yaml.safe_load(f) or {}
+    except (OSError, yaml.YAMLError):
+        config = {}  # Sem o YAML: armazenamento CSV com os nomes padrão
+
+    inicio = time.perf_counter()
+    linhas = 0
+
+    def contar(lotes):
+        nonlocal linhas
+        for lote in lotes:
+            linhas += lote.num_rows
+            yield lote
+
+    lotes = contar(lotes_fonte(config, args.fonte, args.dados, inicio_ms, fim_ms, nos))
+    with open(args.saida, 'wb') as f:
+        for dados in serializar(lotes, args.fonte, formato):
+            f.write(dados)
+    duracao = time.perf_counter() - inicio
+    print(f"[INFO] {linhas} linha(s) de {args.fonte} exportadas em {duracao:.1f} s para '{args.saida}' ({formato}).")
+
+
+if __name__ == '__main__':
+    main()
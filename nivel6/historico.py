@@ -0,0 +1,206 @@
+# historico.py - Consultas por intervalo de tempo nos dados brutos e nos rollups
+
+import csv
+import itertools
+import math
+import os
+from datetime import datetime
+
+import numpy as np
+import yaml
+
+from comum.esboco import PERCENTIS_PADRAO, EsbocoQuantis
+from comum.indice import linhas_no_intervalo
+from comum.rollup import RESOLUCOES, caminho_rollup, inicio_intervalo
+from comum.rotacao import abrir_segmento, linhas_segmento, segmentos_no_intervalo
+from comum.serie_temporal import STATUS_SUCESSO, formatar_timestamp
+from lttb import lttb
+
+LIMITE_PONTOS = 50000  # Máximo de pontos por resposta
+# Resolução automática: maior intervalo (s) atendido por cada uma, da mais fina para a mais grossa
+RESOLUCAO_AUTOMATICA = [('bruto', 3 * 3600), ('1min', 3 * 86400), ('1h', 120 * 86400), ('1d', None)]
+# Esboços usados na distribuição: os de 1 h até este intervalo (s), os de 1 dia acima dele
+LIMITE_ESBOCO_1H = 7 * 86400
+
+
+def interpretar_instante(texto):
+    """Aceita ISO 8601 ('2025-01-01T14:00') ou segundos/ms desde a época; retorna ms. Levanta ValueError."""
+    try:
+        numero = float(texto)
+    except ValueError:
+        return int(datetime.fromisoformat(texto).timestamp() * 1000)
+    return int(numero if numero > 1e11 else numero * 1000)
+
+
+def escolher_resolucao(resolucao, inicio_ms, fim_ms):
+    """Valida a resolução pedida; 'auto' escolhe a mais fina adequada ao tamanho do intervalo."""
+    if resolucao in ('bruto', 'raw'):
+        return 'bruto'
+    if resolucao in RESOLUCOES:
+        return resolucao
+    if resolucao not in (None, '', 'auto'):
+        raise ValueError(f"resolução '{resolucao}' inválida (use auto, bruto, {', '.join(RESOLUCOES)})")
+    duracao_s = (fim_ms - inicio_ms) / 1000
+    for nome, limite in RESOLUCAO_AUTOMATICA:
+        if limite is None or duracao_s <= limite:
+            return nome
+
+
+def bruto_csv(caminho, indice, coluna, inicio_ms, fim_ms, no=None):
+    """
+    Pontos brutos de um CSV (rede ou aplicação) no intervalo; na rede, só as
+    leituras bem-sucedidas. Lê também os segmentos já rotacionados (e
+    comprimidos) que o manifesto indica cobrirem o intervalo.
+    """
+    inicio, fim = formatar_timestamp(inicio_ms), formatar_timestamp(fim_ms)
+    segmentos = segmentos_no_intervalo(caminho, inicio, fim)
+    fontes = [linhas_segmento(segmento, inicio, fim) for segmento in segmentos]
+    if os.path.exists(caminho):
+        fontes.append(linhas_no_intervalo(caminho, inicio, fim, indice))
+        with open(caminho, 'rb') as f:
+            linha_cabecalho = f.readline()
+    elif segmentos:
+        # Logo após uma rotação o arquivo ativo só é recriado na próxima escrita
+        with abrir_segmento(segmentos[-1]) as f:
+            linha_cabecalho = f.readline()
+    else:
+        raise FileNotFoundError(caminho)
+
+    cabecalho = next(csv.reader([linha_cabecalho.decode('utf-8').rstrip('\r\n')]), [])
+    indice_valor = cabecalho.index(coluna)
+    indice_no = cabecalho.index('No') if 'No' in cabecalho else None
+    indice_status = cabecalho.index('Status') if 'Status' in cabecalho else None
+
+    linhas = itertools.chain(*fontes)
+    pontos = []
+    for row in csv.reader(linha.decode('utf-8', errors='replace') for linha in linhas):
+        try:
+            id_no = int(row[indice_no]) if indice_no is not None else None
+            if no is not None and id_no is not None and id_no != no:
+                continue
+            if indice_status is not None and row[indice_status] != 'Sucesso':
+                continue
+            pontos.append({'t': row[0], 'no': id_no, 'valor': float(row[indice_valor])})
+        except (ValueError, IndexError):
+            continue
+        if len(pontos) >= LIMITE_PONTOS:
+            break
+    return pontos
+
+
+def bruto_binario(serie, campo, inicio_ms, fim_ms, no=None):
+    """Pontos brutos da série binária: busca binária direta no timestamp dos registros."""
+    registros = serie.ler()
+    if not len(registros):
+        return []
+    timestamps = registros['timestamp_ms']
+    primeiro = int(np.searchsorted(timestamps, inicio_ms, side='left'))
+    ultimo = int(np.searchsorted(timestamps, fim_ms, side='right'))
+    trecho = registros[primeiro:ultimo]
+    trecho = trecho[trecho['status'] == STATUS_SUCESSO]
+    if no is not None:
+        trecho = trecho[trecho['no'] == no]
+    trecho = trecho[:LIMITE_PONTOS]
+    return [{'t': formatar_timestamp(timestamp_ms), 'no': id_no, 'valor': float(valor)} for timestamp_ms, id_no, valor in
+            zip(trecho['timestamp_ms'].tolist(), trecho['no'].tolist(), trecho[campo].tolist())]
+
+
+def ponto_rollup(inicio, id_no, contagem, soma, minimo, maximo, soma_quadrados):
+    media = soma / contagem
+    variancia = max(soma_quadrados / contagem - media * media, 0.0)
+    return {'t': inicio, 'no': id_no, 'contagem': contagem, 'media': round(media, 2),
+            'minimo': minimo, 'maximo': maximo, 'desvio': round(math.sqrt(variancia), 2)}
+
+
+def intervalos_rollup(caminho_base, resolucao, inicio_ms, fim_ms, no=None):
+    """
+    Gera (início, nó, [contagem, soma, mín, máx, soma²], esboço em texto ou None)
+    dos intervalos da resolução que tocam [inicio_ms, fim_ms]: os fechados (CSV,
+    com busca binária) e depois os ainda abertos (estado salvo pelo nivel5).
+    """
+    inicio = inicio_intervalo(formatar_timestamp(inicio_ms), resolucao)
+    fim = formatar_timestamp(fim_ms)
+
+    caminho = caminho_rollup(caminho_base, resolucao)
+    if os.path.exists(caminho):
+        for row in csv.reader(linha.decode('utf-8') for linha in linhas_no_intervalo(caminho, inicio, fim)):
+            try:
+                id_no = int(row[1])
+                if no is not None and id_no != no:
+                    continue
+                valores = [int(row[2]), float(row[3]), float(row[4]), float(row[5]), float(row[6])]
+            except (ValueError, IndexError):
+                continue
+            yield row[0], id_no, valores, row[7] if len(row) > 7 else None
+
+    try:
+        with open(os.path.splitext(caminho_base)[0] + '_abertos.yaml', 'r', encoding='utf-8') as f:
+            abertos = ((yaml.safe_load(f) or {}).get('abertos') or {}).get(resolucao) or {}
+    except (OSError, yaml.YAMLError):
+        abertos = {}
+    for id_no, bucket in sorted(abertos.items(), key=lambda item: item[1][0]):
+        if (no is None or id_no == no) and inicio <= bucket[0] <= fim and bucket[1]:
+            yield bucket[0], id_no, bucket[1:6], bucket[6] if len(bucket) > 6 else None
+
+
+def rollups(caminho_base, resolucao, inicio_ms, fim_ms, no=None):
+    """Agregados da resolução cujo intervalo toca [inicio_ms, fim_ms], como pontos da série."""
+    pontos = []
+    for inicio, id_no, valores, _ in intervalos_rollup(caminho_base, resolucao, inicio_ms, fim_ms, no):
+        try:
+            pontos.append(ponto_rollup(inicio, id_no, *valores))
+        except ZeroDivisionError:
+            continue
+        if len(pontos) >= LIMITE_PONTOS:
+            break
+    return pontos
+
+
+def distribuicao(caminho_base, inicio_ms, fim_ms, no=None, percentis=PERCENTIS_PADRAO):
+    """
+    Percentis da série entre inicio_ms e fim_ms (alinhados aos intervalos de
+    1 h, ou de 1 dia em períodos longos), juntando os esboços dos rollups de
+    todos os nós (ou de 'no') sem reler os dados brutos.
+    """
+    resolucao = '1h' if (fim_ms - inicio_ms) / 1000 <= LIMITE_ESBOCO_1H else '1d'
+    esboco = EsbocoQuantis()
+    total, minimo, maximo = 0, None, None
+    for _, _, valores, texto in intervalos_rollup(caminho_base, resolucao, inicio_ms, fim_ms, no):
+        total += valores[0]
+        if not texto:
+            continue
+        try:
+            esboco.juntar(EsbocoQuantis.decodificar(texto))
+        except ValueError:
+            continue
+        minimo = valores[2] if minimo is None else min(minimo, valores[2])
+        maximo = valores[3] if maximo is None else max(maximo, valores[3])
+
+    # O esboço erra até 1% para mais ou para menos; os extremos exatos limitam a estimativa
+    estimativas = {nome: valor if valor is None else min(max(valor, minimo), maximo)
+                   for nome, valor in esboco.percentis(percentis).items()}
+    # 'sem_esboco': amostras de intervalos gravados antes dos esboços, fora dos percentis
+    return {'resolucao': resolucao, 'contagem': len(esboco), 'sem_esboco': total - len(esboco),
+            'minimo': minimo, 'maximo': maximo, **estimativas}
+
+
+def reduzir_pontos(pontos, limite):
+    """
+    Reduz a resposta a cerca de 'limite' pontos com LTTB, separadamente por nó
+    (o limite é dividido entre eles). Usa 'valor' (dados brutos) ou 'media' (rollups).
+    """
+    if limite is None or len(pontos) <= limite:
+        return pontos
+    por_no = {}
+    for ponto in pontos:
+        por_no.setdefault(ponto['no'], []).append(ponto)
+    limite_no = max(limite // len(por_no), 3)
+
+    reduzidos = []
+    for serie in por_no.values():
+        campo = 'valor' if 'valor' in serie[0] else 'media'
+        x = np.array([ponto['t'] for ponto in serie], dtype='datetime64[ms]').astype(np.int64)
+        y = np.array([ponto[campo] for ponto in serie], dtype=np.float64)
+        reduzidos.extend(serie[indice] for indice in lttb(x, y, limite_no).tolist())
+    reduzidos.sort(key=lambda ponto: ponto['t'])
+    return reduzidos
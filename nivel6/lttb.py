@@ -0,0 +1,42 @@
+# lttb.py - Redução de séries para o gráfico (Largest-Triangle-Three-Buckets)
+
+import numpy as np
+
+MINIMO_PONTOS = 3
+
+
+def lttb(x, y, limite):
+    """
+    Índices de até 'limite' pontos da série (x crescente) que preservam a forma
+    visual: o primeiro, o último e, em cada balde intermediário, o ponto que
+    forma o maior triângulo com o escolhido no balde anterior e a média do
+    seguinte. Picos e vales isolados sobrevivem, ao contrário de uma média.
+    Médias dos baldes e áreas são calculadas com NumPy; só a escolha, que
+    depende do balde anterior, percorre os baldes.
+    """
+    quantidade = len(y)
+    if limite >= quantidade or limite < MINIMO_PONTOS:
+        return np.arange(quantidade)
+
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    # Os pontos internos (1 .. n-2) são divididos em 'limite - 2' baldes
+    bordas = 1 + (np.arange(limite - 1) * (quantidade - 2)) // (limite - 2)
+    tamanhos = np.diff(bordas)
+    medias_x = np.add.reduceat(x[1:-1], bordas[:-1] - 1) / tamanhos
+    medias_y = np.add.reduceat(y[1:-1], bordas[:-1] - 1) / tamanhos
+    # Referência à direita de cada balde: a média do seguinte (ou o último ponto)
+    proximo_x = np.append(medias_x[1:], x[-1])
+    proximo_y = np.append(medias_y[1:], y[-1])
+
+    escolhidos = np.empty(limite, dtype=np.int64)
+    escolhidos[0] = anterior = 0
+    escolhidos[-1] = quantidade - 1
+    for balde in range(limite - 2):
+        inicio, fim = bordas[balde], bordas[balde + 1]
+        ax, ay = x[anterior], y[anterior]
+        areas = np.abs((ax - proximo_x[balde]) * (y[inicio:fim] - ay) -
+                       (ax - x[inicio:fim]) * (proximo_y[balde] - ay))
+        anterior = inicio + int(np.argmax(areas))
+        escolhidos[balde + 1] = anterior
+    return escolhidos
@@ -0,0 +1,104 @@
+# transmissao.py - Difusão de eventos Server-Sent Events a partir de um único observador
+
+import json
+import queue
+import threading
+import time
+
+INTERVALO_OBSERVACAO_S = 0.5
+INTERVALO_MINIMO_S = 0.05  # Espaçamento mínimo entre coletas antecipadas por acordar()
+INTERVALO_HEARTBEAT_S = 15.0  # Comentário periódico para proxies não fecharem a conexão ociosa
+MAX_FILA = 256  # Eventos retidos por cliente lento antes de ele ser desconectado
+
+
+def formatar_evento(tipo, dados):
+    """Mensagem no formato text/event-stream."""
+    return f"event: {tipo}\ndata: {json.dumps(dados, separators=(',', ':'))}\n\n"
+
+
+class Transmissor:
+    """
+    Uma única thread chama 'coletar()' a cada 'intervalo' e repassa os eventos
+    (tipo, nó, dados) às filas dos inscritos; nó None vai para todos. A thread
+    só existe enquanto houver inscritos, então o custo de leitura dos arquivos
+    não cresce com o número de navegadores abertos. Ao (re)iniciar, a primeira
+    coleta só define a linha de base: quem se inscreve recebe o estado completo
+    por conta própria (evento 'inicial'). acordar() antecipa a próxima coleta
+    quando há novidade conhecida (ex.: amostra nova no barramento).
+    """
+
+    def __init__(self, coletar, intervalo=INTERVALO_OBSERVACAO_S):
+        self.coletar = coletar
+        self.intervalo = intervalo
+        self._inscritos = {}  # fila -> nó de interesse
+        self._lock = threading.Lock()
+        self._acordar = threading.Event()
+        self._thread = None
+
+    def inscrever(self, no=None):
+        fila = queue.Queue(MAX_FILA)
+        with self._lock:
+            self._inscritos[fila] = no
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._executar, name="Transmissor", daemon=True)
+                self._thread.start()
+        return fila
+
+    def acordar(self):
+        self._acordar.set()
+
+    def cancelar(self, fila):
+        with self._lock:
+            self._inscritos.pop(fila, None)
+
+    def eventos(self, fila, iniciais=()):
+        """Gerador do corpo da resposta SSE de um inscrito; cancela a inscrição ao terminar."""
+        try:
+            for mensagem in iniciais:
+                yield mensagem
+            while True:
+                try:
+                    mensagem = fila.get(timeout=INTERVALO_HEARTBEAT_S)
+                except queue.Empty:
+                    yield ": ping\n\n"
+                    continue
+                if mensagem is None:
+                    return  # Cliente lento demais: o navegador reconecta e recebe o estado completo
+                yield mensagem
+        finally:
+            self.cancelar(fila)
+
+    def _executar(self):
+        linha_de_base = True
+        while True:
+            with self._lock:
+                if not self._inscritos:
+                    self._thread = None
+                    return
+            inicio = time.monotonic()
+            try:
+                eventos = self.coletar()
+            except Exception as e:
+                print(f"[ERRO] Falha ao coletar eventos para o stream: {e}")
+                eventos = []
+            if linha_de_base:
+                eventos = []
+                linha_de_base = False
+
+            for tipo, no, dados in eventos:
+                mensagem = formatar_evento(tipo, dados)
+                with self._lock:
+                    inscritos = list(self._inscritos.items())
+                for fila, no_inscrito in inscritos:
+                    if no is not None and no_inscrito is not None and no != no_inscrito:
+                        continue
+                    try:
+                        fila.put_nowait(mensagem)
+                    except queue.Full:
+                        self.cancelar(fila)
+                        with fila.mutex:
+                            fila.queue.clear()
+                        fila.put_nowait(None)
+            time.sleep(max(INTERVALO_MINIMO_S - (time.monotonic() - inicio), 0))
+            self._acordar.wait(max(self.intervalo - (time.monotonic() - inicio), 0))
+            self._acordar.clear()
@@ -0,0 +1,66 @@
+# test_barramento.py - Anel de amostras do nivel3 e avisos aos leitores
+
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')))
+from comum.barramento import LeitorBarramento, PublicadorBarramento, diretorio_leitores
+
+
+def test_leitor_recebe_o_publicado_e_percebe_lacunas(tmp_path):
+    caminho = str(tmp_path / 'barramento.bin')
+    leitor = LeitorBarramento(caminho)
+    assert leitor.ler() == (None, False)
+
+    publicador = PublicadorBarramento(caminho, capacidade=8)
+    publicador.publicar(1000, 1, -60.0, 300, 0, rtt_ms=5.0)
+    registros, continuo = leitor.ler()
+    assert not continuo  # Primeira leitura
+    assert (registros['timestamp_ms'].tolist(), registros['luminosidade'].tolist()) == ([1000], [300])
+
+    for i in range(3):
+        publicador.publicar(2000 + i, 2, -61.0, i, 0)
+    registros, continuo = leitor.ler()
+    assert continuo and registros['timestamp_ms'].tolist() == [2000, 2001, 2002]
+
+    for i in range(20):  # Dá mais de uma volta no anel
+        publicador.publicar(3000 + i, 1, -62.0, i, 0)
+    registros, continuo = leitor.ler()
+    assert not continuo and registros['timestamp_ms'].tolist() == list(range(3012, 3020))
+    leitor.fechar()
+    publicador.fechar()
+
+
+def test_aguardar_acorda_na_publicacao(tmp_path):
+    caminho = str(tmp_path / 'barramento.bin')
+    publicador = PublicadorBarramento(caminho)
+    leitor = LeitorBarramento(caminho)
+    leitor.ler()
+    assert leitor.aguardar(0.05) is False  # Inscreve o socket; nada publicado
+
+    threading.Timer(0.1, lambda: publicador.publicar(1000, 1, -60.0, 300, 0)).start()
+    publicador._varrido_em = None  # Relista os inscritos já na próxima publicação
+    inicio = time.monotonic()
+    assert leitor.aguardar(5) is True
+    assert time.monotonic() - inicio < 2
+    assert leitor.ler()[0]['timestamp_ms'].tolist() == [1000]
+
+    leitor.fechar()
+    assert os.listdir(diretorio_leitores(caminho)) == []
+    os.rmdir(diretorio_leitores(caminho))
+    publicador.fechar()
+
+
+def test_socket_de_leitor_encerrado_e_removido(tmp_path):
+    caminho = str(tmp_path / 'barramento.bin')
+    publicador = PublicadorBarramento(caminho)
+    leitor = LeitorBarramento(caminho)
+    leitor.aguardar(0)
+    leitor._aviso.close()  # Morreu sem chamar fechar()
+
+    publicador.publicar(1000, 1, -60.0, 300, 0)
+    assert os.listdir(diretorio_leitores(caminho)) == []
+    os.rmdir(diretorio_leitores(caminho))
+    publicador.fechar()
@@ -0,0 +1,53 @@
+# test_buffer_amostras.py - Buffer circular de amostras recentes do painel
+
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'nivel6')))
+from buffer_amostras import BufferAmostras
+
+
+def inserir(buffer, inicio, quantidade):
+    timestamps = np.arange(inicio, inicio + quantidade, dtype=np.int64)
+    buffer.adicionar(timestamps, timestamps * 10.0, [f"t{t}" for t in timestamps.tolist()])
+
+
+def test_ultimos_em_ordem_de_chegada():
+    buffer = BufferAmostras(5)
+    inserir(buffer, 0, 3)
+
+    timestamps, valores, rotulos = buffer.ultimos(10)
+    assert timestamps.tolist() == [0, 1, 2]
+    assert valores.tolist() == [0.0, 10.0, 20.0]
+    assert rotulos == ['t0', 't1', 't2']
+    assert buffer.ultimos(2)[0].tolist() == [1, 2]
+
+
+def test_sobrescreve_as_mais_antigas_ao_dar_a_volta():
+    buffer = BufferAmostras(5)
+    inserir(buffer, 0, 4)
+    inserir(buffer, 4, 3)  # Passa do fim do array
+
+    timestamps, valores, rotulos = buffer.ultimos(5)
+    assert len(buffer) == 5 and buffer.total == 7
+    assert timestamps.tolist() == [2, 3, 4, 5, 6]
+    assert valores.tolist() == [20.0, 30.0, 40.0, 50.0, 60.0]
+    assert rotulos == ['t2', 't3', 't4', 't5', 't6']
+
+
+def test_lote_maior_que_a_capacidade_guarda_so_o_final():
+    buffer = BufferAmostras(4)
+    inserir(buffer, 0, 10)
+    assert buffer.ultimos(4)[0].tolist() == [6, 7, 8, 9]
+
+
+def test_limpar():
+    buffer = BufferAmostras(4)
+    inserir(buffer, 0, 3)
+    buffer.limpar()
+    assert len(buffer) == 0
+    assert buffer.ultimos(4)[0].tolist() == []
+    inserir(buffer, 100, 1)
+    assert buffer.ultimos(4)[0].tolist() == [100]
@@ -0,0 +1,66 @@
+# test_cauda.py - Leitura incremental da cauda dos CSVs através das rotações
+
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')))
+from comum.cauda import LeitorCauda
+from comum.rotacao import PoliticaRotacao, Rotacionador, ler_manifesto
+
+CABECALHO = "Timestamp,Luminosidade,No\n"
+
+
+def linha(segundo):
+    return f"2026-01-01 10:00:{segundo:02d}.000,{segundo},1"
+
+
+def anexar(caminho, inicio, fim):
+    novo = not os.path.exists(caminho)
+    with open(caminho, 'a', encoding='utf-8') as f:
+        f.write((CABECALHO if novo else '') + ''.join(linha(s) + '\n' for s in range(inicio, fim)))
+
+
+def rotacionar(caminho, comprimir, inicio, fim):
+    """Rotaciona e anexa linhas ao arquivo novo; a compressão termina depois, como na thread do Rotacionador."""
+    rotacionador = Rotacionador(caminho, PoliticaRotacao(None, False, None))
+    assert rotacionador.rotacionar()
+    anexar(caminho, inicio, fim)
+    if comprimir:
+        rotacionador.politica = PoliticaRotacao(None, False, 'gzip')
+        rotacionador._comprimir(ler_manifesto(caminho)[-1]['arquivo'])
+
+
+def test_termina_o_segmento_rotacionado(tmp_path):
+    for comprimir in (False, True):
+        caminho = str(tmp_path / f'dados_{comprimir}.csv')
+        anexar(caminho, 0, 3)
+        leitor = LeitorCauda(caminho, 100)
+        assert leitor.novas() == [linha(s) for s in range(3)]
+
+        anexar(caminho, 3, 5)  # Ainda não lidas quando o arquivo é rotacionado
+        rotacionar(caminho, comprimir, 5, 7)
+        assert leitor.novas() == [linha(s) for s in range(3, 7)]
+        assert ler_manifesto(caminho)[-1]['compressao'] == ('gzip' if comprimir else None)
+
+
+def test_varias_rotacoes_entre_leituras(tmp_path):
+    caminho = str(tmp_path / 'dados.csv')
+    anexar(caminho, 0, 2)
+    leitor = LeitorCauda(caminho, 100)
+    leitor.novas()
+
+    anexar(caminho, 2, 4)
+    rotacionar(caminho, True, 4, 6)
+    rotacionar(caminho, False, 6, 8)
+    assert leitor.novas() == [linha(s) for s in range(2, 8)]
+
+
+def test_segmento_de_outro_arquivo_recomeca_do_fim(tmp_path):
+    caminho = str(tmp_path / 'dados.csv')
+    anexar(caminho, 0, 2)
+    leitor = LeitorCauda(caminho, 1)
+    leitor.novas()
+
+    os.replace(caminho, str(tmp_path / 'trocado.csv'))  # Trocado fora da rotação: não está no manifesto
+    anexar(caminho, 10, 13)
+    assert leitor.novas() == [linha(12)]
@@ -0,0 +1,63 @@
+# test_esboco.py - Esboço de quantis dos rollups
+
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')))
+from comum.esboco import ALFA, EsbocoQuantis, chave_esboco, valor_chave
+
+
+def exato(valores, fracao):
+    ordenados = sorted(valores)
+    return ordenados[int(fracao * (len(ordenados) - 1))]
+
+
+def test_quantis_dentro_do_erro_relativo():
+    gerador = random.Random(42)
+    valores = [gerador.lognormvariate(5, 1) for _ in range(5000)]
+    esboco = EsbocoQuantis()
+    for valor in valores:
+        esboco.adicionar(valor)
+
+    fracoes = [0.0, 0.05, 0.5, 0.95, 1.0]
+    for fracao, estimado in zip(fracoes, esboco.quantis(fracoes)):
+        real = exato(valores, fracao)
+        assert abs(estimado - real) <= ALFA * real * 1.0001
+
+
+def test_chaves_preservam_a_ordem_e_o_sinal():
+    valores = [-500.0, -1.5, -0.001, 0.0, 1e-12, 0.001, 1.5, 500.0]
+    chaves = [chave_esboco(valor) for valor in valores]
+    assert chaves == sorted(chaves)
+    assert chave_esboco(0.0) == chave_esboco(1e-12) == 0
+    for valor in (-500.0, -1.5, 1.5, 500.0):
+        assert abs(valor_chave(chave_esboco(valor)) - valor) <= ALFA * abs(valor)
+
+
+def test_juntar_igual_a_esboco_unico():
+    a, b, ambos = EsbocoQuantis(), EsbocoQuantis(), EsbocoQuantis()
+    for valor in range(1, 101):
+        (a if valor % 3 else b).adicionar(valor)
+        ambos.adicionar(valor)
+    assert a.juntar(b).baldes == ambos.baldes
+    assert len(a) == 100
+
+
+def test_codificar_ida_e_volta():
+    esboco = EsbocoQuantis()
+    for valor in (-3.0, 0.0, 0.0, 7.5, 7.5, 7.5, 1200.0):
+        esboco.adicionar(valor)
+    texto = esboco.codificar()
+    assert EsbocoQuantis.decodificar(texto).baldes == esboco.baldes
+    assert EsbocoQuantis.decodificar('').baldes == {}
+
+
+def test_percentis_e_vazio():
+    assert EsbocoQuantis().percentis() == {'p5': None, 'p50': None, 'p95': None}
+    esboco = EsbocoQuantis()
+    for valor in range(1, 101):
+        esboco.adicionar(float(valor))
+    percentis = esboco.percentis((50, 99.5))
+    assert set(percentis) == {'p50', 'p99.5'}
+    assert abs(percentis['p50'] - 50) <= 50 * ALFA
@@ -0,0 +1,81 @@
+# test_estado.py - Registro mmap do estado ao vivo dos nós (seqlock)
+
+import os
+import sys
+import threading
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')))
+from comum.estado import SEQ, EstadoNos
+
+ESTADOS = {'led_verde': True, 'led_amarelo': False, 'led_vermelho': False, 'buzzer': True}
+
+
+def test_leitor_ve_o_que_o_escritor_gravou(tmp_path):
+    caminho = str(tmp_path / 'estado_nos.bin')
+    escritor = EstadoNos(caminho, escrita=True)
+    escritor.atualizar(7, ESTADOS, 512, -60.5, rtt_ms=12.34, timestamp=1_700_000_000)
+    escritor.atualizar(3, {}, 10, -80.0)
+
+    leitor = EstadoNos(caminho)
+    estado = leitor.ler(7)
+    assert (estado['led_verde'], estado['led_amarelo'], estado['buzzer']) == (True, False, True)
+    assert (estado['luminosidade_atual'], estado['rssi'], estado['rtt_ms']) == (512, -60.5, 12.3)
+    assert leitor.ler(3)['rtt_ms'] is None
+    assert [estado['id'] for estado in leitor.ler_todos()] == [7, 3]
+    assert leitor.ler(99) is None
+
+    versao = estado['versao']
+    escritor.atualizar(7, ESTADOS, 600, -61.0)
+    assert versao % 2 == 0 and leitor.ler(7)['versao'] == versao + 2
+    leitor.fechar()
+    escritor.fechar()
+
+
+def test_escritor_reaberto_reaproveita_os_slots(tmp_path):
+    caminho = str(tmp_path / 'estado_nos.bin')
+    escritor = EstadoNos(caminho, escrita=True)
+    escritor.atualizar(5, {}, 1, -70.0)
+    escritor.atualizar(9, {}, 2, -70.0)
+    escritor.fechar()
+
+    escritor = EstadoNos(caminho, escrita=True)
+    escritor.atualizar(9, {}, 3, -70.0)
+    leitor = EstadoNos(caminho)
+    assert [(estado['id'], estado['luminosidade_atual']) for estado in leitor.ler_todos()] == [(5, 1), (9, 3)]
+    leitor.fechar()
+    escritor.fechar()
+
+
+def test_leitor_nao_ve_escrita_pela_metade(tmp_path):
+    caminho = str(tmp_path / 'estado_nos.bin')
+    escritor = EstadoNos(caminho, escrita=True)
+    escritor.atualizar(1, {}, 0, 0.0, rtt_ms=0.0)
+    leitor = EstadoNos(caminho)
+    leitor.ler_todos()
+
+    # Escritor morto no meio de uma escrita (contador ímpar): o leitor desiste e retorna o slot
+    offset = escritor._offset(0)
+    (seq,) = SEQ.unpack_from(escritor._mapa, offset)
+    SEQ.pack_into(escritor._mapa, offset, seq + 1)
+    assert leitor.ler(1)['versao'] == seq + 1
+    SEQ.pack_into(escritor._mapa, offset, seq + 2)
+
+    parar = threading.Event()
+
+    def escrever():
+        valor = 0
+        while not parar.is_set():
+            valor = (valor + 1) % 1000
+            escritor.atualizar(1, {}, valor, float(valor), rtt_ms=float(valor))
+
+    thread = threading.Thread(target=escrever)
+    thread.start()
+    try:
+        for _ in range(2000):
+            estado = leitor.ler(1)
+            assert estado['luminosidade_atual'] == estado['rssi'] == estado['rtt_ms']
+    finally:
+        parar.set()
+        thread.join()
+    leitor.fechar()
+    escritor.fechar()
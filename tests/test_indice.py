@@ -0,0 +1,78 @@
+# test_indice.py - Índice esparso e busca binária nos CSVs brutos
+
+import io
+import os
+import sys
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')))
+from comum.indice import IndiceEsparso, bisseccao_csv, chave_linha, linhas_no_intervalo
+
+INICIO = datetime(2026, 1, 1)
+
+
+def carimbo(segundos):
+    return (INICIO + timedelta(seconds=segundos)).strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]
+
+
+def escrever_csv(caminho, quantidade, indice=None):
+    """CSV com uma linha por segundo, anexada em lotes como o escritor faz."""
+    with open(caminho, 'wb') as f:
+        f.write(b'Timestamp,Luminosidade,No\n')
+    for lote in range(0, quantidade, 100):
+        linhas = [f"{carimbo(s)},{s % 1024},1\n" for s in range(lote, min(lote + 100, quantidade))]
+        if indice is not None:
+            indice.registrar(os.path.getsize(caminho), linhas[0].split(',')[0])
+        with open(caminho, 'ab') as f:
+            f.write(''.join(linhas).encode('utf-8'))
+
+
+def test_bisseccao_acha_o_inicio_das_linhas():
+    dados = b''.join(f"{carimbo(s)},{s}\n".encode() for s in range(20000))
+    f = io.BytesIO(dados)
+    for segundo in (0, 1, 4321, 19999):
+        alvo = carimbo(segundo).encode()
+        offset = bisseccao_csv(f, alvo, 0, len(dados))
+        assert offset == 0 or dados[offset - 1:offset] == b'\n'
+        assert offset <= dados.index(alvo)
+        f.seek(offset)
+        anteriores = f.read(dados.index(alvo) - offset).splitlines()
+        assert all(chave_linha(linha) < alvo for linha in anteriores)
+
+
+def test_intervalo_com_e_sem_indice(tmp_path):
+    caminho = str(tmp_path / 'dados.csv')
+    indice = IndiceEsparso(caminho, passo=4096)
+    escrever_csv(caminho, 5000, indice)
+
+    esperado = [f"{carimbo(s)},{s % 1024},1".encode() for s in range(1234, 1300 + 1)]
+    assert list(linhas_no_intervalo(caminho, carimbo(1234), carimbo(1300), indice)) == esperado
+    assert list(linhas_no_intervalo(caminho, carimbo(1234), carimbo(1300))) == esperado
+    assert list(linhas_no_intervalo(caminho, carimbo(-10), carimbo(1))) == [
+        f"{carimbo(s)},{s},1".encode() for s in (0, 1)]
+    assert list(linhas_no_intervalo(caminho, carimbo(6000), carimbo(7000), indice)) == []
+
+
+def test_buscar_delimita_o_trecho(tmp_path):
+    caminho = str(tmp_path / 'dados.csv')
+    indice = IndiceEsparso(caminho, passo=4096)
+    escrever_csv(caminho, 5000, indice)
+
+    with open(caminho, 'rb') as f:
+        dados = f.read()
+    alvo = carimbo(2500).encode()
+    inicio, fim = indice.buscar(int((INICIO + timedelta(seconds=2500)).timestamp() * 1000))
+    assert inicio <= dados.index(alvo) and (fim is None or dados.index(alvo) <= fim)
+
+
+def test_indice_de_outro_arquivo_e_refeito(tmp_path):
+    caminho = str(tmp_path / 'dados.csv')
+    indice = IndiceEsparso(caminho, passo=4096)
+    escrever_csv(caminho, 1000, indice)
+    os.replace(caminho, str(tmp_path / 'antigo.csv'))
+    escrever_csv(caminho, 1000)
+
+    assert IndiceEsparso(caminho).buscar(0) is None  # Índice aponta para o inode antigo
+    novo = IndiceEsparso(caminho, passo=4096)
+    novo.registrar(os.path.getsize(caminho), carimbo(1000))  # Reconstrói para o CSV novo
+    assert novo.buscar(0) is not None
@@ -0,0 +1,39 @@
+# test_lttb.py - Redução de séries para o gráfico (LTTB)
+
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'nivel6')))
+from lttb import lttb
+
+
+def test_serie_curta_volta_inteira():
+    assert lttb([0, 1, 2], [5, 6, 7], 10).tolist() == [0, 1, 2]
+    assert lttb(range(10), range(10), 2).tolist() == list(range(10))  # Limite abaixo do mínimo
+
+
+def test_limite_extremos_e_ordem():
+    x = np.arange(1000)
+    y = np.sin(x / 50.0)
+    indices = lttb(x, y, 100)
+
+    assert len(indices) == 100
+    assert indices[0] == 0 and indices[-1] == 999
+    assert np.all(np.diff(indices) > 0)
+
+
+def test_pico_isolado_sobrevive():
+    x = np.arange(500)
+    y = np.zeros(500)
+    y[123] = 1000.0
+    y[321] = -1000.0
+    indices = lttb(x, y, 20).tolist()
+    assert 123 in indices and 321 in indices
+
+
+def test_um_ponto_por_balde():
+    indices = lttb(np.arange(102), np.random.default_rng(1).normal(size=102), 12)
+    # 100 pontos internos em 10 baldes de 10
+    assert [(i - 1) // 10 for i in indices[1:-1]] == list(range(10))
@@ -0,0 +1,80 @@
+# test_luminosidade_nos.py - O gráfico de luminosidade (API e SSE) não mistura as leituras de nós diferentes
+
+import os
+import sys
+
+import yaml
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'nivel6')))
+import app
+from buffer_amostras import BuffersPorNo
+from cache_respostas import CacheRespostas
+from comum.barramento import LeitorBarramento
+from comum.configuracao import CacheConfiguracao
+
+
+def preparar(tmp_path, monkeypatch, linhas):
+    caminho_yaml = tmp_path / 'configuracoes.yaml'
+    caminho_csv = tmp_path / 'dados_brutos_aplicacao.csv'
+    caminho_yaml.write_text(yaml.dump({
+        'nivel1': {'porta': 8888, 'nos': [{'id': 1, 'ip': '10.0.0.1'}, {'id': 2, 'ip': '10.0.0.2'}]},
+        'nivel4': {'armazenamento': 'csv'},
+    }), encoding='utf-8')
+    caminho_csv.write_text("Timestamp,Luminosidade,No\n" + "".join(f"{linha}\n" for linha in linhas), encoding='utf-8')
+
+    buffers = BuffersPorNo(app.CAPACIDADE_BUFFER)
+    alimentador = app.AlimentadorBuffer(buffers)
+    alimentador._barramento = LeitorBarramento(str(tmp_path / 'sem_barramento'))
+    alimentador._thread = True  # Sem a thread de fundo: o teste chama atualizar() diretamente
+    monkeypatch.setattr(app, 'YAML_PATH', str(caminho_yaml))
+    monkeypatch.setattr(app, 'CSV_RAW_PATH', str(caminho_csv))
+    monkeypatch.setattr(app, 'cache_config', CacheConfiguracao(str(caminho_yaml)))
+    monkeypatch.setattr(app, 'cache_respostas', CacheRespostas(str(tmp_path / 'cache')))
+    monkeypatch.setattr(app, 'buffers_luminosidade', buffers)
+    monkeypatch.setattr(app, 'alimentador', alimentador)
+    return caminho_csv
+
+
+def test_luminosidade_separada_por_no(tmp_path, monkeypatch):
+    preparar(tmp_path, monkeypatch, [
+        "2026-01-01 10:00:00.000,100,1",
+        "2026-01-01 10:00:00.010,900,2",
+        "2026-01-01 10:00:01.000,110,1",
+        "2026-01-01 10:00:01.010,910,2",
+    ])
+    cliente = app.app.test_client()
+
+    assert cliente.get('/api/luminosidade?no=1').get_json()['values'] == [100.0, 110.0]
+    assert cliente.get('/api/luminosidade?no=2').get_json()['values'] == [900.0, 910.0]
+    # Sem '?no=', o primeiro nó configurado
+    assert cliente.get('/api/luminosidade').get_json()['latest_value'] == 110.0
+
+
+def test_stream_publica_leituras_com_o_no(tmp_path, monkeypatch):
+    caminho_csv = preparar(tmp_path, monkeypatch, ["2026-01-01 10:00:00.000,100,1"])
+    observador = app.ObservadorPainel()
+    app.alimentador.atualizar()
+    observador.coletar()  # Linha de base
+
+    with open(caminho_csv, 'a', encoding='utf-8') as f:
+        f.write("2026-01-01 10:00:01.000,120,1\n2026-01-01 10:00:01.010,920,2\n")
+    app.alimentador.atualizar()
+    eventos = [(no, dados['values']) for tipo, no, dados in observador.coletar() if tipo == 'luminosidade']
+    assert sorted(eventos) == [(1, [120.0]), (2, [920.0])]
+
+
+def test_etag_igual_entre_workers(tmp_path, monkeypatch):
+    preparar(tmp_path, monkeypatch, ["2026-01-01 10:00:00.000,100,1", "2026-01-01 10:00:01.000,110,1"])
+    cliente = app.app.test_client()
+    etag = cliente.get('/api/luminosidade?no=1').headers['ETag']
+
+    # Outro worker: buffers próprios, preenchidos da mesma fonte
+    outro = BuffersPorNo(app.CAPACIDADE_BUFFER)
+    outro.versao = 41  # Contador interno diferente do primeiro
+    alimentador = app.AlimentadorBuffer(outro)
+    alimentador._barramento = app.alimentador._barramento
+    alimentador._thread = True
+    monkeypatch.setattr(app, 'buffers_luminosidade', outro)
+    monkeypatch.setattr(app, 'alimentador', alimentador)
+    resposta = cliente.get('/api/luminosidade?no=1', headers={'If-None-Match': etag})
+    assert resposta.status_code == 304
@@ -0,0 +1,74 @@
+# test_pacote.py - Codec do quadro UDP de 52 bytes
+
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')))
+from comum.pacote import (TAMANHO_PACOTE, UPLINK, ReceptorPacotes, codificar_downlink, codificar_downlink_em,
+                          decodificar_lote, decodificar_uplink, rssi_de_byte)
+
+
+def uplink(rssi, contador, luminosidade, verde, amarelo, vermelho, buzzer):
+    return UPLINK.pack(rssi, contador, luminosidade, verde, amarelo, vermelho, buzzer)
+
+
+def test_downlink_nos_bytes_do_firmware():
+    pacote = codificar_downlink(contador=200, endereco_rede=3, limiar_1=0x0102, limiar_2=700)
+    assert len(pacote) == TAMANHO_PACOTE
+    assert (pacote[8], pacote[10], pacote[12]) == (3, 0, 200)
+    assert pacote[16:18] == b'\x01\x02'
+    assert int.from_bytes(pacote[18:20], 'big') == 700
+    assert not any(byte for i, byte in enumerate(pacote) if i not in (8, 12, 16, 17, 18, 19))
+
+    buffer = bytearray(b'\xff' * TAMANHO_PACOTE)
+    codificar_downlink_em(buffer, 200, 3, 0x0102, 700)
+    assert bytes(buffer) == pacote
+
+
+def test_uplink_ida_e_volta():
+    pacote = bytearray(uplink(140, 17, 1023, 1, 0, 0, 1))
+    assert len(pacote) == TAMANHO_PACOTE
+    assert pacote[12] == 17 and pacote[17:19] == (1023).to_bytes(2, 'big')
+    assert (pacote[34], pacote[37], pacote[40], pacote[43]) == (1, 0, 0, 1)
+
+    dados = decodificar_uplink(memoryview(pacote))
+    assert dados == {'rssi': rssi_de_byte(140), 'contador': 17, 'luminosidade': 1023, 'led_verde': True,
+                     'led_amarelo': False, 'led_vermelho': False, 'buzzer': True}
+
+
+def test_rssi_de_byte():
+    assert rssi_de_byte(0) == -74.0
+    assert rssi_de_byte(20) == -64.0
+    assert rssi_de_byte(200) == -102.0
+
+
+def test_lote_igual_ao_decodificador_por_pacote():
+    pacotes = [uplink(byte, contador, 10 * contador, contador % 2, 0, 1, 0)
+               for contador, byte in enumerate([0, 60, 128, 129, 255])]
+    colunas = decodificar_lote(b''.join(pacotes) + b'\x00' * 10)  # Sobra final é ignorada
+
+    assert len(colunas['rssi']) == len(pacotes)
+    for i, pacote in enumerate(pacotes):
+        esperado = decodificar_uplink(pacote)
+        assert {chave: coluna[i].item() for chave, coluna in colunas.items()} == esperado
+
+
+class SocketFalso:
+    def __init__(self, datagramas):
+        self.datagramas = list(datagramas)
+
+    def recvfrom_into(self, buffer):
+        dados = self.datagramas.pop(0)
+        buffer[:len(dados)] = dados
+        return len(dados), ('10.0.0.1', 8888)
+
+
+def test_receptor_reusa_o_buffer():
+    receptor = ReceptorPacotes()
+    udp_socket = SocketFalso([uplink(0, 1, 100, 0, 0, 0, 0), uplink(0, 2, 200, 0, 0, 0, 0)])
+
+    pacote, origem = receptor.receber(udp_socket)
+    assert origem == ('10.0.0.1', 8888) and decodificar_uplink(pacote)['contador'] == 1
+    segundo, _ = receptor.receber(udp_socket)
+    assert decodificar_uplink(segundo)['luminosidade'] == 200
+    assert pacote.obj is segundo.obj
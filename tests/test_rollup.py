@@ -0,0 +1,33 @@
+# test_rollup.py - Rollups por intervalo: CSVs de antes dos esboços
+
+import csv
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')))
+from comum.rollup import CABECALHO_ROLLUP, Rollups, caminho_rollup, cabecalho_rollup
+
+
+def ler(caminho):
+    with open(caminho, newline='', encoding='utf-8') as f:
+        return list(csv.reader(f))
+
+
+def test_csv_antigo_ganha_a_coluna_esboco(tmp_path):
+    caminho_base = str(tmp_path / 'rollup_aplicacao.csv')
+    caminho_1h = caminho_rollup(caminho_base, '1h')
+    caminho_1min = caminho_rollup(caminho_base, '1min')
+    antiga = ['2026-01-01 09:00:00', '1', '2', '30.0', '10.0', '20.0', '500.0']
+    for caminho in (caminho_1h, caminho_1min):
+        with open(caminho, 'w', newline='', encoding='utf-8') as f:
+            csv.writer(f).writerows([CABECALHO_ROLLUP, antiga])
+
+    rollups = Rollups(caminho_base)
+    rollups.adicionar([('2026-01-01 10:00:00.000', 1, 5.0), ('2026-01-01 11:00:00.000', 1, 7.0)])
+
+    linhas = ler(caminho_1h)
+    assert linhas[0] == cabecalho_rollup('1h')
+    assert linhas[1] == antiga + ['']
+    assert linhas[2][:3] == ['2026-01-01 10:00:00', '1', '1'] and linhas[2][7]
+    assert all(len(linha) == len(linhas[0]) for linha in linhas)
+    assert ler(caminho_1min)[:2] == [CABECALHO_ROLLUP, antiga]  # 1 min não tem esboço
@@ -0,0 +1,73 @@
+# test_serie_temporal.py - Série temporal binária: gravação, leitura, versão 1 e exportação
+
+import csv
+import math
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')))
+from comum.serie_temporal import (CABECALHO, DTYPE_V1, MAGICO, SerieTemporal, exportar_csv, formatar_timestamp)
+
+REGISTROS = [(1_700_000_000_000, -60.5, 512, 0, 1, 12.5), (1_700_000_000_700, float('nan'), 0, 1, 2, float('nan'))]
+
+
+def criar_v1(caminho):
+    antigos = np.array([(1_600_000_000_000, -70.0, 100, 0, 3), (1_600_000_001_000, -71.0, 101, 0, 3)], dtype=DTYPE_V1)
+    with open(caminho, 'wb') as f:
+        f.write(CABECALHO.pack(MAGICO, 1, DTYPE_V1.itemsize) + antigos.tobytes())
+
+
+def test_gravar_e_ler_com_rtt(tmp_path):
+    serie = SerieTemporal(str(tmp_path / 'dados.bin'))
+    assert serie.contar() == 0
+    serie.gravar(REGISTROS[:1])
+    serie.gravar(REGISTROS[1:])
+
+    registros = serie.ler()
+    assert serie.contar() == 2
+    assert registros['luminosidade'].tolist() == [512, 0] and registros['no'].tolist() == [1, 2]
+    assert registros['rtt_ms'][0] == 12.5 and math.isnan(registros['rtt_ms'][1])
+    assert serie.ultimos(1)['timestamp_ms'].tolist() == [1_700_000_000_700]
+
+
+def test_versao_1_lida_e_migrada(tmp_path):
+    caminho = str(tmp_path / 'dados.bin')
+    criar_v1(caminho)
+    serie = SerieTemporal(caminho)
+
+    assert serie.contar() == 2
+    assert 'rtt_ms' not in serie.ler().dtype.names
+    with pytest.raises(IOError):
+        serie.gravar(REGISTROS)  # Não mistura registros de tamanhos diferentes
+    assert serie.contar() == 2
+
+    assert serie.migrar() is True
+    assert serie.migrar() is False
+    serie.gravar(REGISTROS)
+    registros = serie.ler()
+    assert registros['luminosidade'].tolist() == [100, 101, 512, 0]
+    assert np.isnan(registros['rtt_ms'][:2]).all() and registros['rtt_ms'][2] == 12.5
+
+
+def test_exportar_csv_leva_o_rtt(tmp_path):
+    serie = SerieTemporal(str(tmp_path / 'dados.bin'))
+    serie.gravar(REGISTROS)
+    caminho_rede, caminho_app = str(tmp_path / 'rede.csv'), str(tmp_path / 'app.csv')
+    assert exportar_csv(serie, caminho_rede, caminho_app) == 2
+
+    with open(caminho_rede, newline='', encoding='utf-8') as f:
+        linhas = list(csv.reader(f))
+    assert linhas[1] == [formatar_timestamp(REGISTROS[0][0]), '-60.50', 'Sucesso', '1', '12.5']
+    assert linhas[2][2:] == ['Falha (Timeout)', '2', '']
+    with open(caminho_app, newline='', encoding='utf-8') as f:
+        assert list(csv.reader(f))[1:] == [[formatar_timestamp(REGISTROS[0][0]), '512', '1']]
+
+    # Série antiga, sem RTT: coluna vazia
+    caminho_v1 = str(tmp_path / 'antiga.bin')
+    criar_v1(caminho_v1)
+    exportar_csv(SerieTemporal(caminho_v1), caminho_rede)
+    with open(caminho_rede, newline='', encoding='utf-8') as f:
+        assert [linha[4] for linha in csv.reader(f)][1:] == ['', '']